@@ -2,6 +2,7 @@ import time
 import logging
 from wisup_e2m.parsers.doc.docx_parser import DocxParser
 from wisup_e2m.parsers.base import E2MParsedData
+from wisup_e2m.utils.pandoc_util import PandocMarkdownRenderer
 from pathlib import Path
 import pytest
 
@@ -13,7 +14,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@pytest.mark.parametrize("engine", ["xml", "pandoc"])
+@pytest.mark.parametrize("engine", ["xml", "pandoc", "pandoc_ast"])
 def test_docx_parser(engine):
     start_time = time.time()
 
@@ -28,5 +29,81 @@ def test_docx_parser(engine):
     logger.info(f"Test for engine '{engine}' took {end_time - start_time:.4f} seconds")
 
 
+ATTR = ["", [], []]
+
+
+def _str(text):
+    return {"t": "Str", "c": text}
+
+
+def _cell(text):
+    return [ATTR, {"t": "AlignDefault"}, 1, 1, [{"t": "Plain", "c": [_str(text)]}]]
+
+
+def _row(*texts):
+    return [ATTR, [_cell(text) for text in texts]]
+
+
+def test_pandoc_markdown_renderer():
+    colspec = [{"t": "AlignDefault"}, {"t": "ColWidthDefault"}]
+    ast = {
+        "blocks": [
+            {
+                "t": "Para",
+                "c": [
+                    {"t": "Underline", "c": [_str("under")]},
+                    {"t": "Space"},
+                    {"t": "SmallCaps", "c": [_str("caps")]},
+                    {"t": "Space"},
+                    {"t": "Span", "c": [["", ["x"], []], [{"t": "Strong", "c": [_str("span")]}]]},
+                ],
+            },
+            {
+                "t": "Table",
+                "c": [
+                    ATTR,
+                    [None, [{"t": "Plain", "c": [_str("Caption")]}]],
+                    [colspec, colspec],
+                    [ATTR, [_row("a", "b")]],
+                    [[ATTR, 0, [], [_row("1", "x|y")]]],
+                    [ATTR, []],
+                ],
+            },
+            {
+                "t": "Para",
+                "c": [
+                    {"t": "Image", "c": [ATTR, [_str("pic")], ["media/image1.png", ""]]},
+                    {"t": "Image", "c": [ATTR, [_str("gone")], ["media/missing.png", ""]]},
+                ],
+            },
+        ]
+    }
+    renderer = PandocMarkdownRenderer(
+        resolve_image=lambda src: "figures/pic.png" if src.endswith("image1.png") else None
+    )
+
+    assert list(renderer.iter_blocks(ast["blocks"])) == [
+        "under caps **span**",
+        "| a | b |\n|---|---|\n| 1 | x\\|y |\n\nCaption",
+        "![pic](figures/pic.png)",
+    ]
+    assert PandocMarkdownRenderer(include_image_link_in_text=False).render(ast).endswith("Caption")
+
+
+def test_docx_parser_pandoc_ast_underline(tmp_path):
+    import pypandoc
+
+    docx_path = tmp_path / "underline.docx"
+    pypandoc.convert_text(
+        "Some [underlined]{.underline} and [small caps]{.smallcaps} text.",
+        "docx",
+        format="markdown",
+        outputfile=str(docx_path),
+    )
+
+    parsed_data = DocxParser(engine="pandoc_ast").parse(str(docx_path), work_dir=str(tmp_path))
+    assert "Some underlined and small caps text." in parsed_data.text
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
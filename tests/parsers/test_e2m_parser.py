@@ -0,0 +1,145 @@
+import functools
+import http.server
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import pytest
+
+from wisup_e2m.configs.base import E2MParserConfig
+from wisup_e2m.parsers.main import E2MParser
+
+pwd = Path(__file__).parent
+test_html_path = pwd / "test.html"
+test_docx_path = pwd / "test.docx"
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def html_copies(tmp_path):
+    html = test_html_path.read_text("utf-8")
+    # 打印版：内容相同，多了一行页脚
+    (tmp_path / "page.html").write_text(html, "utf-8")
+    (tmp_path / "page_print.html").write_text(
+        html.replace("</body>", "<p>Printed from the web version</p></body>"), "utf-8"
+    )
+    (tmp_path / "other.html").write_text(
+        "<html><body><h1>Other</h1><p>A page about something else entirely.</p></body></html>",
+        "utf-8",
+    )
+    return tmp_path
+
+
+@pytest.mark.parametrize("dedup_mode", ["link", "skip"])
+def test_e2m_parser_dedup(html_copies, dedup_mode):
+    index_path = html_copies / "dedup.jsonl"
+    config = E2MParserConfig(
+        parsers={"html_parser": {"engine": "native"}},
+        dedup_mode=dedup_mode,
+        dedup_index_path=str(index_path),
+    )
+    parser = E2MParser(config)
+
+    original = parser.parse(file_name=str(html_copies / "page.html"))
+    assert "duplicate_of" not in original.metadata
+    assert "duplicate_of" not in parser.parse(file_name=str(html_copies / "other.html")).metadata
+
+    duplicate = parser.parse(file_name=str(html_copies / "page_print.html"))
+    assert duplicate.metadata["duplicate_of"] == str((html_copies / "page.html").resolve())
+    assert duplicate.metadata["duplicate_similarity"] >= 0.9
+    assert (duplicate.text == "") == (dedup_mode == "skip")
+
+    # 索引持久化后，新的 E2MParser 也能找到重复
+    parser = E2MParser(config)
+    duplicate = parser.parse(file_name=str(html_copies / "page_print.html"))
+    assert duplicate.metadata["duplicate_of"] == str((html_copies / "page.html").resolve())
+
+
+class DocumentSiteHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the docx without extension or content type, and 403 for /blocked"""
+
+    def send_head(self):
+        if self.path == "/blocked":
+            self.send_error(403)
+            return None
+        return super().send_head()
+
+    def guess_type(self, path):
+        return "application/octet-stream" if path.endswith("download") else "text/html"
+
+
+@pytest.fixture
+def document_site(tmp_path):
+    (tmp_path / "download").write_bytes(test_docx_path.read_bytes())
+    (tmp_path / "page").write_bytes(test_html_path.read_bytes())
+
+    handler = functools.partial(DocumentSiteHandler, directory=str(tmp_path))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_e2m_parser_route_urls(document_site):
+    config = E2MParserConfig(
+        parsers={"docx_parser": {"engine": "xml"}, "url_parser": {"engine": "jina"}}
+    )
+    parser = E2MParser(config)
+
+    parsed_data = parser.parse(url=document_site + "/download")
+    assert parsed_data.metadata["file_type"] == "docx"
+    assert parsed_data.metadata["url"] == document_site + "/download"
+    assert parsed_data.text
+
+    # html 页面和拒绝直接访问的页面交给 url 解析器
+    assert parser._parse_url_document(document_site + "/page") is None
+    assert parser._parse_url_document(document_site + "/blocked") is None
+
+
+class ReaderSiteHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the site, and a jina reader stub returning the raw page under ``/http...``"""
+
+    def send_head(self):
+        if self.path.startswith("/http"):
+            self.path = urlsplit(self.path[1:]).path
+        return super().send_head()
+
+    def guess_type(self, path):
+        return "text/html"
+
+
+def test_e2m_parser_crawl_dedup(html_copies, monkeypatch):
+    (html_copies / "index.html").write_text(
+        '<a href="page.html">Page</a><a href="page_print.html">Print</a>'
+        '<a href="other.html">Other</a>',
+        "utf-8",
+    )
+    handler = functools.partial(ReaderSiteHandler, directory=str(html_copies))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    site = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr("wisup_e2m.parsers.doc.url_parser.JINA_READER_URL", site + "/")
+
+    config = E2MParserConfig(
+        parsers={"url_parser": {"engine": "jina", "host_requests_per_second": 0}},
+        dedup_mode="skip",
+    )
+    try:
+        results = list(E2MParser(config).crawl(site + "/index.html", concurrency=1))
+    finally:
+        server.shutdown()
+
+    parsed = {result.url.removeprefix(site): result.parsed_data for result in results}
+    assert set(parsed) == {"/index.html", "/page.html", "/page_print.html", "/other.html"}
+    assert parsed["/page_print.html"].metadata["duplicate_of"] == site + "/page.html"
+    assert parsed["/page_print.html"].text == ""
+    assert "duplicate_of" not in parsed["/page.html"].metadata
+    assert "duplicate_of" not in parsed["/other.html"].metadata
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
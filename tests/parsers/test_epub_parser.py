@@ -0,0 +1,70 @@
+import hashlib
+import time
+import logging
+import zipfile
+from wisup_e2m.parsers.doc.epub_parser import EpubParser
+from wisup_e2m.parsers.base import E2MParsedData
+from pathlib import Path
+import pytest
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+pwd = Path(__file__).parent
+test_epub_path = str(pwd / "test.epub")
+
+
+@pytest.mark.parametrize("engine", ["unstructured", "native"])
+def test_epub_parser(engine):
+    start_time = time.time()
+
+    parser = EpubParser(engine=engine)
+    parsed_data = parser.parse(test_epub_path)
+
+    assert isinstance(parsed_data, E2MParsedData)
+    assert parsed_data.text is not None
+    assert parsed_data.attached_images is not None
+
+    end_time = time.time()
+    logger.info(f"Test for engine '{engine}' took {end_time - start_time:.4f} seconds")
+
+
+def test_epub_parser_native_spine_and_images():
+    parser = EpubParser(engine="native")
+    parsed_data = parser.parse(test_epub_path)
+
+    # spine 顺序为 ch2, ch1, ch0，与文件名顺序相反
+    positions = [parsed_data.text.index(f"# Chapter {i}") for i in (2, 1, 0)]
+    assert positions == sorted(positions)
+
+    with zipfile.ZipFile(test_epub_path) as zip_ref:
+        digest = hashlib.sha256(zip_ref.read("EPUB/images/pic one.png")).hexdigest()
+    assert f"![pic](figures/{digest}.png)" in parsed_data.text
+    assert list(parsed_data.attached_images) == [digest]
+    assert parsed_data.attached_images[digest].digest == digest
+
+
+def test_epub_parser_native_chapter_workers(monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+
+    sources = []
+    submit = ProcessPoolExecutor.submit
+
+    def _submit(self, fn, source, *args, **kwargs):
+        sources.append(source)
+        return submit(self, fn, source, *args, **kwargs)
+
+    monkeypatch.setattr(ProcessPoolExecutor, "submit", _submit)
+
+    expected = EpubParser(engine="native").parse(test_epub_path).text
+    parser = EpubParser(engine="native", chapter_workers=2)
+    with open(test_epub_path, "rb") as f:
+        assert parser.parse(file=f).text == expected
+
+    # 内容只写一次临时文件，worker 收到的是路径
+    assert sources and len(set(sources)) == 1 and isinstance(sources[0], str)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -13,7 +13,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@pytest.mark.parametrize("engine", ["unstructured"])
+@pytest.mark.parametrize("engine", ["unstructured", "native"])
 def test_html_parser(engine):
     start_time = time.time()
 
@@ -28,5 +28,44 @@ def test_html_parser(engine):
     logger.info(f"Test for engine '{engine}' took {end_time - start_time:.4f} seconds")
 
 
+def test_html_parser_streaming():
+    parser = HtmlParser(engine="native")
+    parsed_data = parser.parse(test_html_path)
+
+    streaming_parser = HtmlParser(engine="native", streaming=True)
+    sections = list(streaming_parser.iter_parsed_sections(test_html_path))
+
+    assert len(sections) > 1
+    assert all(isinstance(section, E2MParsedData) for section in sections)
+    assert "\n\n".join(section.text for section in sections) == parsed_data.text
+    assert streaming_parser.parse(test_html_path).text == parsed_data.text
+
+
+def test_html_parser_main_content():
+    parsed_data = HtmlParser(engine="native").parse(test_html_path)
+    main_content = HtmlParser(engine="native", extract_main_content=True).parse(test_html_path)
+
+    assert 0 < main_content.metadata["main_content_removed_chars"] < len(parsed_data.text)
+
+    # 导航、评论区和侧栏被去掉
+    for boilerplate in [
+        "# Post navigation",
+        "Git Super-Power: The Three-Way Merge",
+        "Leave a Reply",
+        "## About Me",
+        "Latest Posts",
+    ]:
+        assert boilerplate in parsed_data.text
+        assert boilerplate not in main_content.text
+
+    # 正文段落保留
+    for paragraph in [
+        "## `vmsplice` is *too* fast",
+        "Some programs use a particular system call",
+        "[Someone at Hacker News has the answer!]",
+    ]:
+        assert paragraph in main_content.text
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
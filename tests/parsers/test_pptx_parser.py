@@ -13,7 +13,7 @@ pwd = Path(__file__).parent
 test_pptx_path = str(pwd / "test.pptx")
 
 
-@pytest.mark.parametrize("engine", ["unstructured"])
+@pytest.mark.parametrize("engine", ["unstructured", "native"])
 def test_pptx_parser(engine):
     start_time = time.time()
 
@@ -1,3 +1,11 @@
+import asyncio
+import base64
+import functools
+import http.server
+import io
+import json
+import shutil
+import threading
 import time
 import logging
 from wisup_e2m.parsers.doc.url_parser import UrlParser
@@ -10,6 +18,11 @@ logger = logging.getLogger(__name__)
 
 url = "https://docusaurus.io/docs"
 
+# 1x1 的透明 png
+PIC_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
 
 @pytest.mark.parametrize("engine", ["jina", "unstructured"])
 def test_url_parser(engine):
@@ -27,5 +40,240 @@ def test_url_parser(engine):
     logger.info(f"Test for engine '{engine}' took {run_time:.4f} seconds")
 
 
+@pytest.mark.parametrize("engine", ["jina", "unstructured"])
+def test_url_parser_async(engine):
+    parser = UrlParser(engine=engine)
+
+    async def _parse_many():
+        try:
+            return await asyncio.gather(parser.aparse(url), parser.aparse(url))
+        finally:
+            await parser.aclose()
+
+    for parsed_data in asyncio.run(_parse_many()):
+        assert isinstance(parsed_data, E2MParsedData)
+        assert parsed_data.text is not None
+
+
+@pytest.mark.parametrize("engine", ["jina", "unstructured"])
+def test_url_parser_parse_many(engine):
+    parser = UrlParser(engine=engine)
+    results = list(parser.parse_many([url, url + "#top", url]))
+
+    assert len(results) == 1
+    assert results[0].error is None
+    assert isinstance(results[0].parsed_data, E2MParsedData)
+    assert results[0].parsed_data.metadata["url"] == url
+
+
+@pytest.fixture
+def slow_parser(monkeypatch):
+    parser = UrlParser(engine="jina", host_requests_per_second=0)
+
+    async def _aparse(url=None, **kwargs):
+        await asyncio.sleep(0.01)
+        return E2MParsedData(text=url)
+
+    monkeypatch.setattr(parser, "aparse", _aparse)
+    return parser
+
+
+def test_url_parser_parse_many_close(slow_parser):
+    # url 比队列长得多，提前停止时 frontier 是满的
+    urls = [f"https://example.com/{i}" for i in range(100)]
+
+    async def _take_one():
+        results = slow_parser.aparse_many(urls, concurrency=2)
+        result = await results.__anext__()
+        await asyncio.wait_for(results.aclose(), 5)
+        return result
+
+    assert asyncio.run(_take_one()).error is None
+
+    def _take_one_sync():
+        results = slow_parser.parse_many(urls, concurrency=2)
+        next(results)
+        results.close()
+
+    thread = threading.Thread(target=_take_one_sync, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+@pytest.fixture
+def static_site(tmp_path):
+    (tmp_path / "docs" / "guide").mkdir(parents=True)
+    (tmp_path / "docs" / "index.html").write_text(
+        '<h1>Docs</h1><a href="guide/">Guide</a><a href="/blog/">Blog</a>'
+    )
+    (tmp_path / "docs" / "guide" / "index.html").write_text(
+        '<h1>Guide</h1><a href="../">Docs</a><a href="../api.html#top">API</a>'
+    )
+    (tmp_path / "docs" / "api.html").write_text("<h1>API</h1><p>Reference</p>")
+    (tmp_path / "docs" / "orphan.html").write_text("<h1>Orphan</h1>")
+    (tmp_path / "blog").mkdir()
+    (tmp_path / "blog" / "index.html").write_text("<h1>Blog</h1>")
+
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(tmp_path))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    (tmp_path / "sitemap.xml").write_text(
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f"<url><loc>{base_url}/docs/orphan.html</loc></url></urlset>"
+    )
+    yield base_url
+    server.shutdown()
+
+
+def test_url_parser_crawl(static_site):
+    parser = UrlParser(engine="unstructured", host_requests_per_second=0)
+    results = list(parser.crawl(static_site + "/docs/"))
+
+    crawled = {result.url.removeprefix(static_site) for result in results}
+    assert crawled == {"/docs/", "/docs/guide/", "/docs/api.html", "/docs/orphan.html"}
+    for result in results:
+        assert result.error is None
+        assert isinstance(result.parsed_data, E2MParsedData)
+
+    results = list(parser.crawl(static_site + "/docs/", max_depth=0))
+    assert {result.url.removeprefix(static_site) for result in results} == {
+        "/docs/",
+        "/docs/orphan.html",
+    }
+
+
+class FirecrawlStubHandler(http.server.BaseHTTPRequestHandler):
+    """Scrapes one more page on every status poll, up to ``pages`` pages, the job completes
+    after ``complete_after`` polls"""
+
+    pages = 3
+    complete_after = 3
+    polls = 0
+    cancelled = False
+
+    def _send_json(self, result):
+        body = json.dumps(result).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self._send_json({"success": True, "id": "job"})
+
+    def do_GET(self):
+        cls = type(self)
+        cls.polls += 1
+        skip = int(self.path.partition("skip=")[2] or 0)
+        pages = [
+            {"markdown": f"# Page {i}", "metadata": {"sourceURL": f"https://example.com/{i}"}}
+            for i in range(skip, min(cls.polls, cls.pages))
+        ]
+        status = "completed" if cls.polls >= cls.complete_after else "scraping"
+        self._send_json({"status": status, "data": pages})
+
+    def do_DELETE(self):
+        type(self).cancelled = True
+        self._send_json({"status": "cancelled"})
+
+
+@pytest.fixture
+def firecrawl_stub():
+    handler = type("Handler", (FirecrawlStubHandler,), {})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", handler
+    server.shutdown()
+
+
+def test_url_parser_firecrawl_crawl(firecrawl_stub):
+    api_url, handler = firecrawl_stub
+    parser = UrlParser(
+        engine="firecrawl", api_key="fc-test", firecrawl_api_url=api_url, firecrawl_poll_interval=0
+    )
+
+    results = list(parser.crawl("https://example.com/"))
+    assert [result.url for result in results] == [f"https://example.com/{i}" for i in range(3)]
+    assert results[0].parsed_data.text == "# Page 0"
+    assert results[0].parsed_data.metadata["engine"] == "firecrawl"
+    assert not handler.cancelled
+
+    # 第一页之后不再有新页面，停止迭代时应立即取消任务
+    handler.polls, handler.pages, handler.complete_after = 0, 1, 10**6
+    crawl = parser.crawl("https://example.com/")
+    next(crawl)
+    crawl.close()
+    polls = handler.polls
+    assert handler.cancelled
+    time.sleep(0.2)
+    assert handler.polls == polls
+
+
+class ReaderSiteHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the page and its image, and a jina reader stub under ``/http...``"""
+
+    requests = []
+
+    def send_head(self):
+        if not self.path.startswith("/http"):
+            return super().send_head()
+        page_url = self.path[1:]
+        body = f"# Page\n\n![pic]({page_url.rsplit('/', 1)[0]}/pic.png)\n".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def log_request(self, code="-", size="-"):
+        type(self).requests.append((self.command, self.path, int(code)))
+
+
+@pytest.fixture
+def reader_site(tmp_path, monkeypatch):
+    site_dir = tmp_path / "site"
+    site_dir.mkdir()
+    (site_dir / "page.html").write_text("<h1>Page</h1>")
+    (site_dir / "pic.png").write_bytes(PIC_PNG)
+
+    handler = type("Handler", (ReaderSiteHandler,), {"requests": []})
+    handler = functools.partial(handler, directory=str(site_dir))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr("wisup_e2m.parsers.base.JINA_READER_URL", base_url + "/")
+    yield base_url, handler.func.requests
+    server.shutdown()
+
+
+def test_url_parser_http_cache(reader_site, tmp_path):
+    base_url, requests = reader_site
+    parser = UrlParser(engine="jina", http_cache=True, http_cache_dir=str(tmp_path / "cache"))
+    parse_kwargs = {
+        "url": base_url + "/page.html",
+        "download_image": True,
+        "work_dir": str(tmp_path),
+        "image_dir": str(tmp_path / "figures"),
+    }
+
+    parsed_data = parser.parse(**parse_kwargs)
+    assert "http_cache" not in parsed_data.metadata
+    image_paths = [tmp_path / image.image_path for image in parsed_data.attached_images.values()]
+    assert len(image_paths) == 1 and image_paths[0].read_bytes() == PIC_PNG
+
+    # 页面未修改：源站只收到一个条件 HEAD 并返回 304，图片从缓存中恢复
+    shutil.rmtree(tmp_path / "figures")
+    del requests[:]
+    cached = parser.parse(**parse_kwargs)
+    assert cached.metadata["http_cache"] == "hit"
+    assert cached.text == parsed_data.text
+    assert requests == [("HEAD", "/page.html", 304)]
+    assert image_paths[0].read_bytes() == PIC_PNG
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
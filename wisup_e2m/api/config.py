@@ -1,7 +1,12 @@
 import os
 
-UPLOAD_DIR = "./uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# 上传文件保存在 scratch 目录中，可通过 E2M_SCRATCH_DIR 指向 tmpfs
+SCRATCH_DIR = os.getenv("E2M_SCRATCH_DIR")
+# 单个上传文件的最大字节数
+MAX_UPLOAD_SIZE = int(os.getenv("E2M_MAX_UPLOAD_SIZE", 200 * 1024 * 1024))
+# scratch 目录的总大小上限，未设置时不限制
+SCRATCH_TOTAL_QUOTA = int(os.getenv("E2M_SCRATCH_TOTAL_QUOTA", 0)) or None
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 # [
 #     {
 #         "image_path": str,
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, Form, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -16,6 +17,8 @@ from wisup_e2m.api.models import (
 from wisup_e2m.converters.base import ConvertHelpfulInfo
 from wisup_e2m.api.services import parse_file_service, convert_data_service
 from wisup_e2m.api.dependencies import get_parser, get_converter
+from wisup_e2m.api.config import SCRATCH_DIR, SCRATCH_TOTAL_QUOTA
+from wisup_e2m.utils.scratch import configure_scratch
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -23,8 +26,17 @@ logger = logging.getLogger(__name__)
 pwd = Path(__file__).parent.resolve()
 static_dir = str(pwd / "static")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # scratch 目录在启动时配置一次，导入模块不会清理正在运行的 job
+    configure_scratch(SCRATCH_DIR, total_quota=SCRATCH_TOTAL_QUOTA)
+    yield
+
+
 # 创建 FastAPI 实例
 app = FastAPI(
+    lifespan=lifespan,
     title="E2M API",
     description="API for converting various file formats to Markdown using different parsers and converters.",
     version="0.1.63",
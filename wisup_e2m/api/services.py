@@ -1,31 +1,42 @@
-import os
 import logging
+from pathlib import Path
 from typing import Optional, Union
 import aiofiles
-import aiofiles.os
 from fastapi import UploadFile, HTTPException
 from wisup_e2m.parsers.base import BaseParser, E2MParsedData
 from wisup_e2m.parsers.main import E2MParser
 from wisup_e2m.api.models import ParseRequest, ParseResponse, ConvertRequest, ConvertResponse
-from wisup_e2m.api.config import UPLOAD_DIR
+from wisup_e2m.api.config import MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+from wisup_e2m.utils.scratch import ScratchJob, ScratchQuotaExceeded, scratch_job
 
 logger = logging.getLogger(__name__)
 
 
-async def save_upload_file(upload_file: UploadFile) -> str:
+async def save_upload_file(upload_file: UploadFile, job: ScratchJob) -> str:
     """
-    Save the uploaded file to the specified upload directory.
+    Stream the uploaded file into the scratch job directory.
+
+    The file gets a generated name, only the extension of the client filename is kept
+    so the file type can still be determined.
 
     :param upload_file: The file to be uploaded.
+    :param job: The scratch job to save the file in.
     :return: The path where the file is saved.
-    :raises HTTPException: If there's an error during file saving.
+    :raises HTTPException: If the file is too large or there's an error during file saving.
     """
-    file_path = os.path.join(UPLOAD_DIR, upload_file.filename)
+    file_path = job.new_path(suffix=Path(upload_file.filename or "").suffix)
     try:
+        size = 0
         async with aiofiles.open(file_path, "wb") as out_file:
-            content = await upload_file.read()
-            await out_file.write(content)
-        return file_path
+            while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if job.quota is not None and size > job.quota:
+                    raise ScratchQuotaExceeded(f"File is larger than {job.quota} bytes")
+                await out_file.write(chunk)
+        job.check_quota()
+        return str(file_path)
+    except ScratchQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=f"Failed to save file: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
@@ -42,57 +53,54 @@ async def parse_file_service(
     :return: ParseResponse containing the parsed data.
     :raises HTTPException: If there's an error during parsing or file handling.
     """
-    file_path = None
-    try:
-        # Validate input: either file or URL must be provided
-        if not file and not request.url:
-            raise ValueError("Either file or URL must be provided")
-
-        # Save the uploaded file if present
-        if file:
-            file_path = await save_upload_file(file)
-
-        # Add a log before parsing
-        logger.info(f"Starting to parse {'file' if file else 'URL'}")
-
-        # Parse the file or URL
-        parsed_data: E2MParsedData = parser.parse(
-            file_name=file_path,
-            url=request.url,
-            start_page=request.start_page,
-            end_page=request.end_page,
-            extract_images=request.extract_images,
-            include_image_link_in_text=request.include_image_link_in_text,
-            work_dir=request.work_dir,
-            image_dir=request.image_dir,
-            relative_path=request.relative_path,
-            include_page_breaks=request.include_page_breaks,
-            include_slide_notes=request.include_slide_notes,
-            ignore_transparent_images=request.ignore_transparent_images,
-        )
-
-        if not parsed_data:
-            raise ValueError("No data found in the input file or URL")
-
-        parse_response = ParseResponse(**parsed_data.to_dict())
-        parse_response.set_image_to_base64()
-
-        logger.info(f"Successfully parsed data for {'file' if file else 'URL'}")
-
-        return parse_response
-
-    except ValueError as ve:
-        raise HTTPException(status_code=400, detail=str(ve))
-    except Exception as e:
-        logger.error(f"Error in parse_file_service: {str(e)}")
-        raise HTTPException(status_code=500, detail="An error occurred during parsing")
-    finally:
-        # Clean up the temporary file
-        if file_path:
-            try:
-                await aiofiles.os.remove(file_path)
-            except Exception as e:
-                logger.error(f"Failed to remove file: {str(e)}")
+    # The uploaded file lives in its own scratch job, removed after parsing
+    with scratch_job("upload", quota=MAX_UPLOAD_SIZE) as job:
+        file_path = None
+        try:
+            # Validate input: either file or URL must be provided
+            if not file and not request.url:
+                raise ValueError("Either file or URL must be provided")
+
+            # Save the uploaded file if present
+            if file:
+                file_path = await save_upload_file(file, job)
+
+            # Add a log before parsing
+            logger.info(f"Starting to parse {'file' if file else 'URL'}")
+
+            # Parse the file or URL
+            parsed_data: E2MParsedData = parser.parse(
+                file_name=file_path,
+                url=request.url,
+                start_page=request.start_page,
+                end_page=request.end_page,
+                extract_images=request.extract_images,
+                include_image_link_in_text=request.include_image_link_in_text,
+                work_dir=request.work_dir,
+                image_dir=request.image_dir,
+                relative_path=request.relative_path,
+                include_page_breaks=request.include_page_breaks,
+                include_slide_notes=request.include_slide_notes,
+                ignore_transparent_images=request.ignore_transparent_images,
+            )
+
+            if not parsed_data:
+                raise ValueError("No data found in the input file or URL")
+
+            parse_response = ParseResponse(**parsed_data.to_dict())
+            parse_response.set_image_to_base64()
+
+            logger.info(f"Successfully parsed data for {'file' if file else 'URL'}")
+
+            return parse_response
+
+        except HTTPException:
+            raise
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        except Exception as e:
+            logger.error(f"Error in parse_file_service: {str(e)}")
+            raise HTTPException(status_code=500, detail="An error occurred during parsing")
 
 
 async def convert_data_service(request: ConvertRequest, converter) -> ConvertResponse:
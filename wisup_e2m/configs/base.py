@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from pydantic import BaseModel, Field
 
@@ -9,6 +9,28 @@ class E2MParserConfig(BaseModel):
         {},
         description="Configuration for parsers",
     )
+    route_urls: bool = Field(
+        True,
+        description="Whether urls pointing to documents (pdf, docx, pptx, ...) are downloaded "
+        "and parsed by the parser of their file type instead of the url parser",
+    )
+    url_download_max_size: int = Field(
+        500, description="Max size in MB of a document downloaded from a url"
+    )
+    dedup_mode: Optional[str] = Field(
+        None,
+        description="What to do with a parsed text that is a near duplicate of one parsed "
+        "before: 'link' keeps it and reports the match in metadata, 'skip' drops its text and "
+        "images, None turns the check off",
+    )
+    dedup_threshold: float = Field(
+        0.9, description="Min estimated similarity between 0 and 1 for two texts to be duplicates"
+    )
+    dedup_index_path: Optional[str] = Field(
+        None,
+        description="A JSON lines file the near-duplicate index is persisted to, so duplicates "
+        "are found across runs, None for an in-memory index",
+    )
 
 
 class E2MConverterConfig(BaseModel):
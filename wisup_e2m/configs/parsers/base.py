@@ -23,5 +23,19 @@ class BaseParserConfig(BaseModel):
     client_max_redirects: int = Field(5, description="Client max redirects")
     client_proxy: Optional[str] = Field(None, description="Client proxy")
 
+    # http cache settings
+    http_cache: bool = Field(
+        False,
+        description="Whether to cache http responses on disk and revalidate them with "
+        "ETag / Last-Modified instead of fetching them again",
+    )
+    http_cache_dir: Optional[str] = Field(
+        None, description="Directory of the http cache, defaults to the user cache directory"
+    )
+    http_cache_max_size: int = Field(1024, description="Max size of the http cache in MB")
+    http_cache_max_entry_size: int = Field(
+        100, description="Responses larger than this (in MB) are not cached"
+    )
+
     class Config:
         extra = "allow"
@@ -1,6 +1,7 @@
-from wisup_e2m.configs.parsers.base import BaseParserConfig
+from wisup_e2m.configs.parsers.docx_parser_config import DocxParserConfig
+from wisup_e2m.configs.parsers.libreoffice_parser_config import LibreOfficeParserConfig
 
 
-class DocParserConfig(BaseParserConfig):
+class DocParserConfig(DocxParserConfig, LibreOfficeParserConfig):
 
     pass
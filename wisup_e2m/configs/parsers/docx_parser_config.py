@@ -1,6 +1,17 @@
+from typing import Optional
+
+from pydantic import Field
+
 from wisup_e2m.configs.parsers.base import BaseParserConfig
 
 
 class DocxParserConfig(BaseParserConfig):
 
-    pass
+    pandoc_server_url: Optional[str] = Field(
+        None,
+        description="URL of a running pandoc-server, e.g. http://localhost:3030. "
+        "The pandoc CLI is used if not set",
+    )
+    pandoc_workers: int = Field(
+        4, description="Number of documents converted at the same time by parse_many"
+    )
@@ -1,6 +1,12 @@
+from pydantic import Field
+
 from wisup_e2m.configs.parsers.base import BaseParserConfig
 
 
 class EpubParserConfig(BaseParserConfig):
 
-    pass
+    chapter_workers: int = Field(
+        0,
+        description="Number of worker processes the native engine renders chapters with, "
+        "0 renders all chapters in the current process",
+    )
@@ -1,6 +1,22 @@
+from pydantic import Field
+
 from wisup_e2m.configs.parsers.base import BaseParserConfig
 
 
 class HtmlParserConfig(BaseParserConfig):
 
-    pass
+    streaming: bool = Field(
+        False,
+        description="Whether the native engine parses the html incrementally, keeping only the "
+        "section being rendered in memory instead of the whole DOM",
+    )
+    section_max_chars: int = Field(
+        100_000,
+        description="Max characters of a section emitted by the streaming mode, longer runs "
+        "without a heading are split at block boundaries",
+    )
+    extract_main_content: bool = Field(
+        False,
+        description="Whether to keep only the main content of the page after parsing, dropping "
+        "navigation, banners, sidebars and footers",
+    )
@@ -0,0 +1,29 @@
+from typing import Optional
+
+from pydantic import Field
+
+from wisup_e2m.configs.parsers.base import BaseParserConfig
+
+
+class LibreOfficeParserConfig(BaseParserConfig):
+    """
+    Settings of the parsers converting legacy files with LibreOffice first.
+    """
+
+    libreoffice_pool_size: int = Field(
+        0,
+        description="Number of long-running LibreOffice listeners used to convert legacy files, "
+        "0 starts a new soffice process per file",
+    )
+    libreoffice_max_conversions: int = Field(
+        100, description="Restart a LibreOffice listener after this many conversions"
+    )
+    conversion_cache: bool = Field(
+        True, description="Cache converted files by the sha256 of the input file"
+    )
+    conversion_cache_dir: Optional[str] = Field(
+        None, description="Conversion cache directory, defaults to the user cache directory"
+    )
+    conversion_cache_max_size: int = Field(
+        1024, description="Max size of the conversion cache in MB"
+    )
@@ -1,6 +1,7 @@
-from wisup_e2m.configs.parsers.base import BaseParserConfig
+from wisup_e2m.configs.parsers.pptx_parser_config import PptxParserConfig
+from wisup_e2m.configs.parsers.libreoffice_parser_config import LibreOfficeParserConfig
 
 
-class PptParserConfig(BaseParserConfig):
+class PptParserConfig(PptxParserConfig, LibreOfficeParserConfig):
 
     pass
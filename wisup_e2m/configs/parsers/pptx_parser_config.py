@@ -1,6 +1,13 @@
+from pydantic import Field
+
 from wisup_e2m.configs.parsers.base import BaseParserConfig
 
 
 class PptxParserConfig(BaseParserConfig):
 
-    pass
+    slide_workers: int = Field(
+        0,
+        description="Number of worker processes the native engine renders slides with, "
+        "0 renders all slides in the current process",
+    )
+    slide_shard_size: int = Field(50, description="Number of slides rendered per worker task")
@@ -6,3 +6,67 @@ from pydantic import Field
 class UrlParserConfig(BaseParserConfig):
 
     api_key: Optional[str] = Field(None, description="API key for FireCrawl API")
+    extract_main_content: bool = Field(
+        False,
+        description="Whether to keep only the main content of the page after parsing, dropping "
+        "navigation, banners, sidebars and footers",
+    )
+    image_download_workers: int = Field(
+        8, description="Number of images downloaded at the same time when download_image is on"
+    )
+    image_max_size: int = Field(
+        20,
+        description="Max size of a downloaded image in MB, larger images are skipped, "
+        "0 for no limit",
+    )
+
+    # async client settings, used by UrlParser.aparse
+    client_http2: bool = Field(True, description="Whether the async client uses HTTP/2")
+    client_max_connections: int = Field(100, description="Max connections of the async client pool")
+    client_max_connections_per_host: int = Field(
+        10, description="Max requests in flight per host of the async client, 0 for no limit"
+    )
+    client_keepalive_expiry: float = Field(
+        30, description="Seconds an idle keep-alive connection of the async client is kept open"
+    )
+
+    # batch settings, used by UrlParser.parse_many / aparse_many
+    batch_concurrency: int = Field(16, description="Max urls parsed at the same time")
+    host_requests_per_second: float = Field(
+        2, description="Max requests started per second per host, 0 for no limit"
+    )
+    max_retries: int = Field(3, description="Times a url is retried after a retryable error")
+    retry_backoff: float = Field(
+        1, description="Base seconds of the exponential backoff between retries"
+    )
+
+    # crawl settings, used by UrlParser.crawl / acrawl
+    crawl_max_depth: int = Field(
+        3, description="Max number of links followed from a start url or a sitemap entry"
+    )
+    crawl_max_pages: int = Field(100, description="Max pages parsed by one crawl")
+    crawl_use_sitemap: bool = Field(
+        True, description="Whether the pages listed in robots.txt and sitemap.xml are crawled"
+    )
+    crawl_respect_robots: bool = Field(
+        True, description="Whether pages disallowed by robots.txt are skipped"
+    )
+    crawl_under_start_path: bool = Field(
+        True,
+        description="Whether only pages under the directory of the start urls are crawled, "
+        "e.g. /docs/ for https://example.com/docs/intro",
+    )
+
+    # firecrawl settings, used by UrlParser.crawl / acrawl with the firecrawl engine
+    firecrawl_api_url: Optional[str] = Field(
+        None, description="Endpoint of the firecrawl API, defaults to https://api.firecrawl.dev"
+    )
+    firecrawl_poll_interval: float = Field(
+        2, description="Seconds between polls of a firecrawl crawl job while pages come in"
+    )
+    firecrawl_max_poll_interval: float = Field(
+        30, description="Max seconds between polls of a firecrawl crawl job"
+    )
+    firecrawl_timeout: Optional[float] = Field(
+        None, description="Max seconds to wait for a firecrawl crawl job, None for no limit"
+    )
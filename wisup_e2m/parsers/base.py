@@ -1,11 +1,12 @@
 # e2m/parsers/base.py
 import logging
 import re
-import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from uuid import uuid4
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
 import httpx
 from PIL import Image, ImageFile
@@ -13,8 +14,17 @@ from pydantic import BaseModel, Field, ValidationError
 from tqdm import tqdm
 
 from wisup_e2m.configs.parsers.base import BaseParserConfig
+from wisup_e2m.utils.http_cache import CachingTransport, HttpCache, get_http_cache
 from wisup_e2m.utils.image_util import BLUE_BGR, GREEN_BGR, RED_BGR, YELLOW_BGR
-from wisup_e2m.utils.web_util import download_internet_image, get_web_content
+from wisup_e2m.utils.web_util import (
+    DEFAULT_HEADERS,
+    JINA_READER_URL,
+    download_internet_image,
+    get_web_content,
+)
+
+if TYPE_CHECKING:
+    from wisup_e2m.utils.image_store import StoredImage
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +41,9 @@ class E2MParsedImageData(BaseModel):
     children_image_ids: List[str] = Field(
         default_factory=list, description="List of paths or identifiers of child images"
     )
+    digest: Optional[str] = Field(
+        None, description="sha256 of the image content, the same image has the same digest"
+    )
 
     def to_dict(self):
         return self.model_dump()
@@ -80,20 +93,37 @@ class BaseParser(ABC):
         else:
             self.config = config
 
-        self.client = httpx.Client(
-            headers={
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-                "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7",
-            },
-            timeout=self.config.client_timeout,
-            max_redirects=self.config.client_max_redirects,
-            proxy=self.config.client_proxy,
-        )
-
         for k, v in config_kwargs.items():
             setattr(self.config, k, v)
 
+        http_cache = self._get_http_cache()
+        if http_cache is not None:
+            self.client = httpx.Client(
+                headers=DEFAULT_HEADERS,
+                timeout=self.config.client_timeout,
+                max_redirects=self.config.client_max_redirects,
+                transport=CachingTransport(
+                    httpx.HTTPTransport(proxy=self.config.client_proxy), http_cache
+                ),
+            )
+        else:
+            self.client = httpx.Client(
+                headers=DEFAULT_HEADERS,
+                timeout=self.config.client_timeout,
+                max_redirects=self.config.client_max_redirects,
+                proxy=self.config.client_proxy,
+            )
+
+    def _get_http_cache(self) -> Optional[HttpCache]:
+        """The http cache shared by parsers with the same settings, None if disabled"""
+        if not getattr(self.config, "http_cache", False):
+            return None
+        return get_http_cache(
+            getattr(self.config, "http_cache_dir", None),
+            getattr(self.config, "http_cache_max_size", 1024) * 1024 * 1024,
+            getattr(self.config, "http_cache_max_entry_size", 100) * 1024 * 1024,
+        )
+
     @classmethod
     def from_config(cls, config_dict: Dict[str, Any]):
         """
@@ -170,10 +200,12 @@ class BaseParser(ABC):
             self._load_openai_whisper_local_engine()
         elif self.config.engine == "openai_whisper_api":
             self._load_openai_whisper_api_engine()
-        elif self.config.engine == "xml":
+        elif self.config.engine in ("xml", "native"):
             pass
         elif self.config.engine == "pandoc":
             self._load_pandoc_engine()
+        elif self.config.engine == "pandoc_ast":
+            self._load_pandoc_engine()
         elif self.config.engine == "firecrawl":
             self._load_firecrawl_engine()
 
@@ -243,8 +275,7 @@ class BaseParser(ABC):
 
         def _parse_url_by_jina(url: str):
 
-            jina_base_url = "https://r.jina.ai/"
-            return get_web_content(jina_base_url + url, client=self.client)
+            return get_web_content(JINA_READER_URL + url, client=self.client)
 
         self.jina_parse_func = _parse_url_by_jina
         logger.info("Jina engine loaded successfully.")
@@ -283,6 +314,10 @@ class BaseParser(ABC):
         self.openai_whisper_api_func = transcription
 
     def _load_firecrawl_engine(self):
+        # 爬取通过 REST API 进行，不需要 sdk；sdk 只在第一次用到时导入，见 _get_firecrawl_app
+        self.firecrawl_app = None
+
+    def _get_firecrawl_app(self):
         """
         from firecrawl import FirecrawlApp
 
@@ -296,6 +331,9 @@ class BaseParser(ABC):
         for result in crawl_result:
             print(result["markdown"])
         """
+        if self.firecrawl_app is not None:
+            return self.firecrawl_app
+
         try:
             from firecrawl import FirecrawlApp
         except ImportError:
@@ -304,6 +342,7 @@ class BaseParser(ABC):
             ) from None
 
         self.firecrawl_app = FirecrawlApp(api_key=self.config.api_key)  # FIRECRAWL_API_KEY
+        return self.firecrawl_app
 
     def _load_pandoc_engine(self):
         import shutil
@@ -330,6 +369,35 @@ class BaseParser(ABC):
                 "pypandoc is not installed. Please install it using `pip install pypandoc`"
             )
 
+    def _extract_main_content(self, parsed_data: E2MParsedData) -> E2MParsedData:
+        """Keep only the main content of a parsed web page
+
+        Navigation, cookie banners, sidebars and footers are dropped by
+        :func:`wisup_e2m.utils.content_util.extract_main_content`, attached images that are no
+        longer referenced by the text are dropped with them. The number of removed characters is
+        reported as ``main_content_removed_chars`` in the metadata.
+        """
+        from wisup_e2m.utils.content_util import extract_main_content
+
+        if not parsed_data.text:
+            parsed_data.metadata["main_content_removed_chars"] = 0
+            return parsed_data
+
+        content = extract_main_content(parsed_data.text)
+        logger.info(
+            f"Kept {content.kept_blocks}/{content.total_blocks} blocks as main content, "
+            f"removed {content.removed_chars} characters"
+        )
+
+        parsed_data.text = content.text
+        parsed_data.attached_images = {
+            image_id: image
+            for image_id, image in parsed_data.attached_images.items()
+            if image.image_path in content.text
+        }
+        parsed_data.metadata["main_content_removed_chars"] = content.removed_chars
+        return parsed_data
+
     def _prepare_unstructured_data_to_e2m_parsed_data(
         self,
         data: List[Any],  # List[unstructured.documents.elements.Element]
@@ -358,18 +426,20 @@ class BaseParser(ABC):
         """
 
         work_dir = Path(work_dir).resolve()
-        image_dir = Path(image_dir).resolve()
+        from wisup_e2m.utils.image_store import ImageStore
 
-        image_dir.mkdir(parents=True, exist_ok=True)
+        store = ImageStore(image_dir)
 
-        # mv figures to image_dir
+        # 把图片移入按内容哈希命名的图片目录，多个元素可能引用同一个文件
+        stored_images: Dict[str, "StoredImage"] = {}
         for element in data:
             if element.category == "Image":
                 image_path = element.metadata.image_path
-                image_name = Path(image_path).name
-                new_image_path = image_dir / image_name
-                shutil.move(str(image_path), str(new_image_path))
-                element.metadata.image_path = str(new_image_path.resolve())
+                if image_path not in stored_images:
+                    stored_images[image_path] = store.put_file(image_path)
+                stored = stored_images[image_path]
+                element.metadata.image_path = str(stored.path)
+                stored_images[str(stored.path)] = stored
 
         attached_images = {}
         # merge text and image links
@@ -387,8 +457,14 @@ class BaseParser(ABC):
                         image_name = str(image_path.resolve())
                     text_chunks.append(f"![]({image_name})")
 
-                    attached_images[str(uuid4())] = E2MParsedImageData(
-                        image_path=image_name, page_index=element.metadata.page_number
+                    digest = stored_images[element.metadata.image_path].digest
+                    attached_images.setdefault(
+                        digest,
+                        E2MParsedImageData(
+                            image_path=image_name,
+                            page_index=element.metadata.page_number,
+                            digest=digest,
+                        ),
                     )
             elif element.text:
                 if not add_title_marker:
@@ -710,6 +786,38 @@ class BaseParser(ABC):
 
         return E2MParsedData(text=text, attached_images=attached_images, metadata=metadata)
 
+    def _download_images(self, image_links: List[str], image_dir: str) -> Dict[str, "StoredImage"]:
+        """Download images concurrently into the image store at ``image_dir``
+
+        At most ``image_download_workers`` images are downloaded at a time, each one is streamed
+        to a scratch file and then moved into the store, so no image is held in memory. Images
+        over ``image_max_size`` MB are skipped.
+
+        :return: Stored image of each link, links that failed to download are left out
+        """
+        from wisup_e2m.utils.image_store import ImageStore
+        from wisup_e2m.utils.scratch import scratch_job
+
+        store = ImageStore(image_dir)
+        workers = max(getattr(self.config, "image_download_workers", 8), 1)
+        max_size = getattr(self.config, "image_max_size", 20) * 1024 * 1024 or None
+
+        def _download(image_link: str, job) -> "StoredImage":
+            image_path = job.new_path(suffix=Path(urlparse(image_link).path).suffix)
+            download_internet_image(image_link, image_path, client=self.client, max_size=max_size)
+            return store.put_file(image_path)
+
+        downloaded = {}
+        with scratch_job("images") as job, ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_download, link, job): link for link in image_links}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                image_link = futures[future]
+                try:
+                    downloaded[image_link] = future.result()
+                except Exception as e:
+                    logger.error(f"Failing to download image: {image_link}, {e}")
+        return downloaded
+
     def _prepare_jina_data_to_e2m_parsed_data(
         self,
         text: str,
@@ -736,13 +844,14 @@ class BaseParser(ABC):
         """
 
         raw_text = text
-        image_link_pattern = re.compile(r"!\[.*?\]\((.*?)\)")
+        image_link_pattern = re.compile(r"!\[.*?\]\((?P<link>.*?)\)")
         image_links = image_link_pattern.findall(text)
 
         def is_valid_image_link(link: str):
             return re.match(r"https?://.*\.(png|jpg|jpeg|gif|webp|bmp|svg)", link)
 
-        image_links = [link for link in image_links if is_valid_image_link(link)]
+        # 同一张图片在页面中可能出现多次，只下载一次
+        image_links = list(dict.fromkeys(link for link in image_links if is_valid_image_link(link)))
         logger.info(f"Found {len(image_links)} image links in text")
 
         attached_images = {}
@@ -751,37 +860,34 @@ class BaseParser(ABC):
                 text = image_link_pattern.sub("", text)
 
             if include_image_link_in_text and download_image:
-                work_dir = Path(work_dir)
-                image_dir = Path(image_dir)
-                image_dir.mkdir(parents=True, exist_ok=True)
+                work_dir = Path(work_dir).resolve()
 
                 logger.info(f"Downloading images to {image_dir}")
-                for image_link in tqdm(image_links):
-                    logger.info(f"Downloading image: {image_link}")
-                    image_name = Path(image_link).name
-                    image_path = Path(image_dir) / image_name
-                    try:
-                        download_internet_image(
-                            image_link,
-                            image_path,
-                            client=self.client,
-                        )
-                    except Exception as e:
-                        logger.error(f"Failing to download image: {image_link}, {e}")
-                        continue
-
+                replacements = {}
+                for image_link, stored in self._download_images(image_links, image_dir).items():
                     if relative_path:
-                        md_image_path = str(image_path.relative_to(work_dir))
+                        md_image_path = str(stored.path.relative_to(work_dir))
                     else:
-                        md_image_path = str(image_path)
+                        md_image_path = str(stored.path)
+                    replacements[image_link] = md_image_path
+                    attached_images.setdefault(
+                        stored.digest,
+                        E2MParsedImageData(image_path=md_image_path, digest=stored.digest),
+                    )
 
-                    image_id = str(uuid4())
-                    attached_images[image_id] = E2MParsedImageData(
-                        image_path=md_image_path,
+                def _rewrite(match: re.Match) -> str:
+                    link = match.group("link")
+                    if link not in replacements:
+                        return match.group(0)
+                    start, end = (
+                        match.start("link") - match.start(),
+                        match.end("link") - match.start(),
                     )
-                    logger.info(f"Replaced image link {image_link} with {md_image_path}")
-                    text = text.replace(image_link, md_image_path)
-                logger.info(f"Finished downloading {len(attached_images)} images to {image_dir}")
+                    return match.group(0)[:start] + replacements[link] + match.group(0)[end:]
+
+                # 一次扫描替换所有图片链接
+                text = image_link_pattern.sub(_rewrite, text)
+                logger.info(f"Finished downloading {len(replacements)} images to {image_dir}")
 
         return E2MParsedData(
             text=text,
@@ -1,12 +1,11 @@
 # /e2m/parsers/doc_parser.py
 import logging
-from pathlib import Path
 from typing import Optional
-from uuid import uuid4
 
 from wisup_e2m.parsers.base import E2MParsedData
 from wisup_e2m.parsers.doc.docx_parser import DocxParser
 from wisup_e2m.utils.doc_util import convert_doc_to_docx
+from wisup_e2m.utils.libreoffice import LibreOfficeConversionMixin, converted_file
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +20,7 @@ _doc_parser_params = [
 ]
 
 
-class DocParser(DocxParser):
+class DocParser(LibreOfficeConversionMixin, DocxParser):
     SUPPORTED_FILE_TYPES = ["doc"]
 
     def get_parsed_data(
@@ -42,27 +41,26 @@ class DocParser(DocxParser):
 
         DocParser._validate_input_file(file_name)
 
+        def convert(input_path: str, output_path: str):
+            convert_doc_to_docx(input_path, output_path, pool=self._get_libreoffice_pool())
+
         try:
-            tmp_dir = Path(f"./.tmp/{uuid4()}")
-            tmp_dir.mkdir(parents=True, exist_ok=True)
-            tmp_file_name = tmp_dir / f"{uuid4()}.docx"
-            convert_doc_to_docx(file_name, str(tmp_file_name))
-            file_name = str(tmp_file_name)
+            with converted_file(
+                file_name, "docx", convert, cache=self._get_conversion_cache()
+            ) as converted_file_name:
+                file_name = converted_file_name
 
-            for k, v in locals().items():
-                if k in _doc_parser_params:
-                    kwargs[k] = v
+                for k, v in locals().items():
+                    if k in _doc_parser_params:
+                        kwargs[k] = v
 
-            data = super().get_parsed_data(**kwargs)
+                data = super().get_parsed_data(**kwargs)
 
-            return data
+                return data
 
         except Exception as e:
             logger.error(f"Error converting {file_name} to docx: {e}")
             raise
-        finally:
-            if tmp_file_name.exists():
-                tmp_file_name.unlink()
 
     def parse(
         self,
@@ -1,18 +1,49 @@
 # /e2m/parsers/doc/docx_parser.py
+import io
+import json
 import logging
-from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
 import re
-import shutil
-from uuid import uuid4
 from pathlib import Path
-import zipfile
+
+from lxml import etree
 
 from wisup_e2m.configs.parsers.base import BaseParserConfig
 from wisup_e2m.parsers.base import BaseParser, E2MParsedData, E2MParsedImageData
+from wisup_e2m.utils.image_store import ImageStore
 from wisup_e2m.utils.image_util import has_transparent_background
+from wisup_e2m.utils.scratch import scratch_job
 
 logger = logging.getLogger(__name__)
 
+_IMAGE_REL_TYPE_PATTERN = re.compile(
+    r"http://schemas.openxmlformats.org/officeDocument/\d+/relationships/image"
+)
+
+_DOCX_NAMESPACES = {
+    "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+}
+
+# 预编译的 XPath，避免把每个段落序列化成字符串再做正则匹配
+_NUM_PR_XPATH = etree.XPath("./w:pPr/w:numPr", namespaces=_DOCX_NAMESPACES)
+_DRAWING_EMBED_XPATH = etree.XPath(".//w:drawing//@r:embed", namespaces=_DOCX_NAMESPACES)
+
+_PANDOC_IMAGE_PATTERN = re.compile(r"!\[(?P<alt>[^\]]*)\]\((?P<src>[^)]+)\)(?:\{[^}]*\})?")
+
+# pandoc 输出中需要处理的所有片段，合并成一个正则，一次扫描完成改写
+_PANDOC_REWRITE_PATTERN = re.compile(
+    r"(?P<table><table>.*?</table>)"
+    rf"|(?P<image>{_PANDOC_IMAGE_PATTERN.pattern})"
+    r"|(?P<bold_quote_break>\*\*\s*\n>\s*\*\*)"
+    r"|(?P<bold_quote>\*\*\s*>\s*\*\*)"
+    r"|(?P<quote_end>>\s*\n)",
+    re.DOTALL,
+)
+
 _docx_parser_params = [
     "file_name",
     "extract_images",
@@ -25,23 +56,28 @@ _docx_parser_params = [
 
 
 class DocxParser(BaseParser):
-    SUPPORTED_ENGINES = ["xml", "pandoc"]
+    SUPPORTED_ENGINES = ["xml", "pandoc", "pandoc_ast"]
     SUPPORTED_FILE_TYPES = ["docx"]
 
     def __init__(self, config: Optional[BaseParserConfig] = None, **config_kwargs):
         """
         :param config: BaseParserConfig
 
-        :param engine: str, the engine to use for conversion, default is xml
+        :param engine: str, the engine to use for conversion, default is pandoc,
+            options are ['xml', 'pandoc', 'pandoc_ast']
         :param langs: List[str], the languages to use for parsing, default is ['en', 'zh']
         :param client_timeout: int, the client timeout, default is 30
         :param client_max_redirects: int, the client max redirects, default is 5
         :param client_proxy: Optional[str], the client proxy, default is None
+        :param pandoc_server_url: Optional[str], url of a running pandoc-server used by the
+            pandoc engines, default is None
+        :param pandoc_workers: int, the number of documents `parse_many` converts at the same
+            time, default is 4
         """
         super().__init__(config, **config_kwargs)
 
         if not self.config.engine:
-            self.config.engine = "pandoc"  # pandoc, xml
+            self.config.engine = "pandoc"  # pandoc, pandoc_ast, xml
             logger.info(f"No engine specified. Defaulting to {self.config.engine} engine.")
 
         self._ensure_engine_exists()
@@ -84,6 +120,16 @@ class DocxParser(BaseParser):
                 image_dir=image_dir,
                 relative_path=relative_path,
             )
+        elif self.config.engine == "pandoc_ast":
+            return self._parse_by_pandoc_ast(
+                file_name=file_name,
+                extract_images=extract_images,
+                include_image_link_in_text=include_image_link_in_text,
+                ignore_transparent_images=ignore_transparent_images,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                relative_path=relative_path,
+            )
         else:
             raise NotImplementedError(f"Engine {self.config.engine} not supported")
 
@@ -109,6 +155,52 @@ class DocxParser(BaseParser):
 
         return self.get_parsed_data(**kwargs)
 
+    def parse_many(
+        self,
+        file_names: List[str],
+        max_workers: Optional[int] = None,
+        **kwargs,
+    ) -> Iterator[Optional[E2MParsedData]]:
+        """Parse many documents with a bounded pool of workers
+
+        Results are yielded in the order of ``file_names``, None for documents that failed.
+        With ``pandoc_server_url`` configured, the pandoc engines send every document to the
+        running pandoc-server instead of starting one pandoc process per document.
+
+        :param file_names: Documents to parse
+        :param max_workers: Max number of documents converted at the same time,
+            defaults to ``pandoc_workers`` in the config
+        :param kwargs: Parameters passed to ``parse`` for every document
+        """
+        max_workers = max_workers or getattr(self.config, "pandoc_workers", 4)
+
+        def _parse(file_name: str) -> Optional[E2MParsedData]:
+            try:
+                return self.parse(file_name=file_name, **kwargs)
+            except Exception as e:
+                logger.error(f"Error parsing {file_name}: {e}")
+                return None
+
+        file_names = iter(file_names)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # 只提前提交有限数量的任务，避免大批量文档时结果堆积在内存中
+            futures = deque(
+                executor.submit(_parse, file_name)
+                for file_name in islice(file_names, max_workers * 2)
+            )
+            while futures:
+                future = futures.popleft()
+                for file_name in islice(file_names, 1):
+                    futures.append(executor.submit(_parse, file_name))
+                yield future.result()
+
+    def _load_pandoc_engine(self):
+        if getattr(self.config, "pandoc_server_url", None):
+            # pandoc-server 负责转换，本地不需要 pandoc
+            logger.info(f"Using pandoc-server at {self.config.pandoc_server_url}")
+            return
+        super()._load_pandoc_engine()
+
     def _parse_by_pandoc(
         self,
         file_name: str,
@@ -122,102 +214,228 @@ class DocxParser(BaseParser):
 
         logger.info(f"Parsing {file_name} using pandoc engine")
 
-        import pypandoc
-        import re
-        import html2text
-
         work_dir = Path(work_dir).resolve()
         image_dir = Path(image_dir).resolve()
+        with scratch_job("pandoc") as job:
+            media_dir = job.path
+
+            # Step 1: Convert docx to initial markdown
+            result = self._convert_by_pandoc(
+                file_name,
+                "markdown_phpextra",
+                media_dir=media_dir if extract_images else None,
+            )
+            job.check_quota()
 
-        # Step 1: Convert docx to initial markdown
-        result = pypandoc.convert_file(
-            file_name,
-            "markdown_phpextra",
-            extra_args=["--extract-media=" + str(image_dir)] if extract_images else [],
-            verify_format=True,
+            # Step 2: Move images out of the media folder and build the relink table
+            attached_images, image_links = self._collect_pandoc_media(
+                extract_images=extract_images,
+                ignore_transparent_images=ignore_transparent_images,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                media_dir=media_dir,
+                relative_path=relative_path,
+            )
+
+        # Step 3: Rewrite tables, images and quote markers in a single pass
+        result = self._rewrite_pandoc_markdown(
+            result,
+            image_links=image_links,
+            include_image_link_in_text=include_image_link_in_text,
         )
 
-        # Step 2: Convert HTML tables to markdown
-        table_pattern = re.compile(r"(<table>.*?</table>)", re.DOTALL)
-        for match in table_pattern.finditer(result):
-            table_html = match.group(1)
-            h = html2text.HTML2Text()
-            h.body_width = 0
-            table_md = h.handle(table_html)
-            result = result.replace(table_html, table_md)
-
-        # Step 3: Standardize image format
-        image_pattern = re.compile(r"!\[([^\]]*)\]\(([^)]+)\)\{[^}]*\}")
-        result = image_pattern.sub(r"![\1](\2)", result)
-
-        # Step 4: Remove specific patterns
-        to_be_removed_pattern = {
-            r"\*\*\s*\n>\s*\*\*": "\n",
-            r"\*\*\s*>\s*\*\*": "",
-            r">\s*\n": "\n",
-        }
-        for pattern, replacement in to_be_removed_pattern.items():
-            result = re.sub(pattern, replacement, result, flags=re.MULTILINE)
-
-        # Step 5: Process images
-        attached_images = {}
-        auto_image_folder_path = image_dir / "media"
-        if extract_images and auto_image_folder_path.exists():
-            for image_file in auto_image_folder_path.glob("*"):
-                if image_file.is_file():
-                    # Move image to target folder
-                    target_image_path = image_dir / image_file.name
-                    image_file.rename(target_image_path)
-
-                    image_path = target_image_path.resolve()
-                    if ignore_transparent_images and has_transparent_background(image_path):
-                        logger.info(f"Ignore transparent image {image_path}")
-                        continue
+        # Step 4: Strip whitespace from every line and collapse blank lines
+        lines = []
+        for line in result.split("\n"):
+            line = line.strip()
+            if not line and lines and not lines[-1]:
+                continue
+            lines.append(line)
+        result = "\n".join(lines)
 
-                    if relative_path:
-                        try:
-                            image_path = image_path.relative_to(work_dir)
-                        except Exception:
-                            # If the image is not in a subdirectory of work_dir, use the absolute path
-                            logger.warning(
-                                f"Image {image_path} is not in a subdirectory of {work_dir}. Using absolute path."
-                            )
-
-                    image_id = str(uuid4())
-                    attached_images[image_id] = E2MParsedImageData(
-                        image_path=str(image_path),
-                    )
+        return E2MParsedData(
+            text=result,
+            attached_images=attached_images,
+            metadata={
+                "engine": "pandoc",
+            },
+        )
 
-                    if include_image_link_in_text:
-                        result = re.sub(
-                            rf"!\[([^\]]*)\]\({image_file.name}\)",
-                            f"![\\1]({image_path})",
-                            result,
-                        )
-
-        # Step 6: Ensure images are surrounded by empty lines
-        image_pattern = re.compile(r"(!\[.*?\]\(.*?\))")
-        if include_image_link_in_text:
-            result = re.sub(image_pattern, r"\n\n\1\n\n", result)
-        else:
-            # rm all image links
-            result = re.sub(image_pattern, "", result)
+    def _parse_by_pandoc_ast(
+        self,
+        file_name: str,
+        extract_images: bool = True,
+        include_image_link_in_text: bool = True,
+        ignore_transparent_images: bool = False,
+        work_dir: str = "./",
+        image_dir: str = "./figures",
+        relative_path: bool = True,
+    ):
+        """
+        Parse the docx with pandoc's JSON AST and render the markdown in python,
+        so tables and images are resolved on the tree instead of patched in the text.
+        """
+
+        logger.info(f"Parsing {file_name} using pandoc_ast engine")
+
+        from wisup_e2m.utils.pandoc_util import PandocMarkdownRenderer
 
-        # Step 7: Clean up excessive newlines
-        result = re.sub(r"\n{3,}", "\n\n", result)
-        result = re.sub(r"\n\s*\n", "\n\n", result)
+        work_dir = Path(work_dir).resolve()
+        image_dir = Path(image_dir).resolve()
+        with scratch_job("pandoc") as job:
+            media_dir = job.path
 
-        # Step 8: Strip whitespace from line beginnings and endings
-        result = "\n".join(line.strip() for line in result.split("\n"))
+            ast = json.loads(
+                self._convert_by_pandoc(
+                    file_name, "json", media_dir=media_dir if extract_images else None
+                )
+            )
+            job.check_quota()
+
+            attached_images, image_links = self._collect_pandoc_media(
+                extract_images=extract_images,
+                ignore_transparent_images=ignore_transparent_images,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                media_dir=media_dir,
+                relative_path=relative_path,
+            )
+
+        def _resolve_image(src: str) -> Optional[str]:
+            if src in image_links:
+                return image_links[src]
+            return image_links.get(Path(src).name, src)
+
+        renderer = PandocMarkdownRenderer(
+            resolve_image=_resolve_image,
+            include_image_link_in_text=include_image_link_in_text,
+        )
 
         return E2MParsedData(
-            text=result,
+            text=renderer.render(ast),
             attached_images=attached_images,
             metadata={
-                "engine": "pandoc",
+                "engine": "pandoc_ast",
             },
         )
 
+    def _convert_by_pandoc(
+        self, file_name: str, to_format: str, media_dir: Optional[Path] = None
+    ) -> str:
+        """
+        Run pandoc on the docx, through pandoc-server when ``pandoc_server_url`` is configured
+        """
+        from wisup_e2m.utils.pandoc_util import convert_file_by_pandoc
+
+        return convert_file_by_pandoc(
+            file_name,
+            to_format,
+            extract_media_dir=str(media_dir) if media_dir else None,
+            server_url=getattr(self.config, "pandoc_server_url", None),
+            client=self.client,
+        )
+
+    def _collect_pandoc_media(
+        self,
+        extract_images: bool,
+        ignore_transparent_images: bool,
+        work_dir: Path,
+        image_dir: Path,
+        media_dir: Path,
+        relative_path: bool,
+    ) -> Tuple[Dict[str, E2MParsedImageData], Dict[str, Optional[str]]]:
+        """
+        Move the images pandoc extracted to ``media_dir/media`` into ``image_dir``
+
+        :return: attached images, and a mapping from the image link pandoc wrote
+            (full path or file name) to the new link, None if the image is ignored
+        """
+        attached_images = {}
+        image_links = {}
+        auto_image_folder_path = media_dir / "media"
+        if not extract_images or not auto_image_folder_path.exists():
+            return attached_images, image_links
+
+        store = ImageStore(image_dir)
+        for image_file in auto_image_folder_path.glob("*"):
+            if not image_file.is_file():
+                continue
+
+            if ignore_transparent_images and has_transparent_background(image_file):
+                logger.info(f"Ignore transparent image {image_file.name}")
+                image_links[str(image_file)] = image_links[image_file.name] = None
+                continue
+
+            # Move image into the content-addressed store, the same image is kept only once
+            stored = store.put_file(image_file)
+            image_path = stored.path
+
+            if relative_path:
+                try:
+                    image_path = image_path.relative_to(work_dir)
+                except Exception:
+                    # If the image is not in a subdirectory of work_dir, use the absolute path
+                    logger.warning(
+                        f"Image {image_path} is not in a subdirectory of {work_dir}. "
+                        "Using absolute path."
+                    )
+
+            attached_images[stored.digest] = E2MParsedImageData(
+                image_path=str(image_path), digest=stored.digest
+            )
+            image_links[str(image_file)] = image_links[image_file.name] = str(image_path)
+
+        return attached_images, image_links
+
+    def _rewrite_pandoc_markdown(
+        self,
+        text: str,
+        image_links: Dict[str, Optional[str]],
+        include_image_link_in_text: bool = True,
+    ) -> str:
+        """
+        Rewrite the markdown produced by pandoc in one scan of the text:
+        HTML tables become markdown tables, image links are relinked through
+        ``image_links`` and pandoc's stray quote markers are removed.
+        """
+        import html2text
+
+        table_converter = html2text.HTML2Text()
+        table_converter.body_width = 0
+
+        def _relink(src: str) -> Optional[str]:
+            if src in image_links:
+                return image_links[src]
+            return image_links.get(Path(src).name, src)
+
+        def _rewrite_table_image(match: re.Match) -> str:
+            src = _relink(match.group("src"))
+            if src is None or not include_image_link_in_text:
+                return ""
+            return f"![{match.group('alt')}]({src})"
+
+        def _rewrite(match: re.Match) -> str:
+            if match.group("table") is not None:
+                table_md = table_converter.handle(match.group("table"))
+                return _PANDOC_IMAGE_PATTERN.sub(_rewrite_table_image, table_md)
+
+            if match.group("image") is not None:
+                src = _relink(match.group("src"))
+                if src is None or not include_image_link_in_text:
+                    return ""
+                # Ensure images are surrounded by empty lines
+                return f"\n\n![{match.group('alt')}]({src})\n\n"
+
+            if match.group("bold_quote_break") is not None:
+                return "\n"
+
+            if match.group("bold_quote") is not None:
+                return ""
+
+            return "\n"  # quote marker at the end of a line
+
+        return _PANDOC_REWRITE_PATTERN.sub(_rewrite, text)
+
     def _parse_by_xml(
         self,
         file_name: str,
@@ -230,8 +448,6 @@ class DocxParser(BaseParser):
     ) -> E2MParsedData:
 
         from docx import Document
-        from uuid import uuid4
-        import xml.etree.ElementTree as ET
         from dataclasses import dataclass
 
         @dataclass
@@ -239,85 +455,55 @@ class DocxParser(BaseParser):
             id: str
             target: str | Path
             type: str
+            digest: str
+            name: str
 
             def __str__(self):
                 return f"{self.id} : {self.target}"
 
-        image_list = []
+        image_map = {}  # rId -> DocImage
         docx_path = Path(file_name)
 
+        # 只打开一次 docx 包，正文和图片都从同一个 Document 中读取
+        doc = Document(docx_path)
+
         # 提取图片
         if extract_images:
             logger.info(f"Extracting images from docx file {docx_path}")
             try:
-                tmp_dir = Path(f"./.tmp/docx_unpack_{uuid4()}")
-                tmp_dir.mkdir(parents=True, exist_ok=True)
-                zip_path = tmp_dir / f"{docx_path.stem}.zip"
-
-                # rename to test2.zip and unzip
-                shutil.copy(docx_path, zip_path)
-                with zipfile.ZipFile(zip_path, "r") as zip_ref:
-                    zip_ref.extractall(tmp_dir)
-
-                word_dir = tmp_dir / "word"
-                rels_xml = tmp_dir / "word/_rels/document.xml.rels"
+                store = ImageStore(image_dir)
 
-                with open(rels_xml, "r", encoding="utf-8") as f:
-                    rels = f.read()
+                for rel in doc.part.rels.values():
+                    # type 的格式如同 http://schemas.openxmlformats.org/officeDocument/\d+/relationships/image
+                    if rel.is_external or not _IMAGE_REL_TYPE_PATTERN.match(rel.reltype):
+                        continue
 
-                rels_xml_tree = ET.fromstring(rels)
-                for rel in rels_xml_tree:
-                    # 通过 re 找到 type，格式如同 http://schemas.openxmlformats.org/officeDocument/\d+/relationships/image
-                    type = rel.get("Type")
+                    image_part = rel.target_part
+                    image_name = Path(image_part.partname).name
 
-                    if not re.match(
-                        r"http://schemas.openxmlformats.org/officeDocument/\d+/relationships/image",
-                        type,
+                    if ignore_transparent_images and has_transparent_background(
+                        io.BytesIO(image_part.blob)
                     ):
+                        logger.info(f"Ignore transparent image {image_name}")
                         continue
 
-                    # 通过 re 找到 id
-                    id = rel.get("Id")
-                    # 通过 re 找到 target
-                    target = rel.get("Target")
-                    # 处理 target，如果以 / 开头，则认为是相对路径，需要加上 tmp_dir
-                    if target.startswith("/"):
-                        target = target[1:]
-                    # tmp_dir / target 或者 word_dir / target
-                    # 查看哪个存在
-                    tmp_target = tmp_dir / target
-                    if not tmp_target.exists():
-                        tmp_target = word_dir / target
-
-                    logger.info(f"{tmp_target=}")
-
-                    if ignore_transparent_images and has_transparent_background(tmp_target):
-                        logger.info(f"Ignore transparent image {tmp_target}")
-                        continue
-
-                    # cp to target_image_dir
-                    target_image_dir = Path(image_dir)
-                    logger.info(f"Copying {tmp_target} to {target_image_dir}")
-                    target_image_dir.mkdir(parents=True, exist_ok=True)
-
-                    target_image_path = target_image_dir / tmp_target.name
-
-                    shutil.copy(tmp_target, target_image_path)
-
-                    # 如果 type 的格式满足 http://schemas.openxmlformats.org/officeDocument/数字/relationships/image
-
-                    image_list.append(DocImage(id=id, target=target_image_path, type=type))
+                    # 直接把图片写入 image_dir，无需解压整个 docx
+                    # 按内容哈希命名，重复的图片只写一次
+                    stored = store.put(image_part.blob, Path(image_part.partname).suffix)
+                    logger.info(f"Stored {image_part.partname} as {stored.path}")
+
+                    image_map[rel.rId] = DocImage(
+                        id=rel.rId,
+                        target=stored.path,
+                        type=rel.reltype,
+                        digest=stored.digest,
+                        name=image_name,
+                    )
 
             except Exception as e:
                 logger.error(f"Error extracting images from docx file: {e}")
 
-            finally:
-                # remove tmp_dir
-                shutil.rmtree(tmp_dir)
-
-        logger.info(f"Found {len(image_list)} images in docx file {docx_path}")
-
-        doc = Document(docx_path)
+        logger.info(f"Found {len(image_map)} images in docx file {docx_path}")
 
         text_list = []
         attached_images = {}
@@ -337,7 +523,7 @@ class DocxParser(BaseParser):
                     text_list.append("\n")
                     continue
                 if ele.text:
-                    if "<w:numPr>" in ele.xml:
+                    if _NUM_PR_XPATH(ele):
                         text_list.append("- " + ele.text)
                     else:
                         text_list.append(ele.text)
@@ -345,7 +531,7 @@ class DocxParser(BaseParser):
                 if extract_images and include_image_link_in_text:
                     self._process_images(
                         ele,
-                        image_list,
+                        image_map,
                         text_list,
                         attached_images,
                         relative_path,
@@ -380,19 +566,14 @@ class DocxParser(BaseParser):
         """
         return "".join("".join(t.text for t in r.t_lst) for p in tc.p_lst for r in p.r_lst)
 
-    def _process_images(self, ele, image_list, text_list, attached_images, relative_path, work_dir):
+    def _process_images(self, ele, image_map, text_list, attached_images, relative_path, work_dir):
         """
         Process the images in the element
         """
-        xml = ele.xml
-        if "<w:drawing>" in xml:
-            img_ids = re.findall(r'r:embed="([^"]+)"', xml)
-            for img_id in img_ids:
-                for img in image_list:  # This could be inefficient for large image_list
-                    if img.id == img_id:
-                        self._add_image_to_text(
-                            img, text_list, attached_images, relative_path, work_dir
-                        )
+        for img_id in _DRAWING_EMBED_XPATH(ele):
+            img = image_map.get(img_id)
+            if img is not None:
+                self._add_image_to_text(img, text_list, attached_images, relative_path, work_dir)
 
     def _add_image_to_text(self, img, text_list, attached_images, relative_path, work_dir):
         """
@@ -400,15 +581,15 @@ class DocxParser(BaseParser):
         """
         try:
             if relative_path:
-                rel_path = img.target.relative_to(Path(work_dir))
-                text_list.append(f"![{img.target.name}]({rel_path})")
+                rel_path = img.target.relative_to(Path(work_dir).resolve())
+                text_list.append(f"![{img.name}]({rel_path})")
                 image_path = str(rel_path)
             else:
-                text_list.append(f"![{img.target.name}]({img.target})")
+                text_list.append(f"![{img.name}]({img.target})")
                 image_path = str(img.target.resolve())
 
-            attached_images[str(uuid4())] = E2MParsedImageData(
-                image_path=image_path,
+            attached_images[img.digest] = E2MParsedImageData(
+                image_path=image_path, digest=img.digest
             )
             logger.info(f"Inserted image {img.target} in text")
         except Exception as e:
@@ -1,10 +1,20 @@
 # /e2m/parsers/epub_parser.py
+import io
 import logging
-from typing import IO, List, Optional
+import zipfile
+from collections import deque
+from itertools import islice
+from typing import IO, Iterator, List, Optional, Tuple, Union
 
 from wisup_e2m.configs.parsers.base import BaseParserConfig
-from wisup_e2m.parsers.base import BaseParser, E2MParsedData
-from wisup_e2m.utils.epub_util import get_epub_images
+from wisup_e2m.parsers.base import BaseParser, E2MParsedData, E2MParsedImageData
+from wisup_e2m.utils.epub_util import (
+    get_epub_images,
+    read_epub_spine,
+    render_epub_chapter,
+    render_epub_chapters,
+)
+from wisup_e2m.utils.scratch import scratch_job
 
 logger = logging.getLogger(__name__)
 
@@ -22,23 +32,26 @@ _epub_parser_params = [
 
 
 class EpubParser(BaseParser):
-    SUPPORTED_ENGINES = ["unstructured"]
+    SUPPORTED_ENGINES = ["unstructured", "native"]
     SUPPORTED_FILE_TYPES = ["epub"]
 
     def __init__(self, config: Optional[BaseParserConfig] = None, **config_kwargs):
         """
         :param config: BaseParserConfig
 
-        :param engine: str, the engine to use for conversion, default is 'unstructured'
+        :param engine: str, the engine to use for conversion, default is 'unstructured',
+            options are ['unstructured', 'native']
         :param langs: List[str], the languages to use for parsing, default is ['en', 'zh']
         :param client_timeout: int, the client timeout, default is 30
         :param client_max_redirects: int, the client max redirects, default is 5
         :param client_proxy: Optional[str], the client proxy, default is None
+        :param chapter_workers: int, the number of processes the native engine renders chapters
+            with, default is 0
         """
         super().__init__(config, **config_kwargs)
 
         if not self.config.engine:
-            self.config.engine = "unstructured"  # unstructured / jina
+            self.config.engine = "unstructured"  # unstructured / native
             logger.info(f"No engine specified. Defaulting to {self.config.engine} engine.")
 
         self._ensure_engine_exists()
@@ -109,6 +122,137 @@ class EpubParser(BaseParser):
             relative_path=relative_path,
         )
 
+    def iter_parsed_chapters(
+        self,
+        file_name: Optional[str] = None,
+        file: Optional[IO[bytes]] = None,
+        extract_images: bool = True,
+        include_image_link_in_text: bool = True,
+        ignore_transparent_images: bool = False,
+        work_dir: str = "./",
+        image_dir: str = "./figures",
+        relative_path: bool = True,
+    ) -> Iterator[E2MParsedData]:
+        """
+        Yield the parsed data of each chapter in spine order, used by the native engine
+
+        The epub is opened once and chapters are read from it one at a time, so only one chapter
+        is held in memory. With ``chapter_workers`` configured, chapters are rendered in a
+        process pool, with at most twice as many chapters in flight as workers.
+        """
+        if file_name:
+            EpubParser._validate_input_file(file_name)
+
+        source = file_name if file is None else file.read()
+        render_kwargs = {
+            "work_dir": work_dir,
+            "relative_path": relative_path,
+            "extract_images": extract_images,
+            "include_image_link_in_text": include_image_link_in_text,
+            "ignore_transparent_images": ignore_transparent_images,
+        }
+
+        with zipfile.ZipFile(source if file is None else io.BytesIO(source)) as zip_ref:
+            spine = read_epub_spine(zip_ref)
+            logger.info(f"Found {len(spine.chapters)} chapters in {file_name or 'epub'}")
+
+            workers = getattr(self.config, "chapter_workers", 0)
+            if workers > 1:
+                rendered = self._render_chapters_in_pool(
+                    source, spine.chapters, image_dir, workers, **render_kwargs
+                )
+            else:
+                rendered = (
+                    render_epub_chapter(zip_ref, chapter_path, image_dir, **render_kwargs)
+                    for chapter_path in spine.chapters
+                )
+
+            for chapter_index, (chapter_path, (text, images)) in enumerate(
+                zip(spine.chapters, rendered)
+            ):
+                yield E2MParsedData(
+                    text=text,
+                    attached_images={
+                        digest: E2MParsedImageData(image_path=link, digest=digest)
+                        for link, digest in images
+                    },
+                    metadata={
+                        "engine": "native",
+                        "title": spine.title,
+                        "chapter_index": chapter_index,
+                        "chapter_path": chapter_path,
+                    },
+                )
+
+    @staticmethod
+    def _render_chapters_in_pool(
+        source: Union[str, bytes], chapter_paths: List[str], image_dir: str, workers: int, **kwargs
+    ) -> Iterator[Tuple[str, List[Tuple[str, str]]]]:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with scratch_job("epub") as job, ProcessPoolExecutor(max_workers=workers) as executor:
+            if isinstance(source, bytes):
+                # 内容只写一次临时文件，每个任务只传路径，而不是把整本书序列化一次
+                epub_path = job.new_path(suffix=".epub")
+                epub_path.write_bytes(source)
+                source = str(epub_path)
+
+            chapters = iter(chapter_paths)
+            # 限制同时提交的章节数，避免大书的结果全部堆积在内存里
+            futures = deque(
+                executor.submit(render_epub_chapters, source, [chapter_path], image_dir, **kwargs)
+                for chapter_path in islice(chapters, workers * 2)
+            )
+            while futures:
+                result = futures.popleft().result()
+                for chapter_path in islice(chapters, 1):
+                    futures.append(
+                        executor.submit(
+                            render_epub_chapters, source, [chapter_path], image_dir, **kwargs
+                        )
+                    )
+                yield result[0]
+
+    def _parse_by_native(
+        self,
+        file_name: Optional[str] = None,
+        file: Optional[IO[bytes]] = None,
+        extract_images: bool = True,
+        include_image_link_in_text: bool = True,
+        ignore_transparent_images: bool = False,
+        work_dir: str = "./",
+        image_dir: str = "./figures",
+        relative_path: bool = True,
+    ) -> E2MParsedData:
+        """
+        Parse the epub with zipfile and lxml, chapter by chapter in spine order
+        """
+        logger.info(f"Parsing {file_name} using native engine...")
+
+        texts = []
+        attached_images = {}
+        metadata = {"engine": "native", "title": None, "chapters": 0}
+        for chapter in self.iter_parsed_chapters(
+            file_name=file_name,
+            file=file,
+            extract_images=extract_images,
+            include_image_link_in_text=include_image_link_in_text,
+            ignore_transparent_images=ignore_transparent_images,
+            work_dir=work_dir,
+            image_dir=image_dir,
+            relative_path=relative_path,
+        ):
+            if chapter.text:
+                texts.append(chapter.text)
+            for digest, image in chapter.attached_images.items():
+                attached_images.setdefault(digest, image)
+            metadata["title"] = chapter.metadata["title"]
+            metadata["chapters"] += 1
+
+        return E2MParsedData(
+            text="\n\n".join(texts), attached_images=attached_images, metadata=metadata
+        )
+
     def get_parsed_data(
         self,
         file_name: Optional[str] = None,
@@ -139,6 +283,17 @@ class EpubParser(BaseParser):
                 image_dir=image_dir,
                 relative_path=relative_path,
             )
+        elif self.config.engine == "native":
+            return self._parse_by_native(
+                file_name=file_name,
+                file=file,
+                extract_images=extract_images,
+                include_image_link_in_text=include_image_link_in_text,
+                ignore_transparent_images=ignore_transparent_images,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                relative_path=relative_path,
+            )
         else:
             raise NotImplementedError(f"Engine {self.config.engine} not supported")
 
@@ -1,6 +1,7 @@
 # /e2m/parsers/html_parser.py
+import io
 import logging
-from typing import IO, List, Optional
+from typing import IO, Iterator, List, Optional
 
 from wisup_e2m.configs.parsers.base import BaseParserConfig
 from wisup_e2m.parsers.base import BaseParser, E2MParsedData
@@ -13,6 +14,7 @@ _html_parser_params = [
     "text",
     "encoding",
     "skip_headers_and_footers",
+    "strip_boilerplate",
     "include_image_link_in_text",
     "work_dir",
     "image_dir",
@@ -21,23 +23,27 @@ _html_parser_params = [
 
 
 class HtmlParser(BaseParser):
-    SUPPORTED_ENGINES = ["unstructured"]
+    SUPPORTED_ENGINES = ["unstructured", "native"]
     SUPPORTED_FILE_TYPES = ["html", "htm"]
 
     def __init__(self, config: Optional[BaseParserConfig] = None, **config_kwargs):
         """
         :param config: BaseParserConfig
 
-        :param engine: str, the engine to use for conversion, default is 'unstructured'
+        :param engine: str, the engine to use for conversion, default is 'unstructured',
+            options are ['unstructured', 'native']
         :param langs: List[str], the languages to use for parsing, default is ['en', 'zh']
         :param client_timeout: int, the client timeout, default is 30
         :param client_max_redirects: int, the client max redirects, default is 5
         :param client_proxy: Optional[str], the client proxy, default is None
+        :param streaming: bool, parse the html incrementally with the native engine,
+            default is False
+        :param extract_main_content: bool, keep only the main content of the page, default is False
         """
         super().__init__(config, **config_kwargs)
 
         if not self.config.engine:
-            self.config.engine = "unstructured"  # unstructured / jina
+            self.config.engine = "unstructured"  # unstructured / native
             logger.info(f"No engine specified. Defaulting to {self.config.engine} engine.")
 
         self._ensure_engine_exists()
@@ -98,6 +104,149 @@ class HtmlParser(BaseParser):
             relative_path=relative_path,
         )
 
+    def _get_native_renderer(
+        self,
+        skip_headers_and_footers: bool = True,
+        strip_boilerplate: bool = False,
+        include_image_link_in_text: bool = True,
+    ):
+        from wisup_e2m.utils.html_util import (
+            HtmlMarkdownRenderer,
+            is_boilerplate,
+            is_page_header_or_footer,
+        )
+
+        if strip_boilerplate:
+            skip_element = is_boilerplate
+        elif skip_headers_and_footers:
+            skip_element = is_page_header_or_footer
+        else:
+            skip_element = None
+
+        return HtmlMarkdownRenderer(
+            include_image_link_in_text=include_image_link_in_text,
+            skip_element=skip_element,
+        )
+
+    def iter_parsed_sections(
+        self,
+        file_name: Optional[str] = None,
+        file: Optional[IO[bytes]] = None,
+        text: Optional[str] = None,
+        encoding: str = "utf-8",
+        skip_headers_and_footers: bool = True,
+        strip_boilerplate: bool = False,
+        include_image_link_in_text: bool = True,
+    ) -> Iterator[E2MParsedData]:
+        """
+        Incrementally parse the html and yield the parsed data of each section
+
+        The document is fed to lxml in chunks and every block is dropped from the tree once it is
+        rendered, so peak memory is bounded by the largest section rather than the file size.
+        Sections are split before h1/h2 headings, after section/article elements, and at
+        ``section_max_chars`` characters.
+        """
+        from wisup_e2m.utils.html_util import iter_html_sections
+
+        if file_name:
+            HtmlParser._validate_input_file(file_name)
+
+        if text is not None:
+            source, encoding = io.BytesIO(text.encode("utf-8")), "utf-8"
+        elif file_name:
+            source = file_name
+        elif file is not None:
+            source = file
+        else:
+            raise ValueError("Either file_name, file or text must be provided")
+
+        renderer = self._get_native_renderer(
+            skip_headers_and_footers=skip_headers_and_footers,
+            strip_boilerplate=strip_boilerplate,
+            include_image_link_in_text=include_image_link_in_text,
+        )
+        sections = iter_html_sections(
+            source,
+            renderer,
+            encoding=encoding,
+            max_section_chars=getattr(self.config, "section_max_chars", 100_000),
+        )
+        for section_index, section in enumerate(sections):
+            yield E2MParsedData(
+                text=section.text,
+                metadata={
+                    "engine": "native",
+                    "title": section.title,
+                    "section_index": section_index,
+                },
+            )
+
+    def _parse_by_native(
+        self,
+        file_name: Optional[str] = None,
+        file: Optional[IO[bytes]] = None,
+        text: Optional[str] = None,
+        encoding: str = "utf-8",
+        skip_headers_and_footers: bool = True,
+        strip_boilerplate: bool = False,
+        include_image_link_in_text: bool = True,
+        work_dir: str = "./",
+        image_dir: str = "./figures",
+        relative_path: bool = True,
+    ) -> E2MParsedData:
+        """
+        Parse the data with lxml, converting the DOM to Markdown in a single walk
+        """
+
+        logger.info(f"Parsing {file_name or 'html'} using native engine...")
+
+        if getattr(self.config, "streaming", False):
+            texts = []
+            metadata = {"engine": "native", "title": None, "sections": 0}
+            for section in self.iter_parsed_sections(
+                file_name=file_name,
+                file=file,
+                text=text,
+                encoding=encoding,
+                skip_headers_and_footers=skip_headers_and_footers,
+                strip_boilerplate=strip_boilerplate,
+                include_image_link_in_text=include_image_link_in_text,
+            ):
+                texts.append(section.text)
+                metadata["title"] = section.metadata["title"]
+                metadata["sections"] += 1
+            return E2MParsedData(text="\n\n".join(texts), metadata=metadata)
+
+        import lxml.html
+
+        if text is not None:
+            data = text.encode("utf-8")
+            encoding = "utf-8"
+        elif file_name:
+            with open(file_name, "rb") as f:
+                data = f.read()
+        elif file is not None:
+            data = file.read()
+        else:
+            raise ValueError("Either file_name, file or text must be provided")
+
+        if not data.strip():
+            return E2MParsedData(text="", metadata={"engine": "native"})
+
+        root = lxml.html.document_fromstring(data, parser=lxml.html.HTMLParser(encoding=encoding))
+
+        renderer = self._get_native_renderer(
+            skip_headers_and_footers=skip_headers_and_footers,
+            strip_boilerplate=strip_boilerplate,
+            include_image_link_in_text=include_image_link_in_text,
+        )
+        title = root.findtext(".//title")
+
+        return E2MParsedData(
+            text=renderer.render(root),
+            metadata={"engine": "native", "title": title.strip() if title else None},
+        )
+
     def get_parsed_data(
         self,
         file_name: Optional[str] = None,
@@ -105,6 +254,7 @@ class HtmlParser(BaseParser):
         text: Optional[str] = None,
         encoding: str = "utf-8",
         skip_headers_and_footers: bool = True,
+        strip_boilerplate: bool = False,
         include_image_link_in_text: bool = True,
         work_dir: str = "./",
         image_dir: str = "./figures",
@@ -119,12 +269,25 @@ class HtmlParser(BaseParser):
             HtmlParser._validate_input_file(file_name)
 
         if self.config.engine == "unstructured":
-            return self._parse_by_unstructured(
+            parsed_data = self._parse_by_unstructured(
+                file_name=file_name,
+                file=file,
+                text=text,
+                encoding=encoding,
+                skip_headers_and_footers=skip_headers_and_footers,
+                include_image_link_in_text=include_image_link_in_text,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                relative_path=relative_path,
+            )
+        elif self.config.engine == "native":
+            parsed_data = self._parse_by_native(
                 file_name=file_name,
                 file=file,
                 text=text,
                 encoding=encoding,
                 skip_headers_and_footers=skip_headers_and_footers,
+                strip_boilerplate=strip_boilerplate,
                 include_image_link_in_text=include_image_link_in_text,
                 work_dir=work_dir,
                 image_dir=image_dir,
@@ -133,6 +296,10 @@ class HtmlParser(BaseParser):
         else:
             raise NotImplementedError(f"Engine {self.config.engine} not supported")
 
+        if getattr(self.config, "extract_main_content", False):
+            parsed_data = self._extract_main_content(parsed_data)
+        return parsed_data
+
     def parse(
         self,
         file_name: Optional[str] = None,
@@ -140,6 +307,7 @@ class HtmlParser(BaseParser):
         text: Optional[str] = None,
         encoding: str = "utf-8",
         skip_headers_and_footers: bool = True,
+        strip_boilerplate: bool = False,
         include_image_link_in_text: bool = True,
         work_dir: str = "./",
         image_dir: str = "./figures",
@@ -140,30 +140,29 @@ class PdfParser(BaseParser):
 
         logger.info(f"Parsing {file} using surya layout engine...")
 
-        import uuid
         from pathlib import Path
 
         from PIL import Image
 
         from wisup_e2m.utils.image_util import BLUE_BGR
+        from wisup_e2m.utils.scratch import scratch_job
 
-        # 根目录
-        base_tmp_dir = Path("./.tmp")
-        # 创建临时目录
-        tmp_dir = base_tmp_dir / str(uuid.uuid4())
-        tmp_dir.mkdir(parents=True, exist_ok=True)
-
-        all_images = []
         images = []
         try:
-            all_images = convert_pdf_to_images(
-                file, start_page, end_page, proc_count, save_dir=str(tmp_dir), dpi=dpi
-            )
+            # 页面图片写到临时 job 目录，结束后整个目录会被删除
+            with scratch_job("surya") as job:
+                all_images = convert_pdf_to_images(
+                    file, start_page, end_page, proc_count, save_dir=str(job.path), dpi=dpi
+                )
+                job.check_quota()
 
-            images = [Image.open(image_file) for image_file in all_images]
+                # 在删除临时目录前把图片读入内存
+                images = [Image.open(image_file) for image_file in all_images]
+                for image in images:
+                    image.load()
 
-            logger.info(f"Total {len(all_images)} images")
-            layout_predictions = self.surya_layout_func(str(tmp_dir), batch_size=batch_size)
+                logger.info(f"Total {len(all_images)} images")
+                layout_predictions = self.surya_layout_func(str(job.path), batch_size=batch_size)
 
             # reorder layout predictions,依据name字段，要和  all_images 的文件stem对应
             new_layout_predictions = []
@@ -179,11 +178,6 @@ class PdfParser(BaseParser):
         except Exception as e:
             logger.error(f"Error in parsing {file}: {e}")
             return None
-        finally:
-            # rm tmp dir
-            for image_file in all_images:
-                Path(image_file).unlink()
-            tmp_dir.rmdir()
 
         logger.info("Start _prepare_surya_layout_data_to_e2m_parsed_data")
         return self._prepare_surya_layout_data_to_e2m_parsed_data(
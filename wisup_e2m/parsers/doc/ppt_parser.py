@@ -1,12 +1,11 @@
 # /e2m/parsers/doc_parser.py
 import logging
-from pathlib import Path
 from typing import Optional
-from uuid import uuid4
 
 from wisup_e2m.parsers.base import E2MParsedData
 from wisup_e2m.parsers.doc.pptx_parser import PptxParser
 from wisup_e2m.utils.ppt_util import convert_ppt_to_pptx
+from wisup_e2m.utils.libreoffice import LibreOfficeConversionMixin, converted_file
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +25,7 @@ _ppt_parser_params = [
 ]
 
 
-class PptParser(PptxParser):
+class PptParser(LibreOfficeConversionMixin, PptxParser):
     SUPPORTED_FILE_TYPES = ["ppt"]
 
     def get_parsed_data(
@@ -51,26 +50,26 @@ class PptParser(PptxParser):
         """
         PptParser._validate_input_file(file_name)
 
+        def convert(input_path: str, output_path: str):
+            convert_ppt_to_pptx(input_path, output_path, pool=self._get_libreoffice_pool())
+
         try:
-            tmp_dir = Path(f"./.tmp/{uuid4()}")
-            tmp_dir.mkdir(parents=True, exist_ok=True)
-            tmp_file_name = tmp_dir / f"{uuid4()}.pptx"
-            convert_ppt_to_pptx(file_name, str(tmp_file_name))
-            file_name = str(tmp_file_name)
+            with converted_file(
+                file_name, "pptx", convert, cache=self._get_conversion_cache()
+            ) as converted_file_name:
+                file_name = converted_file_name
+
+                for k, v in locals().items():
+                    if k in _ppt_parser_params:
+                        kwargs[k] = v
 
-            for k, v in locals().items():
-                if k in _ppt_parser_params:
-                    kwargs[k] = v
+                data = super().get_parsed_data(**kwargs)
 
-            data = super().get_parsed_data(**kwargs)
-            return data
+                return data
 
         except Exception as e:
-            logger.error(f"Error converting {file_name} to docx: {e}")
+            logger.error(f"Error converting {file_name} to pptx: {e}")
             raise
-        finally:
-            if tmp_file_name.exists():
-                tmp_file_name.unlink()
 
     def parse(
         self,
@@ -1,10 +1,16 @@
 # /e2m/parsers/pptx_parser.py
+import io
 import logging
-from typing import IO, List, Optional
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
 
 from wisup_e2m.configs.parsers.base import BaseParserConfig
-from wisup_e2m.parsers.base import BaseParser, E2MParsedData
-from wisup_e2m.utils.pptx_util import get_pptx_images
+from wisup_e2m.parsers.base import BaseParser, E2MParsedData, E2MParsedImageData
+from wisup_e2m.utils.pptx_util import (
+    get_pptx_images,
+    render_pptx_slide_range,
+    render_pptx_slides,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -27,23 +33,27 @@ _pptx_parser_params = [
 
 
 class PptxParser(BaseParser):
-    SUPPORTED_ENGINES = ["unstructured"]
+    SUPPORTED_ENGINES = ["unstructured", "native"]
     SUPPORTED_FILE_TYPES = ["pptx"]
 
     def __init__(self, config: Optional[BaseParserConfig] = None, **config_kwargs):
         """
         :param config: BaseParserConfig
 
-        :param engine: str, the engine to use for conversion, default is 'unstructured'
+        :param engine: str, the engine to use for conversion, default is 'unstructured',
+            options are ['unstructured', 'native']
         :param langs: List[str], the languages to use for parsing, default is ['en', 'zh']
         :param client_timeout: int, the client timeout, default is 30
         :param client_max_redirects: int, the client max redirects, default is 5
         :param client_proxy: Optional[str], the client proxy, default is None
+        :param slide_workers: int, the number of processes the native engine renders slides with,
+            default is 0
+        :param slide_shard_size: int, the number of slides per worker task, default is 50
         """
         super().__init__(config, **config_kwargs)
 
         if not self.config.engine:
-            self.config.engine = "unstructured"  # unstructured / jina
+            self.config.engine = "unstructured"  # unstructured / native
             logger.info(f"No engine specified. Defaulting to {self.config.engine} engine.")
 
         self._ensure_engine_exists()
@@ -58,7 +68,9 @@ class PptxParser(BaseParser):
             from unstructured.partition.pptx import partition_pptx
         except ImportError:
             raise ImportError(
-                "Unstructured engine not installed. Please install Unstructured by `pip install unstructured unstructured_pytesseract unstructured_inference pdfminer.six matplotlib pi_heif pillow-heif pillow python-pptx`"
+                "Unstructured engine not installed. Please install Unstructured by "
+                "`pip install unstructured unstructured_pytesseract unstructured_inference "
+                "pdfminer.six matplotlib pi_heif pillow-heif pillow python-pptx`"
             ) from None
 
         self.unstructured_parse_func = partition_pptx
@@ -86,6 +98,11 @@ class PptxParser(BaseParser):
         logger.info(f"Parsing {file_name} using unstructured engine...")
 
         import unstructured
+        from pptx import Presentation
+
+        if file is not None:
+            # partition_pptx 和图片提取都要读取文件流，这里只读一次
+            file = io.BytesIO(file.read())
 
         unstructured_elements: List[unstructured.documents.elements.Element] = (
             self.unstructured_parse_func(
@@ -95,11 +112,23 @@ class PptxParser(BaseParser):
                 include_slide_notes=include_slide_notes,
                 infer_table_structure=infer_table_structure,
                 languages=self.config.langs,
-                starting_page_number=start_page if start_page else 1,
                 strategy="hi_res",
             )
         )
 
+        if file is not None:
+            file.seek(0)
+        prs = Presentation(file_name or file)
+        first_idx, last_idx = self._slide_range(start_page, end_page, len(prs.slides))
+
+        # unstructured 的页码从 1 开始，只保留 start_page 到 end_page 之间的元素
+        unstructured_elements = [
+            element
+            for element in unstructured_elements
+            if element.metadata.page_number is None
+            or first_idx < element.metadata.page_number <= last_idx
+        ]
+
         # 由于 unstructured 的 partition_pptx 没有自带的图片提取功能，所以这里需要自己提取图片
         # 提取图片
         if extract_images:
@@ -109,29 +138,17 @@ class PptxParser(BaseParser):
                 file=file,
                 target_image_dir=image_dir,
                 ignore_transparent_images=ignore_transparent_images,
+                prs=prs,
+                slide_indices=range(first_idx, last_idx),
             )  # {'slide_number': 0, 'image_file': 'extracted_images/0_0.png', 'image_name': '0_0.png'}
 
             logger.info(f"Succesfully extracted {len(pptx_images)} images to {image_dir}")
 
-            from unstructured.documents.elements import ElementMetadata, Image
-
-            # 添加为Image Element,添加在对应的页面后面
-            for element in unstructured_elements:
-                if element.metadata.page_number in pptx_images:
-                    for image in pptx_images[element.metadata.page_number]:
-                        # 在当前元素后面添加图片元素
-                        unstructured_elements.insert(
-                            unstructured_elements.index(element) + 1,
-                            Image(
-                                text="",
-                                metadata=ElementMetadata(
-                                    page_number=element.metadata.page_number,
-                                    image_path=image["image_file"],
-                                ),
-                            ),
-                        )
-                    # rm the original pptx_images
-                    del pptx_images[element.metadata.page_number]
+            # get_pptx_images 的 slide 下标从 0 开始，unstructured 的页码从 1 开始
+            unstructured_elements = self._merge_slide_images(
+                unstructured_elements,
+                {idx + 1: images for idx, images in pptx_images.items()},
+            )
 
         return self._prepare_unstructured_data_to_e2m_parsed_data(
             unstructured_elements,
@@ -142,6 +159,196 @@ class PptxParser(BaseParser):
             relative_path=relative_path,
         )
 
+    def _parse_by_native(
+        self,
+        file_name: Optional[str] = None,
+        file: Optional[IO[bytes]] = None,
+        start_page: int = None,
+        end_page: int = None,
+        include_page_breaks: bool = True,
+        include_slide_notes: Optional[bool] = None,
+        infer_table_structure: bool = True,
+        extract_images: bool = True,
+        include_image_link_in_text: bool = True,
+        ignore_transparent_images: bool = False,
+        work_dir: str = "./",
+        image_dir: str = "./figures",
+        relative_path: bool = True,
+    ) -> E2MParsedData:
+        """
+        Parse the data with python-pptx directly, without any ML dependencies
+        """
+
+        logger.info(f"Parsing {file_name} using native engine...")
+
+        from pptx import Presentation
+
+        work_dir = Path(work_dir).resolve()
+        image_dir = Path(image_dir).resolve()
+
+        source = file_name
+        if file is not None:
+            # 多进程渲染时需要把文件内容传给子进程
+            source = file.read()
+
+        prs = Presentation(source if file is None else io.BytesIO(source))
+        first_idx, last_idx = self._slide_range(start_page, end_page, len(prs.slides))
+        render_kwargs = {
+            "extract_images": extract_images,
+            "ignore_transparent_images": ignore_transparent_images,
+            "include_slide_notes": bool(include_slide_notes),
+            "infer_table_structure": infer_table_structure,
+        }
+
+        slide_workers = getattr(self.config, "slide_workers", 0)
+        shard_size = max(getattr(self.config, "slide_shard_size", 50), 1)
+        if slide_workers > 1 and last_idx - first_idx > shard_size:
+            slides = self._render_slides_sharded(
+                source,
+                first_idx,
+                last_idx,
+                str(image_dir),
+                slide_workers,
+                shard_size,
+                **render_kwargs,
+            )
+        else:
+            slides = render_pptx_slides(
+                prs, range(first_idx, last_idx), str(image_dir), **render_kwargs
+            )
+
+        attached_images = {}
+        slide_chunks = []
+        for slide_idx, blocks in slides:
+            page_number = slide_idx + 1
+            chunks = []
+            for kind, content in blocks:
+                if kind == "text":
+                    chunks.append(content)
+                    continue
+
+                image_path = Path(content).resolve()
+                image_name = str(image_path)
+                if relative_path:
+                    try:
+                        image_name = str(image_path.relative_to(work_dir))
+                    except ValueError:
+                        # If the image is not in a subdirectory of work_dir, use the absolute path
+                        logger.warning(
+                            f"Image {image_path} is not in a subdirectory of {work_dir}. "
+                            "Using absolute path."
+                        )
+                # 图片按内容哈希命名，同一张图片只记录一次
+                digest = image_path.stem
+                if digest not in attached_images:
+                    attached_images[digest] = E2MParsedImageData(
+                        image_path=image_name, page_index=page_number, digest=digest
+                    )
+                if include_image_link_in_text:
+                    chunks.append(f"![]({image_name})")
+
+            if chunks:
+                slide_chunks.append("\n\n".join(chunks))
+
+        separator = "\n\n---\n\n" if include_page_breaks else "\n\n"
+        return E2MParsedData(
+            text=separator.join(slide_chunks),
+            attached_images=attached_images,
+            metadata={"engine": "native", "slides": len(prs.slides)},
+        )
+
+    @staticmethod
+    def _render_slides_sharded(
+        source: Union[str, bytes],
+        first_idx: int,
+        last_idx: int,
+        image_dir: str,
+        workers: int,
+        shard_size: int,
+        **render_kwargs,
+    ) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
+        """
+        Render the slides ``[first_idx, last_idx)`` in a process pool, ``shard_size`` slides per
+        task, and yield them in slide order
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        logger.info(
+            f"Rendering slides {first_idx + 1}-{last_idx} with {workers} workers, "
+            f"{shard_size} slides per task"
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    render_pptx_slide_range,
+                    source,
+                    start,
+                    min(start + shard_size, last_idx),
+                    image_dir,
+                    **render_kwargs,
+                )
+                for start in range(first_idx, last_idx, shard_size)
+            ]
+            for future in futures:
+                yield from future.result()
+
+    @staticmethod
+    def _slide_range(start_page: Optional[int], end_page: Optional[int], n_slides: int):
+        """
+        Convert the 1-based, inclusive ``start_page``/``end_page`` to 0-based slide indices
+        ``[first_idx, last_idx)``, clamped to the deck
+        """
+        first_idx = max(start_page - 1, 0) if start_page else 0
+        last_idx = min(end_page, n_slides) if end_page else n_slides
+        if first_idx >= last_idx:
+            logger.warning(
+                f"No slides between start_page {start_page} and end_page {end_page}, "
+                f"the deck has {n_slides} slides"
+            )
+        return first_idx, max(first_idx, last_idx)
+
+    @staticmethod
+    def _merge_slide_images(
+        elements: List[Any],
+        slide_images: Dict[int, List[Dict[str, Any]]],
+    ) -> List[Any]:
+        """
+        Emit the elements of each slide followed by the image elements of that slide, in one pass
+
+        :param elements: The unstructured elements, in slide order
+        :param slide_images: The images extracted by get_pptx_images, keyed by page number
+        """
+        from unstructured.documents.elements import ElementMetadata, Image
+
+        def _image_elements(page_number: int):
+            for image in slide_images[page_number]:
+                yield Image(
+                    text="",
+                    metadata=ElementMetadata(
+                        page_number=page_number, image_path=image["image_file"]
+                    ),
+                )
+
+        pending_pages = sorted(slide_images)
+        pending_idx = 0
+        merged = []
+        for element in elements:
+            page_number = element.metadata.page_number
+            # 页码变化时，先输出之前页面（包括没有文本元素的页面）的图片
+            while (
+                page_number is not None
+                and pending_idx < len(pending_pages)
+                and pending_pages[pending_idx] < page_number
+            ):
+                merged.extend(_image_elements(pending_pages[pending_idx]))
+                pending_idx += 1
+            merged.append(element)
+
+        for page_number in pending_pages[pending_idx:]:
+            merged.extend(_image_elements(page_number))
+
+        return merged
+
     def get_parsed_data(
         self,
         file_name: Optional[str] = None,
@@ -182,6 +389,22 @@ class PptxParser(BaseParser):
                 image_dir=image_dir,
                 relative_path=relative_path,
             )
+        elif self.config.engine == "native":
+            return self._parse_by_native(
+                file_name=file_name,
+                file=file,
+                start_page=start_page,
+                end_page=end_page,
+                include_page_breaks=include_page_breaks,
+                include_slide_notes=include_slide_notes,
+                infer_table_structure=infer_table_structure,
+                extract_images=extract_images,
+                include_image_link_in_text=include_image_link_in_text,
+                ignore_transparent_images=ignore_transparent_images,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                relative_path=relative_path,
+            )
         else:
             raise NotImplementedError(f"Engine {self.config.engine} not supported")
 
@@ -1,13 +1,61 @@
 # /e2m/parsers/doc/url_parser.py
+import asyncio
 import logging
-from typing import IO, List, Optional
+import queue
+import shutil
+import threading
+from contextlib import aclosing
+from pathlib import Path
+from typing import (
+    IO,
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    TypeVar,
+    Union,
+)
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
 
 from wisup_e2m.configs.parsers.base import BaseParserConfig
 from wisup_e2m.parsers.base import BaseParser, E2MParsedData
-from wisup_e2m.utils.web_util import get_web_content
+from wisup_e2m.utils.crawl_util import (
+    CrawlScope,
+    Sitemap,
+    extract_links,
+    is_sitemap_url,
+    parse_robots,
+    parse_sitemap,
+)
+from wisup_e2m.utils.firecrawl_util import FirecrawlCrawlJob
+from wisup_e2m.utils.http_cache import HttpCache, response_validators
+from wisup_e2m.utils.web_util import (
+    DEFAULT_HEADERS,
+    JINA_READER_URL,
+    HostRateLimiter,
+    create_async_client,
+    get_web_content,
+    get_web_content_async,
+    is_retryable_error,
+    normalize_url,
+    retry_delay,
+)
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 _url_parser_params = [
     "url",
     "file_name",
@@ -23,6 +71,12 @@ _url_parser_params = [
 ]
 
 
+class UrlParseResult(NamedTuple):
+    url: str
+    parsed_data: Optional[E2MParsedData]
+    error: Optional[Exception]
+
+
 class UrlParser(BaseParser):
     SUPPORTED_ENGINES = ["unstructured", "jina", "firecrawl"]
     SUPPORTED_FILE_TYPES = ["url"]
@@ -37,6 +91,7 @@ class UrlParser(BaseParser):
         :param client_timeout: int, the client timeout, default is 30
         :param client_max_redirects: int, the client max redirects, default is 5
         :param client_proxy: Optional[str], the client proxy, default is None
+        :param extract_main_content: bool, keep only the main content of the page, default is False
         """
 
         super().__init__(config, **config_kwargs)
@@ -48,6 +103,45 @@ class UrlParser(BaseParser):
         self._ensure_engine_exists()
         self._load_engine()
 
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """
+        The AsyncClient shared by all ``aparse`` calls on the running event loop
+
+        Pooled, keep-alive and HTTP/2 enabled, see :func:`create_async_client`. A client is bound
+        to the event loop it was created on, a new one is created for a new loop.
+        """
+        loop = asyncio.get_running_loop()
+        if (
+            self._async_client is None
+            or self._async_client.is_closed
+            or self._async_client_loop is not loop
+        ):
+            self._async_client = create_async_client(
+                timeout=self.config.client_timeout,
+                max_redirects=self.config.client_max_redirects,
+                proxy=self.config.client_proxy,
+                http2=getattr(self.config, "client_http2", True),
+                max_connections=getattr(self.config, "client_max_connections", 100),
+                max_connections_per_host=getattr(
+                    self.config, "client_max_connections_per_host", 10
+                ),
+                keepalive_expiry=getattr(self.config, "client_keepalive_expiry", 30),
+                cache=self._get_http_cache(),
+            )
+            self._async_client_loop = loop
+        return self._async_client
+
+    async def aclose(self):
+        """Close the shared AsyncClient"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_client_loop = None
+
     def _load_unstructured_engine(self):
         """
         Load the unstructured engine
@@ -172,7 +266,7 @@ class UrlParser(BaseParser):
         logger.info(f"Parsing url: {url} using firecrawl engine")
 
         text = []
-        parsed_text_list = self.firecrawl_app.crawl_url(url)
+        parsed_text_list = self._get_firecrawl_app().crawl_url(url)
         for parsed_text in parsed_text_list:
             text.append(parsed_text["markdown"])
 
@@ -187,6 +281,99 @@ class UrlParser(BaseParser):
             relative_path=relative_path,
         )
 
+    def _parsed_cache_key(self, http_cache: HttpCache, url: str, **options) -> str:
+        return http_cache.parsed_key(
+            url,
+            engine=self.config.engine,
+            extract_main_content=getattr(self.config, "extract_main_content", False),
+            **options,
+        )
+
+    def _page_validators(self, http_cache: HttpCache, url: str, parsed_key: str) -> Dict[str, str]:
+        """
+        The ETag / Last-Modified of the page, a stored parsed result is reused while they match
+
+        The unstructured engine reads the page through ``self.client``, so the page is revalidated
+        with a GET through the http cache: an unchanged page costs a 304, a changed page is
+        fetched once and the engine picks it up from the cache. The other engines fetch the page
+        on their own side, for them a conditional HEAD tells whether the page changed.
+        """
+        try:
+            if self.config.engine == "unstructured":
+                response = self.client.get(url)
+            else:
+                stored = http_cache.parsed_validators(parsed_key)
+                response = self.client.head(
+                    url,
+                    headers=http_cache.conditional_headers({"validators": stored}),
+                    follow_redirects=True,
+                )
+                if response.status_code == 304:
+                    return stored
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Failed to revalidate {url}: {e}")
+            return {}
+        return response_validators(response.headers)
+
+    async def _apage_validators(
+        self, http_cache: HttpCache, url: str, parsed_key: str
+    ) -> Dict[str, str]:
+        try:
+            if self.config.engine == "unstructured":
+                response = await self.async_client.get(url)
+            else:
+                stored = http_cache.parsed_validators(parsed_key)
+                response = await self.async_client.head(
+                    url,
+                    headers=http_cache.conditional_headers({"validators": stored}),
+                    follow_redirects=True,
+                )
+                if response.status_code == 304:
+                    return stored
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Failed to revalidate {url}: {e}")
+            return {}
+        return response_validators(response.headers)
+
+    def _load_cached_parsed_data(
+        self, http_cache: HttpCache, parsed_key: str, validators: Dict[str, str]
+    ) -> Optional[E2MParsedData]:
+        cached = http_cache.get_parsed(parsed_key, validators)
+        if cached is None:
+            return None
+
+        parsed_data, images = cached
+        # 图片可能已被删除，从缓存中恢复
+        for image_path, cached_image in images.items():
+            if not image_path.exists():
+                image_path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(cached_image, image_path)
+
+        logger.info("Page not modified, using the cached parsed data")
+        parsed_data = E2MParsedData.model_validate(parsed_data)
+        parsed_data.metadata["http_cache"] = "hit"
+        return parsed_data
+
+    def _store_parsed_data(
+        self,
+        http_cache: HttpCache,
+        parsed_key: str,
+        validators: Dict[str, str],
+        parsed_data: E2MParsedData,
+        work_dir: str,
+    ):
+        image_paths = []
+        for image in parsed_data.attached_images.values():
+            image_path = Path(image.image_path)
+            if not image_path.is_absolute():
+                image_path = Path(work_dir) / image_path
+            image_paths.append(image_path.resolve())
+        http_cache.put_parsed(
+            parsed_key, validators, parsed_data.model_dump(mode="json"), image_paths
+        )
+
     def get_parsed_data(
         self,
         url: Optional[str] = None,
@@ -209,8 +396,25 @@ class UrlParser(BaseParser):
         if file_name:
             UrlParser._validate_input_file(file_name)
 
+        http_cache = self._get_http_cache() if url else None
+        if http_cache is not None:
+            parsed_key = self._parsed_cache_key(
+                http_cache,
+                url,
+                skip_headers_and_footers=skip_headers_and_footers,
+                include_image_link_in_text=include_image_link_in_text,
+                download_image=download_image,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                relative_path=relative_path,
+            )
+            validators = self._page_validators(http_cache, url, parsed_key)
+            cached = self._load_cached_parsed_data(http_cache, parsed_key, validators)
+            if cached is not None:
+                return cached
+
         if self.config.engine == "unstructured":
-            return self._parse_by_unstructured(
+            parsed_data = self._parse_by_unstructured(
                 url=url,
                 file_name=file_name,
                 file=file,
@@ -223,7 +427,7 @@ class UrlParser(BaseParser):
                 relative_path=relative_path,
             )
         elif self.config.engine == "jina":
-            return self._parse_by_jina(
+            parsed_data = self._parse_by_jina(
                 url=url,
                 include_image_link_in_text=include_image_link_in_text,
                 download_image=download_image,
@@ -232,7 +436,7 @@ class UrlParser(BaseParser):
                 relative_path=relative_path,
             )
         elif self.config.engine == "firecrawl":
-            return self._parse_by_firecrawl(
+            parsed_data = self._parse_by_firecrawl(
                 url=url,
                 include_image_link_in_text=include_image_link_in_text,
                 download_image=download_image,
@@ -243,6 +447,12 @@ class UrlParser(BaseParser):
         else:
             raise NotImplementedError(f"Engine {self.config.engine} not supported")
 
+        if getattr(self.config, "extract_main_content", False):
+            parsed_data = self._extract_main_content(parsed_data)
+        if http_cache is not None:
+            self._store_parsed_data(http_cache, parsed_key, validators, parsed_data, work_dir)
+        return parsed_data
+
     def parse(
         self,
         url: Optional[str] = None,
@@ -268,3 +478,561 @@ class UrlParser(BaseParser):
                 kwargs[k] = v
 
         return self.get_parsed_data(**kwargs)
+
+    async def aget_parsed_data(
+        self,
+        url: Optional[str] = None,
+        file_name: Optional[str] = None,
+        file: Optional[IO[bytes]] = None,
+        text: Optional[str] = None,
+        encoding: str = "utf-8",
+        skip_headers_and_footers: bool = True,
+        include_image_link_in_text: bool = True,
+        download_image: bool = False,
+        work_dir: str = "./",
+        image_dir: str = "./figures",
+        relative_path: bool = True,
+        **kwargs,
+    ) -> E2MParsedData:
+        """
+        Parse the data asynchronously and return the parsed data
+
+        """
+        if not url or self.config.engine == "firecrawl":
+            # 本地文件、文本和 firecrawl sdk 没有异步接口，放到线程中执行
+            return await asyncio.to_thread(
+                self.get_parsed_data,
+                url=url,
+                file_name=file_name,
+                file=file,
+                text=text,
+                encoding=encoding,
+                skip_headers_and_footers=skip_headers_and_footers,
+                include_image_link_in_text=include_image_link_in_text,
+                download_image=download_image,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                relative_path=relative_path,
+            )
+
+        http_cache = self._get_http_cache()
+        if http_cache is not None:
+            parsed_key = self._parsed_cache_key(
+                http_cache,
+                url,
+                skip_headers_and_footers=skip_headers_and_footers,
+                include_image_link_in_text=include_image_link_in_text,
+                download_image=download_image,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                relative_path=relative_path,
+            )
+            validators = await self._apage_validators(http_cache, url, parsed_key)
+            cached = self._load_cached_parsed_data(http_cache, parsed_key, validators)
+            if cached is not None:
+                return cached
+
+        if self.config.engine == "unstructured":
+            logger.info(f"Parsing url: {url} using unstructured engine")
+
+            text = ""
+            try:
+                text = await get_web_content_async(url, client=self.async_client)
+                logger.info(f"Got url content from: {url}")
+            except Exception as e:
+                logger.error(f"Error getting url content: {e}")
+
+            parsed_data = await asyncio.to_thread(
+                self._parse_by_unstructured,
+                text=text,
+                encoding=encoding,
+                skip_headers_and_footers=skip_headers_and_footers,
+                include_image_link_in_text=include_image_link_in_text,
+                work_dir=work_dir,
+                image_dir=image_dir,
+                relative_path=relative_path,
+            )
+        elif self.config.engine == "jina":
+            logger.info(f"Parsing url: {url} using jina engine")
+
+            parsed_text = await get_web_content_async(
+                JINA_READER_URL + url, client=self.async_client
+            )
+            prepare_kwargs = {
+                "include_image_link_in_text": include_image_link_in_text,
+                "download_image": download_image,
+                "work_dir": work_dir,
+                "image_dir": image_dir,
+                "relative_path": relative_path,
+            }
+            if download_image:
+                parsed_data = await asyncio.to_thread(
+                    self._prepare_jina_data_to_e2m_parsed_data, parsed_text, **prepare_kwargs
+                )
+            else:
+                parsed_data = self._prepare_jina_data_to_e2m_parsed_data(
+                    parsed_text, **prepare_kwargs
+                )
+        else:
+            raise NotImplementedError(f"Engine {self.config.engine} not supported")
+
+        if getattr(self.config, "extract_main_content", False):
+            parsed_data = self._extract_main_content(parsed_data)
+        if http_cache is not None:
+            self._store_parsed_data(http_cache, parsed_key, validators, parsed_data, work_dir)
+        return parsed_data
+
+    async def aparse(
+        self,
+        url: Optional[str] = None,
+        file_name: Optional[str] = None,
+        file: Optional[IO[bytes]] = None,
+        text: Optional[str] = None,
+        encoding: str = "utf-8",
+        skip_headers_and_footers: bool = True,
+        include_image_link_in_text: bool = True,
+        download_image: bool = False,
+        work_dir: str = "./",
+        image_dir: str = "./figures",
+        relative_path: bool = True,
+        **kwargs,
+    ) -> E2MParsedData:
+        """Parse the data asynchronously and return the parsed data
+
+        Pages are fetched with the shared :attr:`async_client`, so many urls can be parsed
+        concurrently from one process, e.g. with ``asyncio.gather``. Blocking work, such as
+        partitioning html with unstructured, runs in a worker thread.
+
+        :return: Parsed data
+        :rtype: E2MParsedData
+        """
+        for k, v in locals().items():
+            if k in _url_parser_params:
+                kwargs[k] = v
+
+        return await self.aget_parsed_data(**kwargs)
+
+    async def _aretry(
+        self,
+        url: str,
+        request: Callable[[], Awaitable[T]],
+        rate_limiter: Optional[HostRateLimiter] = None,
+    ) -> T:
+        """Await ``request()``, retrying network errors, 429 and 5xx responses with backoff"""
+        max_retries = getattr(self.config, "max_retries", 3)
+        backoff = getattr(self.config, "retry_backoff", 1)
+        for attempt in range(max_retries + 1):
+            if rate_limiter is not None:
+                await rate_limiter.wait(url)
+            try:
+                return await request()
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable_error(e):
+                    raise
+                delay = retry_delay(attempt, backoff, e)
+                logger.warning(f"Retrying {url} in {delay:.1f}s after error: {e}")
+                await asyncio.sleep(delay)
+
+    async def _aparse_with_retry(
+        self, url: str, rate_limiter: HostRateLimiter, **kwargs
+    ) -> E2MParsedData:
+        return await self._aretry(url, lambda: self.aparse(url=url, **kwargs), rate_limiter)
+
+    async def aparse_many(
+        self, urls: Iterable[str], concurrency: Optional[int] = None, **kwargs
+    ) -> AsyncIterator[UrlParseResult]:
+        """
+        Parse many urls concurrently, yielding each result as soon as it is done
+
+        Urls are read lazily from ``urls`` and deduplicated after normalization. At most
+        ``concurrency`` (default ``batch_concurrency``) urls are parsed at a time, requests to one
+        host are spaced out by ``host_requests_per_second``, and network errors, 429 and 5xx
+        responses are retried ``max_retries`` times with exponential backoff. A url that still
+        fails is yielded with its error instead of stopping the batch.
+
+        :param urls: The urls to parse
+        :param concurrency: Max urls parsed at the same time
+        :param kwargs: Passed to :meth:`aparse`, e.g. ``download_image``
+        """
+        concurrency = max(concurrency or getattr(self.config, "batch_concurrency", 16), 1)
+        rate_limiter = HostRateLimiter(getattr(self.config, "host_requests_per_second", 2))
+        frontier: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def _stop_workers():
+            for _ in range(concurrency):
+                await frontier.put(None)
+
+        async def _feed():
+            seen = set()
+            # 结束标记只在正常结束或出错时发送：被取消时 worker 已停止，队列满了会一直等下去
+            try:
+                for url in urls:
+                    key = normalize_url(url)
+                    if key in seen:
+                        logger.debug(f"Skipping duplicate url: {url}")
+                        continue
+                    seen.add(key)
+                    await frontier.put(url)
+            except Exception:
+                await _stop_workers()
+                raise
+            await _stop_workers()
+
+        async def _work():
+            while (url := await frontier.get()) is not None:
+                try:
+                    parsed_data = await self._aparse_with_retry(url, rate_limiter, **kwargs)
+                    parsed_data.metadata["url"] = url
+                    await results.put(UrlParseResult(url, parsed_data, None))
+                except Exception as e:
+                    logger.error(f"Failed to parse {url}: {e}")
+                    await results.put(UrlParseResult(url, None, e))
+            await results.put(None)
+
+        feeder = asyncio.create_task(_feed())
+        workers = [asyncio.create_task(_work()) for _ in range(concurrency)]
+        try:
+            running = concurrency
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                else:
+                    yield result
+            await feeder
+        finally:
+            for task in [feeder, *workers]:
+                task.cancel()
+            await asyncio.gather(feeder, *workers, return_exceptions=True)
+
+    def parse_many(
+        self, urls: Iterable[str], concurrency: Optional[int] = None, **kwargs
+    ) -> Iterator[UrlParseResult]:
+        """
+        Blocking version of :meth:`aparse_many`, results are yielded as they complete
+
+        The batch runs on an event loop in a background thread, stopping the iteration cancels
+        the urls still in flight.
+        """
+        return self._iterate_in_thread(
+            self.aparse_many(urls, concurrency=concurrency, **kwargs), name="url-parse-many"
+        )
+
+    async def _afetch(self, url: str) -> httpx.Response:
+        response = await self.async_client.get(url, follow_redirects=True)
+        response.raise_for_status()
+        return response
+
+    async def _afetch_robots(self, origin: str) -> Optional[RobotFileParser]:
+        robots_url = origin + "/robots.txt"
+        try:
+            response = await self._afetch(robots_url)
+        except Exception as e:
+            logger.debug(f"No robots.txt at {robots_url}: {e}")
+            return None
+        return parse_robots(response.text, robots_url)
+
+    async def _afetch_sitemap(self, url: str, rate_limiter: HostRateLimiter) -> Sitemap:
+        try:
+            response = await self._aretry(url, lambda: self._afetch(url), rate_limiter)
+        except Exception as e:
+            logger.warning(f"Failed to fetch sitemap {url}: {e}")
+            return Sitemap([], [])
+        return parse_sitemap(response.content)
+
+    async def _afirecrawl(
+        self,
+        url: str,
+        max_depth: int,
+        max_pages: int,
+        include_image_link_in_text: bool = True,
+        download_image: bool = False,
+        work_dir: str = "./",
+        image_dir: str = "./figures",
+        relative_path: bool = True,
+        **kwargs,
+    ) -> AsyncIterator[UrlParseResult]:
+        """Crawl ``url`` with a firecrawl job, yielding the pages as firecrawl scrapes them"""
+        job = FirecrawlCrawlJob(
+            self.async_client,
+            api_url=getattr(self.config, "firecrawl_api_url", None),
+            api_key=getattr(self.config, "api_key", None),
+            poll_interval=getattr(self.config, "firecrawl_poll_interval", 2),
+            max_poll_interval=getattr(self.config, "firecrawl_max_poll_interval", 30),
+            timeout=getattr(self.config, "firecrawl_timeout", None),
+        )
+        await job.submit(
+            url, limit=max_pages, maxDepth=max_depth, scrapeOptions={"formats": ["markdown"]}
+        )
+
+        prepare_kwargs = {
+            "include_image_link_in_text": include_image_link_in_text,
+            "download_image": download_image,
+            "work_dir": work_dir,
+            "image_dir": image_dir,
+            "relative_path": relative_path,
+        }
+        async with aclosing(job.pages()) as pages:
+            async for page in pages:
+                page_metadata = page.get("metadata") or {}
+                page_url = page_metadata.get("sourceURL") or page_metadata.get("url") or url
+                text = page.get("markdown") or ""
+                if download_image:
+                    parsed_data = await asyncio.to_thread(
+                        self._prepare_jina_data_to_e2m_parsed_data, text, **prepare_kwargs
+                    )
+                else:
+                    parsed_data = self._prepare_jina_data_to_e2m_parsed_data(text, **prepare_kwargs)
+
+                parsed_data.metadata = {
+                    "engine": "firecrawl",
+                    "firecrawl_metadata": page_metadata,
+                    "firecrawl_job_id": job.id,
+                    "url": page_url,
+                }
+                if getattr(self.config, "extract_main_content", False):
+                    parsed_data = self._extract_main_content(parsed_data)
+                yield UrlParseResult(page_url, parsed_data, None)
+
+    async def acrawl(
+        self,
+        start_urls: Union[str, Iterable[str]],
+        max_depth: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        **kwargs,
+    ) -> AsyncIterator[UrlParseResult]:
+        """
+        Crawl a site from its start urls and sitemaps, yielding each page as soon as it is parsed
+
+        The pages listed in the sitemaps (from robots.txt, ``/sitemap.xml`` or start urls ending
+        in ``.xml``) and the start urls are crawled first, then the links found on each page, up
+        to ``max_depth`` links away. Only pages on the same site are followed, see
+        :class:`~wisup_e2m.utils.crawl_util.CrawlScope`, and every page is fetched once after url
+        normalization. Fetching is concurrent and rate limited like :meth:`aparse_many`.
+
+        With the firecrawl engine the site is crawled remotely by a firecrawl job instead, see
+        :class:`~wisup_e2m.utils.firecrawl_util.FirecrawlCrawlJob`, and its pages are yielded as
+        firecrawl scrapes them. Stopping the iteration cancels the job.
+
+        :param start_urls: The start urls, or sitemap urls
+        :param max_depth: Max links followed from a start page, default ``crawl_max_depth``
+        :param max_pages: Max pages fetched, default ``crawl_max_pages``
+        :param concurrency: Max pages parsed at the same time, default ``batch_concurrency``
+        :param kwargs: Passed to :meth:`aparse`, e.g. ``download_image``
+        """
+        if isinstance(start_urls, str):
+            start_urls = [start_urls]
+        start_urls = list(start_urls)
+
+        if max_depth is None:
+            max_depth = getattr(self.config, "crawl_max_depth", 3)
+        if max_pages is None:
+            max_pages = getattr(self.config, "crawl_max_pages", 100)
+
+        if self.config.engine == "firecrawl":
+            # firecrawl 在远端爬取，这里只提交任务并拉取结果
+            for url in start_urls:
+                if max_pages <= 0:
+                    break
+                async with aclosing(
+                    self._afirecrawl(url, max_depth=max_depth, max_pages=max_pages, **kwargs)
+                ) as results:
+                    async for result in results:
+                        max_pages -= 1
+                        yield result
+            return
+
+        concurrency = max(concurrency or getattr(self.config, "batch_concurrency", 16), 1)
+        use_sitemap = getattr(self.config, "crawl_use_sitemap", True)
+        respect_robots = getattr(self.config, "crawl_respect_robots", True)
+
+        scope = CrawlScope(start_urls, getattr(self.config, "crawl_under_start_path", True))
+        rate_limiter = HostRateLimiter(getattr(self.config, "host_requests_per_second", 2))
+        robots: Dict[str, Optional[RobotFileParser]] = {}
+        seen: Set[str] = set()
+        frontier: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+
+        def _origin(url: str) -> str:
+            parts = urlsplit(normalize_url(url))
+            return f"{parts.scheme}://{parts.netloc}"
+
+        def _schedule(url: str, depth: int):
+            if len(seen) >= max_pages or url not in scope:
+                return
+            key = normalize_url(url)
+            if key in seen:
+                return
+            origin_robots = robots.get(_origin(url))
+            if origin_robots is not None and not origin_robots.can_fetch(
+                DEFAULT_HEADERS["User-Agent"], url
+            ):
+                logger.debug(f"Skipping {url}, disallowed by robots.txt")
+                return
+            seen.add(key)
+            frontier.put_nowait((url, depth))
+
+        async def _seed():
+            sitemap_urls = [url for url in start_urls if is_sitemap_url(url)]
+            for origin in dict.fromkeys(_origin(url) for url in start_urls):
+                if not (use_sitemap or respect_robots):
+                    break
+                origin_robots = await self._afetch_robots(origin)
+                if respect_robots:
+                    robots[origin] = origin_robots
+                if use_sitemap:
+                    listed = origin_robots.site_maps() if origin_robots is not None else None
+                    sitemap_urls.extend(listed or [origin + "/sitemap.xml"])
+
+            # 先放入起始页，爬取可以马上开始
+            for url in start_urls:
+                if not is_sitemap_url(url):
+                    _schedule(url, 0)
+
+            # sitemap index 可能层层嵌套，最多读取 50 个 sitemap 文件
+            fetched_sitemaps: Set[str] = set()
+            while sitemap_urls and len(seen) < max_pages and len(fetched_sitemaps) < 50:
+                sitemap_url = sitemap_urls.pop(0)
+                if sitemap_url in fetched_sitemaps:
+                    continue
+                fetched_sitemaps.add(sitemap_url)
+                sitemap = await self._afetch_sitemap(sitemap_url, rate_limiter)
+                logger.info(f"Found {len(sitemap.pages)} pages in sitemap {sitemap_url}")
+                for url in sitemap.pages:
+                    _schedule(url, 0)
+                sitemap_urls.extend(sitemap.sitemaps)
+
+        async def _close():
+            try:
+                await _seed()
+                await frontier.join()
+            finally:
+                for _ in range(concurrency):
+                    frontier.put_nowait(None)
+
+        async def _crawl_page(url: str, depth: int) -> Optional[E2MParsedData]:
+            response = await self._aretry(url, lambda: self._afetch(url), rate_limiter)
+            page_url = str(response.url)
+            content_type = response.headers.get("Content-Type", "").lower()
+            if "html" not in content_type or page_url not in scope:
+                logger.info(f"Skipping {url}, not an html page of the site")
+                return None
+            # 重定向后的地址也算已访问
+            seen.add(normalize_url(page_url))
+
+            html = response.text
+            if depth < max_depth:
+                for link in extract_links(html, page_url):
+                    _schedule(link, depth + 1)
+
+            if self.config.engine == "unstructured":
+                # 页面已经下载，直接解析，不再请求一次
+                return await self.aparse(text=html, **kwargs)
+            return await self._aretry(page_url, lambda: self.aparse(url=page_url, **kwargs))
+
+        async def _work():
+            while (item := await frontier.get()) is not None:
+                url, depth = item
+                try:
+                    parsed_data = await _crawl_page(url, depth)
+                    if parsed_data is not None:
+                        parsed_data.metadata["url"] = url
+                        parsed_data.metadata["crawl_depth"] = depth
+                        await results.put(UrlParseResult(url, parsed_data, None))
+                except Exception as e:
+                    logger.error(f"Failed to crawl {url}: {e}")
+                    await results.put(UrlParseResult(url, None, e))
+                finally:
+                    frontier.task_done()
+            await results.put(None)
+
+        closer = asyncio.create_task(_close())
+        workers = [asyncio.create_task(_work()) for _ in range(concurrency)]
+        try:
+            running = concurrency
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                else:
+                    yield result
+            await closer
+        finally:
+            for task in [closer, *workers]:
+                task.cancel()
+            await asyncio.gather(closer, *workers, return_exceptions=True)
+
+    def crawl(
+        self,
+        start_urls: Union[str, Iterable[str]],
+        max_depth: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        **kwargs,
+    ) -> Iterator[UrlParseResult]:
+        """
+        Blocking version of :meth:`acrawl`, pages are yielded as they are parsed
+
+        e.g. ``for result in parser.crawl("https://docs.example.com/"): ...``
+
+        Pages are not checked for near duplicates, use :meth:`E2MParser.crawl` for that.
+        """
+        return self._iterate_in_thread(
+            self.acrawl(
+                start_urls,
+                max_depth=max_depth,
+                max_pages=max_pages,
+                concurrency=concurrency,
+                **kwargs,
+            ),
+            name="url-crawl",
+        )
+
+    def _iterate_in_thread(
+        self, results_iter: AsyncGenerator[UrlParseResult, None], name: str
+    ) -> Iterator[UrlParseResult]:
+        """Run an async iterator of results on an event loop in a background thread
+
+        Stopping the iteration cancels the task on the loop, so requests in flight and remote
+        jobs (e.g. a firecrawl crawl) are cancelled right away, and waits for the thread to end.
+        """
+        results: queue.Queue = queue.Queue()
+        done = object()
+        running: Dict[str, Any] = {}
+
+        async def _run():
+            running["loop"] = asyncio.get_running_loop()
+            running["task"] = asyncio.current_task()
+            try:
+                async for result in results_iter:
+                    results.put(result)
+            finally:
+                # 先结束迭代器，取消还在进行的请求，再关闭 client
+                await results_iter.aclose()
+                await self.aclose()
+
+        def _target():
+            try:
+                asyncio.run(_run())
+            except BaseException as e:
+                results.put(e)
+            finally:
+                results.put(done)
+
+        thread = threading.Thread(target=_target, name=name, daemon=True)
+        thread.start()
+        try:
+            while (item := results.get()) is not done:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            if thread.is_alive() and "task" in running:
+                try:
+                    running["loop"].call_soon_threadsafe(running["task"].cancel)
+                except RuntimeError:
+                    # 事件循环已经结束
+                    pass
+            thread.join()
@@ -1,13 +1,25 @@
 import logging
-from typing import Any, Dict, Optional, Union
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
 
+import httpx
 from pydantic import ValidationError
 import yaml
 from tabulate import tabulate
 
 from wisup_e2m.configs.base import E2MParserConfig
 from wisup_e2m.parsers.base import BaseParser, E2MParsedData
+from wisup_e2m.parsers.doc.url_parser import UrlParseResult
+from wisup_e2m.utils.dedup_util import NearDuplicateIndex
 from wisup_e2m.utils.factory import ParserFactory
+from wisup_e2m.utils.scratch import scratch_job
+from wisup_e2m.utils.web_util import (
+    DEFAULT_HEADERS,
+    DownloadTooLarge,
+    download_document,
+    probe_url_file_type,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +53,7 @@ class E2MParser:
         logger.info("Initializing E2MParser...")
         self.config = config or E2MParserConfig(parsers=DEFAULT_PARSER_CONFIG)
         self.file_type_to_parser_map: Dict[str, BaseParser] = {}
+        self.dedup_index = self._create_dedup_index()
         self._initialize_parsers()
         self._print_initialization_summary()
 
@@ -53,6 +66,18 @@ class E2MParser:
             for file_type in parser.SUPPORTED_FILE_TYPES:
                 self.file_type_to_parser_map[file_type] = parser
 
+    def _create_dedup_index(self) -> Optional[NearDuplicateIndex]:
+        """根据配置创建近似重复索引，未开启时返回 None"""
+        if self.config.dedup_mode is None:
+            return None
+        if self.config.dedup_mode not in ("link", "skip"):
+            raise ValueError(
+                f"Unsupported dedup_mode: {self.config.dedup_mode}. Options are 'link', 'skip'."
+            )
+        return NearDuplicateIndex(
+            threshold=self.config.dedup_threshold, path=self.config.dedup_index_path
+        )
+
     def _print_initialization_summary(self):
         """打印初始化摘要"""
         parsers = list(self.config.parsers.keys())
@@ -130,26 +155,166 @@ class E2MParser:
         :rtype: Optional[E2MParsedData]
         """
         self._validate_input(file_name, url)
-        file_type = self._determine_file_type(file_name, url)
-        parser = self._get_parser(file_type)
 
-        try:
-            return parser.get_parsed_data(
-                file_name=file_name,
-                url=url,
-                start_page=start_page,
-                end_page=end_page,
-                extract_images=extract_images,
-                include_image_link_in_text=include_image_link_in_text,
-                work_dir=work_dir,
-                image_dir=image_dir,
-                relative_path=relative_path,
-                **kwargs,
+        parsed_data = None
+        if url and self.config.route_urls:
+            try:
+                parsed_data = self._parse_url_document(
+                    url,
+                    start_page=start_page,
+                    end_page=end_page,
+                    extract_images=extract_images,
+                    include_image_link_in_text=include_image_link_in_text,
+                    work_dir=work_dir,
+                    image_dir=image_dir,
+                    relative_path=relative_path,
+                    **kwargs,
+                )
+            except Exception as e:
+                logger.error(f"Error parsing document from url: {e}")
+                return None
+
+        if parsed_data is None:
+            file_type = self._determine_file_type(file_name, url)
+            parser = self._get_parser(file_type)
+
+            try:
+                parsed_data = parser.get_parsed_data(
+                    file_name=file_name,
+                    url=url,
+                    start_page=start_page,
+                    end_page=end_page,
+                    extract_images=extract_images,
+                    include_image_link_in_text=include_image_link_in_text,
+                    work_dir=work_dir,
+                    image_dir=image_dir,
+                    relative_path=relative_path,
+                    **kwargs,
+                )
+            except Exception as e:
+                logger.error(f"Error parsing file: {e}")
+                return None
+
+        if parsed_data is not None and self.dedup_index is not None:
+            parsed_data = self._check_duplicate(parsed_data, url or str(Path(file_name).resolve()))
+        return parsed_data
+
+    def crawl(
+        self,
+        start_urls: Union[str, Iterable[str]],
+        max_depth: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        **kwargs,
+    ) -> Iterator[UrlParseResult]:
+        """
+        使用 url 解析器爬取站点，每个页面和 parse 一样经过近似重复检查
+
+        直接调用 UrlParser.crawl 时结果不会去重，需要去重时使用这个方法。
+
+        :param start_urls: 起始 URL 或 sitemap
+        :param max_depth: 最大链接深度，默认为 None
+        :param max_pages: 最多爬取的页面数，默认为 None
+        :param concurrency: 同时解析的页面数，默认为 None
+        :return: 逐页返回的爬取结果
+        :rtype: Iterator[UrlParseResult]
+        """
+        results = self._get_parser("url").crawl(
+            start_urls,
+            max_depth=max_depth,
+            max_pages=max_pages,
+            concurrency=concurrency,
+            **kwargs,
+        )
+        # 提前停止迭代时立即关闭底层的爬取，取消还在进行的请求
+        with closing(results):
+            for result in results:
+                if result.parsed_data is not None and self.dedup_index is not None:
+                    self._check_duplicate(result.parsed_data, result.url)
+                yield result
+
+    def _check_duplicate(self, parsed_data: E2MParsedData, source: str) -> E2MParsedData:
+        """
+        在近似重复索引中查找解析结果，找到时在 metadata 中记录 duplicate_of 和 duplicate_similarity
+
+        dedup_mode 为 "skip" 时清空文本和图片，后续不必再转换；为 "link" 时保留内容。
+        重复的内容不加入索引，之后的副本都指向最早的那一份。
+
+        :param parsed_data: 解析后的数据
+        :param source: 数据来源，URL 或文件的绝对路径
+        :return: 解析后的数据
+        """
+        match = self.dedup_index.check_and_add(source, parsed_data.text)
+        if match is None:
+            return parsed_data
+
+        logger.info(
+            f"{source} is a near duplicate of {match.source} (similarity {match.similarity:.2f})"
+        )
+        parsed_data.metadata["duplicate_of"] = match.source
+        parsed_data.metadata["duplicate_similarity"] = match.similarity
+        if self.config.dedup_mode == "skip":
+            parsed_data.text = ""
+            parsed_data.images = {}
+            parsed_data.attached_images = {}
+        return parsed_data
+
+    def _parse_url_document(self, url: str, **kwargs) -> Optional[E2MParsedData]:
+        """
+        如果 url 指向 pdf、docx 等文档，下载后交给对应的解析器
+
+        先用 HEAD 请求判断类型，无法判断时读取响应的前几个字节。文档以流的方式写入临时目录，
+        解析完成后删除。
+
+        :param url: URL
+        :return: 解析后的数据，url 不是可解析的文档时返回 None，由 url 解析器处理
+        """
+
+        def _accept(file_type: str) -> bool:
+            return file_type not in ("url", "html", "htm") and (
+                file_type in self.file_type_to_parser_map
             )
-        except Exception as e:
-            logger.error(f"Error parsing file: {e}")
+
+        url_parser = self.file_type_to_parser_map.get("url")
+        if url_parser is None:
+            with httpx.Client(headers=DEFAULT_HEADERS, follow_redirects=True) as client:
+                return self._download_and_parse(url, client, _accept, **kwargs)
+        return self._download_and_parse(url, url_parser.client, _accept, **kwargs)
+
+    def _download_and_parse(
+        self, url: str, client: httpx.Client, accept, **kwargs
+    ) -> Optional[E2MParsedData]:
+        # HEAD 明确返回 html 时直接交给 url 解析器，省去一次下载
+        if probe_url_file_type(url, client) == "html":
             return None
 
+        with scratch_job("url") as job:
+            try:
+                document_path = download_document(
+                    url,
+                    job.new_path(),
+                    client,
+                    accept=accept,
+                    max_size=self.config.url_download_max_size * 1024 * 1024,
+                )
+            except (httpx.HTTPError, DownloadTooLarge) as e:
+                # 页面可能拒绝直接访问（如 403），jina 等引擎仍可以自己抓取
+                logger.info(f"Could not download {url}, leaving it to the url parser: {e}")
+                return None
+            if document_path is None:
+                return None
+
+            file_type = document_path.suffix.lstrip(".")
+            logger.info(f"Parsing {url} as {file_type}")
+            parsed_data = self._get_parser(file_type).get_parsed_data(
+                file_name=str(document_path), **kwargs
+            )
+
+        if parsed_data is not None:
+            parsed_data.metadata["url"] = url
+            parsed_data.metadata["file_type"] = file_type
+        return parsed_data
+
     def _validate_input(self, file_name: str, url: str):
         """
         验证输入参数
@@ -0,0 +1,110 @@
+import re
+from typing import List, NamedTuple, Tuple
+
+_IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+_MARKUP_PATTERN = re.compile(r"^\s*(?:[-*+>|#]+|\d+\.)\s*|[*_`~|]+", re.MULTILINE)
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+# 每一行至少要有这么多字符才算正文，导航、按钮、菜单项等短行会被扣分
+_MIN_LINE_CHARS = 40
+# 链接文字的权重，正文中的链接少，导航、相关文章列表中的链接多
+_LINK_PENALTY = 2
+
+
+class MainContent(NamedTuple):
+    text: str
+    removed_chars: int
+    kept_blocks: int
+    total_blocks: int
+
+
+def split_markdown_blocks(text: str) -> List[str]:
+    """Split Markdown into blocks separated by blank lines, fenced code blocks stay whole"""
+    blocks = []
+    lines: List[str] = []
+    in_fence = False
+    for line in text.split("\n"):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if lines:
+                blocks.append("\n".join(lines))
+                lines = []
+            continue
+        lines.append(line)
+    if lines:
+        blocks.append("\n".join(lines))
+    return blocks
+
+
+def _text_weight(text: str) -> int:
+    # 中日韩文字的信息量大，按两个字符计
+    return len(text) + len(_CJK_PATTERN.findall(text))
+
+
+def _visible_text(block: str) -> Tuple[str, str]:
+    # 返回 (可见文字, 其中链接的文字)
+    block = _IMAGE_PATTERN.sub("", block)
+    link_text = "".join(_LINK_PATTERN.findall(block))
+    text = _MARKUP_PATTERN.sub("", _LINK_PATTERN.sub(r"\1", block))
+    return text.strip(), link_text.strip()
+
+
+def score_markdown_block(block: str) -> float:
+    """How likely a block is main content, positive for content, negative for boilerplate
+
+    Long lines of plain text score high (text density), short lines and link text score low
+    (link density). Headings and image-only blocks are neutral, they belong to whatever
+    surrounds them.
+    """
+    if block.lstrip().startswith("```"):
+        return float(len(block) - _MIN_LINE_CHARS)
+    if _HEADING_PATTERN.match(block):
+        return 0.0
+
+    text, link_text = _visible_text(block)
+    if not text:
+        return 0.0
+
+    n_lines = sum(1 for line in block.split("\n") if line.strip())
+    return float(
+        _text_weight(text) - _LINK_PENALTY * _text_weight(link_text) - _MIN_LINE_CHARS * n_lines
+    )
+
+
+def extract_main_content(text: str) -> MainContent:
+    """Keep the main content of a page converted to Markdown, readability style
+
+    Every block is scored by :func:`score_markdown_block`, and the contiguous run of blocks with
+    the highest total score is kept, together with the headings right before it. Navigation,
+    cookie banners, sidebars and footers around the article score negative and fall outside the
+    run. The text is returned unchanged if no block looks like content.
+    """
+    blocks = split_markdown_blocks(text)
+    scores = [score_markdown_block(block) for block in blocks]
+
+    # 最大子段和，找出得分最高的连续段落
+    best_sum, best_start, best_end = 0.0, 0, -1
+    current_sum, current_start = 0.0, 0
+    for idx, score in enumerate(scores):
+        if current_sum <= 0:
+            current_sum, current_start = 0.0, idx
+        current_sum += score
+        if current_sum > best_sum:
+            best_sum, best_start, best_end = current_sum, current_start, idx
+
+    if best_end < 0:
+        return MainContent(text, 0, len(blocks), len(blocks))
+
+    while best_start > 0 and _HEADING_PATTERN.match(blocks[best_start - 1]):
+        best_start -= 1
+
+    main_text = "\n\n".join(blocks[best_start : best_end + 1])
+    return MainContent(
+        text=main_text,
+        removed_chars=max(len(text) - len(main_text), 0),
+        kept_blocks=best_end + 1 - best_start,
+        total_blocks=len(blocks),
+    )
@@ -0,0 +1,172 @@
+import gzip
+import logging
+import posixpath
+from typing import Iterable, List, NamedTuple, Optional, Set
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from wisup_e2m.utils.html_util import local_tag
+from wisup_e2m.utils.web_util import normalize_url
+
+logger = logging.getLogger(__name__)
+
+# 这些扩展名的链接不是网页，爬取时跳过
+_NON_PAGE_EXTENSIONS = {
+    "png",
+    "jpg",
+    "jpeg",
+    "gif",
+    "webp",
+    "svg",
+    "ico",
+    "bmp",
+    "avif",
+    "css",
+    "js",
+    "mjs",
+    "json",
+    "map",
+    "woff",
+    "woff2",
+    "ttf",
+    "otf",
+    "eot",
+    "zip",
+    "gz",
+    "tgz",
+    "bz2",
+    "xz",
+    "7z",
+    "rar",
+    "tar",
+    "exe",
+    "dmg",
+    "apk",
+    "whl",
+    "mp3",
+    "mp4",
+    "m4a",
+    "wav",
+    "ogg",
+    "webm",
+    "mov",
+    "avi",
+    "pdf",
+    "doc",
+    "docx",
+    "ppt",
+    "pptx",
+    "xls",
+    "xlsx",
+    "epub",
+}
+
+
+class Sitemap(NamedTuple):
+    pages: List[str]
+    # sitemap index 中列出的子 sitemap
+    sitemaps: List[str]
+
+
+def is_sitemap_url(url: str) -> bool:
+    path = urlsplit(url).path.lower()
+    return path.endswith(".xml") or path.endswith(".xml.gz")
+
+
+def parse_sitemap(content: bytes) -> Sitemap:
+    """Page urls and nested sitemap urls of a sitemap.xml or a sitemap index, gzip allowed"""
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+
+    # 不解析外部实体，避免 XXE
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+    try:
+        root = etree.fromstring(content, parser)
+    except etree.XMLSyntaxError:
+        root = None
+    if root is None:
+        return Sitemap([], [])
+
+    pages, sitemaps = [], []
+    for loc in root.iter("{*}loc"):
+        url = (loc.text or "").strip()
+        if not url:
+            continue
+        parent = loc.getparent()
+        if parent is not None and local_tag(parent) == "sitemap":
+            sitemaps.append(url)
+        else:
+            pages.append(url)
+    return Sitemap(pages, sitemaps)
+
+
+def parse_robots(content: str, robots_url: str) -> RobotFileParser:
+    robots = RobotFileParser(robots_url)
+    robots.parse(content.splitlines())
+    return robots
+
+
+def extract_links(html: str, base_url: str) -> List[str]:
+    """Absolute http(s) urls of the ``<a href>`` links of a page, in document order
+
+    Relative links are resolved against ``<base href>`` or ``base_url``, fragments are dropped
+    and ``rel="nofollow"`` links are skipped.
+    """
+    try:
+        root = lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return []
+
+    base = root.find(".//base[@href]")
+    if base is not None:
+        base_url = urljoin(base_url, base.get("href").strip())
+
+    links = []
+    for a in root.iter("a", "area"):
+        href = (a.get("href") or "").strip()
+        if not href or href.startswith("#") or "nofollow" in (a.get("rel") or "").lower():
+            continue
+        url = urljoin(base_url, href).split("#", 1)[0]
+        if urlsplit(url).scheme in ("http", "https"):
+            links.append(url)
+    return links
+
+
+class CrawlScope:
+    """Which urls belong to a crawl started from ``start_urls``
+
+    Only http(s) pages on the hosts of the start urls are in scope, ``www.`` is ignored when
+    comparing hosts. If ``under_start_path`` is set, a page must also live under the directory of
+    one of the start urls, e.g. ``https://example.com/docs/intro`` keeps the crawl in ``/docs/``.
+    """
+
+    def __init__(self, start_urls: Iterable[str], under_start_path: bool = True):
+        self.hosts: Set[str] = set()
+        self.path_prefixes: Set[str] = set()
+        for url in start_urls:
+            parts = urlsplit(normalize_url(url))
+            self.hosts.add(self._host(parts.hostname))
+            if is_sitemap_url(url) or not under_start_path:
+                self.path_prefixes.add("/")
+            else:
+                self.path_prefixes.add(posixpath.dirname(parts.path).rstrip("/") + "/")
+
+    @staticmethod
+    def _host(hostname: Optional[str]) -> str:
+        hostname = (hostname or "").lower()
+        return hostname[4:] if hostname.startswith("www.") else hostname
+
+    def __contains__(self, url: str) -> bool:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or self._host(parts.hostname) not in self.hosts:
+            return False
+
+        path = parts.path or "/"
+        ext = posixpath.splitext(path)[1].lstrip(".").lower()
+        if ext in _NON_PAGE_EXTENSIONS:
+            return False
+        # "/docs" 本身也属于 "/docs/"
+        return any((path + "/").startswith(prefix) for prefix in self.path_prefixes)
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字没有空格分词，每个字算一个词
+_TOKEN_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]|\w+")
+# 图片和链接地址因页面而异（打印版、镜像站），只比较文字
+_IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MASK_64 = (1 << 64) - 1
+
+Signature = Tuple[int, ...]
+
+
+class DuplicateMatch(NamedTuple):
+    source: str
+    similarity: float
+
+
+def text_shingles(text: str, size: int = 5) -> Set[int]:
+    """32-bit hashes of the word ``size``-grams of a text, ignoring case, markup and link urls"""
+    text = _LINK_PATTERN.sub(r"\1", _IMAGE_PATTERN.sub("", text))
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return set()
+
+    grams = {" ".join(tokens[i : i + size]) for i in range(max(len(tokens) - size + 1, 1))}
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little")
+        for gram in grams
+    }
+
+
+class MinHash:
+    """MinHash signatures, the share of equal values estimates the Jaccard similarity of the
+    shingle sets of two texts
+
+    A permutation maps a shingle hash ``h`` to ``((a * h + b) mod 2**64) mod (2**61 - 1)``, the
+    same in pure Python and with numpy, which is used when installed.
+
+    :param num_perm: Number of hash permutations, i.e. the signature length
+    :param seed: Seed of the permutations, signatures are only comparable with the same seed
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text: str) -> Signature:
+        """Signature of a text, empty for a text without words"""
+        hashes = text_shingles(text)
+        if not hashes:
+            return ()
+
+        try:
+            import numpy as np
+        except ImportError:
+            return tuple(
+                min(((a * h + b) & _MASK_64) % _MERSENNE_PRIME for h in hashes)
+                for a, b in self.permutations
+            )
+
+        a, b = (np.array(values, dtype=np.uint64)[:, None] for values in zip(*self.permutations))
+        hashes = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        signature = np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+        # 分块计算，避免长文本生成 num_perm x 分片数 的大矩阵；uint64 乘法溢出即 mod 2**64
+        for start in range(0, len(hashes), 4096):
+            values = (a * hashes[start : start + 4096] + b) % np.uint64(_MERSENNE_PRIME)
+            np.minimum(signature, values.min(axis=1), out=signature)
+        return tuple(int(value) for value in signature)
+
+    @staticmethod
+    def similarity(signature: Signature, other: Signature) -> float:
+        if not signature or len(signature) != len(other):
+            return 0.0
+        return sum(x == y for x, y in zip(signature, other)) / len(signature)
+
+
+def _lsh_rows(num_perm: int, threshold: float) -> int:
+    # 每个 band 的行数 r 越大，成为候选的门槛 (1/b)^(1/r) 越高；
+    # 取门槛明显低于 threshold 的最大 r，漏掉真正重复的概率可以忽略
+    rows = 1
+    for r in range(1, num_perm + 1):
+        if num_perm % r == 0 and (r / num_perm) ** (1 / r) <= threshold - 0.2:
+            rows = r
+    return rows
+
+
+class NearDuplicateIndex:
+    """Index of the parsed texts seen so far, finds texts that are near duplicates of them
+
+    Texts are compared by :class:`MinHash` signatures of their word 5-grams. Locality sensitive
+    hashing over bands of the signature finds candidates without comparing against every
+    indexed text, and a candidate is a match when its estimated similarity reaches
+    ``threshold``. Print views, pagination variants and mirrored copies of a page usually score
+    above 0.9.
+
+    :param threshold: Min similarity for a text to be a near duplicate, between 0 and 1
+    :param num_perm: Signature length, longer signatures estimate similarity more precisely
+    :param path: A JSON lines file the index is loaded from and appended to, None for an
+        in-memory index
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        path: Optional[Union[str, Path]] = None,
+    ):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+
+        self.threshold = threshold
+        self.minhash = MinHash(num_perm)
+        self.rows = _lsh_rows(num_perm, threshold)
+        self.path = Path(path) if path else None
+
+        self._signatures: Dict[str, Signature] = {}
+        self._buckets: Dict[Tuple[int, Signature], List[str]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, source: str) -> bool:
+        return source in self._signatures
+
+    def _bands(self, signature: Signature):
+        for start in range(0, len(signature), self.rows):
+            yield start, signature[start : start + self.rows]
+
+    def _insert(self, source: str, signature: Signature):
+        self._remove(source)
+        self._signatures[source] = signature
+        for band in self._bands(signature):
+            self._buckets[band].append(source)
+
+    def _remove(self, source: str):
+        signature = self._signatures.pop(source, None)
+        if signature is not None:
+            for band in self._bands(signature):
+                self._buckets[band].remove(source)
+                if not self._buckets[band]:
+                    del self._buckets[band]
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 上次写入时中断，只会损坏最后一行
+                    logger.warning(f"Skipping a broken line in {self.path}")
+                    continue
+                signature = tuple(entry["signature"])
+                if len(signature) == self.minhash.num_perm:
+                    self._insert(entry["source"], signature)
+        logger.info(f"Loaded {len(self)} texts from near-duplicate index {self.path}")
+
+    def _append(self, source: str, signature: Signature):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"source": source, "signature": signature}) + "\n")
+
+    def _query(
+        self, signature: Signature, exclude: Optional[str] = None
+    ) -> Optional[DuplicateMatch]:
+        candidates = {
+            source for band in self._bands(signature) for source in self._buckets.get(band, ())
+        }
+        candidates.discard(exclude)
+
+        best = None
+        for source in candidates:
+            similarity = self.minhash.similarity(signature, self._signatures[source])
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                best = DuplicateMatch(source, similarity)
+        return best
+
+    def query(self, text: str) -> Optional[DuplicateMatch]:
+        """The most similar indexed text if it is a near duplicate of ``text``"""
+        signature = self.minhash.signature(text)
+        if not signature:
+            return None
+        with self._lock:
+            return self._query(signature)
+
+    def add(self, source: str, text: str):
+        """Index ``text`` under ``source``, replacing an earlier text of the same source"""
+        signature = self.minhash.signature(text)
+        if not signature:
+            return
+        with self._lock:
+            self._insert(source, signature)
+            self._append(source, signature)
+
+    def check_and_add(self, source: str, text: str) -> Optional[DuplicateMatch]:
+        """
+        Find a near duplicate of ``text`` from another source, or index the text if there is none
+
+        Duplicates are not indexed, so later copies are matched against the first one. Checking
+        the same source again, e.g. a document parsed twice, does not match itself.
+        """
+        signature = self.minhash.signature(text)
+        if not signature:
+            return None
+        with self._lock:
+            match = self._query(signature, exclude=source)
+            if match is None:
+                self._insert(source, signature)
+                self._append(source, signature)
+            return match
@@ -1,21 +1,29 @@
 import logging
+from typing import Optional
 
-from wisup_e2m.utils.libreoffice import convert_by_libreoffice
+from wisup_e2m.utils.libreoffice import LibreOfficePool, convert_by_libreoffice
 
 logger = logging.getLogger(__name__)
 
 
-def convert_doc_to_docx(doc_path: str, docx_path: str, rm_original: bool = False):
+def convert_doc_to_docx(
+    doc_path: str,
+    docx_path: str,
+    rm_original: bool = False,
+    pool: Optional[LibreOfficePool] = None,
+):
     """Convert a .doc file to a .docx file.
 
     Args:
         doc_path: The path to the .doc file.
         docx_path: The path to the .docx file.
         rm_original: Whether to remove the original .doc file after conversion.
+        pool: A pool of running LibreOffice listeners to convert with, defaults to a new
+            soffice process.
 
     Raises:
         subprocess.CalledProcessError: If the conversion command fails.
 
     """
 
-    convert_by_libreoffice(doc_path, "docx", docx_path, rm_original)
+    convert_by_libreoffice(doc_path, "docx", docx_path, rm_original, pool=pool)
@@ -1,9 +1,9 @@
 import io
-import os
 from typing import IO, Any, Dict, Union
 
 from docx import Document
 
+from wisup_e2m.utils.image_store import ImageStore
 from wisup_e2m.utils.image_util import has_transparent_background
 
 
@@ -13,7 +13,7 @@ def get_docx_images(
     target_image_dir: str,
     ignore_transparent_images: bool = False,
 ) -> Dict[int, Any]:
-    os.makedirs(target_image_dir, exist_ok=True)
+    store = ImageStore(target_image_dir)
     image_dict = {}
 
     if file_name:
@@ -24,8 +24,6 @@ def get_docx_images(
     else:
         raise ValueError("Either file_name or file must be provided")
 
-    image_count = 0
-
     for idx, rel in enumerate(doc.part.rels.values()):
         if "image" in rel.target_ref:
             image_bytes = rel.target_part.blob
@@ -34,10 +32,7 @@ def get_docx_images(
                 continue
 
             image_ext = rel.target_part.content_type.split("/")[-1]
-            image_name = f"{idx}_{image_count}.{image_ext}"
-            image_file = os.path.join(target_image_dir, image_name)
-            with open(image_file, "wb") as f:
-                f.write(image_bytes)
+            stored = store.put(image_bytes, image_ext)
 
             if idx not in image_dict:
                 image_dict[idx] = []
@@ -45,10 +40,12 @@ def get_docx_images(
             image_dict[idx].append(
                 {
                     "image_number": idx,
-                    "image_file": image_file,
-                    "image_name": image_name,
+                    "image_file": str(stored.path),
+                    "image_name": stored.path.name,
+                    "digest": stored.digest,
                 }
             )
-            image_count += 1
 
-    return image_dict  # {image_number: [{'image_number': 0, 'image_file': 'extracted_images/0_0.png', 'image_name': '0_0.png'}]}
+    # {image_number: [{'image_number': 0, 'image_file': 'extracted_images/<sha256>.png',
+    #                 'image_name': '<sha256>.png', 'digest': '<sha256>'}]}
+    return image_dict
@@ -1,11 +1,21 @@
 import io
+import logging
 import os
-from typing import IO, Any, Dict, Union
+import posixpath
+import zipfile
+from pathlib import Path
+from typing import IO, Any, Dict, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import unquote
 
 from ebooklib import epub
+from lxml import etree
 
+from wisup_e2m.utils.html_util import HtmlMarkdownRenderer, local_tag, parse_xhtml
+from wisup_e2m.utils.image_store import ImageStore
 from wisup_e2m.utils.image_util import has_transparent_background
 
+logger = logging.getLogger(__name__)
+
 
 def get_epub_images(
     file_name: Union[str, None],
@@ -13,7 +23,7 @@ def get_epub_images(
     target_image_dir: str,
     ignore_transparent_images: bool = False,
 ) -> Dict[int, Any]:
-    os.makedirs(target_image_dir, exist_ok=True)
+    store = ImageStore(target_image_dir)
     image_dict = {}
 
     if file_name:
@@ -31,21 +41,144 @@ def get_epub_images(
             if ignore_transparent_images and has_transparent_background(io.BytesIO(image_bytes)):
                 continue
 
-            image_name = f"{idx}_{item.file_name.split('/')[-1]}"
-            image_path = os.path.join(target_image_dir, image_name)
-            with open(image_path, "wb") as f:
-                f.write(image_bytes)
+            stored = store.put(image_bytes, os.path.splitext(item.file_name)[1])
 
             if idx not in image_dict:
                 image_dict[idx] = []
 
             image_dict[idx].append(
                 {
-                    "image_file": image_path,
-                    "image_name": image_name,
+                    "image_file": str(stored.path),
+                    "image_name": stored.path.name,
+                    "digest": stored.digest,
                 }
             )
 
-    print(image_dict)
+    logger.debug(f"Extracted epub images: {image_dict}")
 
     return image_dict  # {page_number: [{'image_file': 'path/to/image', 'image_name': 'name'}]}
+
+
+_CONTAINER_PATH = "META-INF/container.xml"
+_EPUB_NAMESPACES = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+
+
+class EpubSpine(NamedTuple):
+    title: Optional[str]
+    chapters: List[str]  # zip 内的章节路径，按 spine 顺序
+
+
+def read_epub_spine(zip_ref: zipfile.ZipFile) -> EpubSpine:
+    """Read the title and the spine of an EPUB from its package document
+
+    Only ``META-INF/container.xml`` and the OPF are read, the chapters stay in the zip.
+    """
+    container = etree.fromstring(zip_ref.read(_CONTAINER_PATH))
+    opf_path = container.xpath(
+        "string(//container:rootfile/@full-path)", namespaces=_EPUB_NAMESPACES
+    )
+    if not opf_path:
+        raise ValueError("Invalid epub: no rootfile in META-INF/container.xml")
+
+    opf = etree.fromstring(zip_ref.read(opf_path))
+    opf_dir = posixpath.dirname(opf_path)
+
+    manifest = {}
+    for item in opf.xpath("//opf:manifest/opf:item", namespaces=_EPUB_NAMESPACES):
+        manifest[item.get("id")] = (item.get("href"), item.get("media-type"))
+
+    chapters = []
+    for itemref in opf.xpath("//opf:spine/opf:itemref", namespaces=_EPUB_NAMESPACES):
+        href, media_type = manifest.get(itemref.get("idref"), (None, None))
+        if not href or media_type not in ("application/xhtml+xml", "text/html"):
+            continue
+        chapters.append(posixpath.normpath(posixpath.join(opf_dir, unquote(href))))
+
+    title = opf.xpath("string(//dc:title)", namespaces=_EPUB_NAMESPACES).strip() or None
+    return EpubSpine(title=title, chapters=chapters)
+
+
+def render_epub_chapter(
+    zip_ref: zipfile.ZipFile,
+    chapter_path: str,
+    target_image_dir: str,
+    work_dir: str = "./",
+    relative_path: bool = True,
+    extract_images: bool = True,
+    include_image_link_in_text: bool = True,
+    ignore_transparent_images: bool = False,
+) -> Tuple[str, List[Tuple[str, str]]]:
+    """Render one XHTML chapter to Markdown, with image links resolved in place
+
+    Images referenced by the chapter are read from the zip and stored by :class:`ImageStore`.
+
+    :param chapter_path: Path of the chapter inside the zip
+    :return: The Markdown, and (image link, digest) of every image in the chapter
+    """
+    store = ImageStore(target_image_dir) if extract_images else None
+    work_dir = Path(work_dir).resolve()
+    chapter_dir = posixpath.dirname(chapter_path)
+    images = []
+    image_links = {}
+
+    def _resolve_image(src: str) -> Optional[str]:
+        if not extract_images or src.startswith(("http://", "https://", "data:")):
+            return None
+        image_path = posixpath.normpath(posixpath.join(chapter_dir, unquote(src.split("#")[0])))
+        if image_path in image_links:
+            return image_links[image_path]
+
+        try:
+            image_bytes = zip_ref.read(image_path)
+        except KeyError:
+            logger.warning(f"Image {image_path} referenced by {chapter_path} not found in epub")
+            image_links[image_path] = None
+            return None
+
+        if ignore_transparent_images and has_transparent_background(io.BytesIO(image_bytes)):
+            image_links[image_path] = None
+            return None
+
+        stored = store.put(image_bytes, posixpath.splitext(image_path)[1])
+        if relative_path:
+            try:
+                link = str(stored.path.relative_to(work_dir))
+            except ValueError:
+                link = str(stored.path)
+        else:
+            link = str(stored.path)
+        image_links[image_path] = link
+        images.append((link, stored.digest))
+        return link
+
+    def _resolve_link(href: str) -> Optional[str]:
+        # 书内的章节链接在 Markdown 中没有意义，只保留外部链接
+        return href if href.startswith(("http://", "https://", "mailto:")) else None
+
+    root = parse_xhtml(zip_ref.read(chapter_path))
+    body = next((el for el in root.iter() if local_tag(el) == "body"), root)
+    renderer = HtmlMarkdownRenderer(
+        resolve_image=_resolve_image,
+        resolve_link=_resolve_link,
+        include_image_link_in_text=include_image_link_in_text,
+    )
+    return renderer.render(body), images
+
+
+def render_epub_chapters(
+    source: Union[str, bytes], chapter_paths: List[str], target_image_dir: str, **kwargs
+) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """Render chapters of an EPUB, run in a worker process
+
+    :param source: Path to the epub, or its content
+    :param kwargs: Options passed to :func:`render_epub_chapter`
+    """
+    with zipfile.ZipFile(source if isinstance(source, str) else io.BytesIO(source)) as zip_ref:
+        return [
+            render_epub_chapter(zip_ref, chapter_path, target_image_dir, **kwargs)
+            for chapter_path in chapter_paths
+        ]
@@ -0,0 +1,70 @@
+import hashlib
+from pathlib import Path
+from typing import Optional, Union
+
+
+def file_sha256(file_path: Union[str, Path], chunk_size: int = 1024 * 1024) -> str:
+    """Hex sha256 digest of a file, read in chunks so large files are not loaded at once"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# 常见 Content-Type 对应的文件类型
+CONTENT_TYPE_TO_FILE_TYPE = {
+    "application/pdf": "pdf",
+    "application/msword": "doc",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.ms-powerpoint": "ppt",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": "pptx",
+    "application/epub+zip": "epub",
+    "text/html": "html",
+    "application/xhtml+xml": "html",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/mp4": "m4a",
+    "audio/x-m4a": "m4a",
+}
+
+
+def sniff_file_type(head: bytes) -> Optional[str]:
+    """Guess the file type from the first bytes of a file
+
+    Zip based formats (docx, pptx, epub) all start with "PK" and are reported as "zip", use
+    :func:`zip_file_type` on the whole file to tell them apart. OLE files (doc, ppt) are reported
+    as "ole".
+    """
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return "ole"
+    if head.startswith(b"ID3") or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "mp3"
+    if head[4:8] == b"ftyp" and head[8:11] in (b"M4A", b"mp4", b"iso"):
+        return "m4a"
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if text.startswith((b"<!doctype html", b"<html", b"<head", b"<body")):
+        return "html"
+    return None
+
+
+def zip_file_type(file_path: Union[str, Path]) -> Optional[str]:
+    """Tell docx, pptx and epub apart by the members of the zip file"""
+    import zipfile
+
+    try:
+        with zipfile.ZipFile(file_path) as zip_ref:
+            names = set(zip_ref.namelist())
+            if "mimetype" in names and zip_ref.read("mimetype").strip() == b"application/epub+zip":
+                return "epub"
+    except zipfile.BadZipFile:
+        return None
+    if "word/document.xml" in names:
+        return "docx"
+    if "ppt/presentation.xml" in names:
+        return "pptx"
+    return None
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from wisup_e2m.utils.web_util import is_retryable_error
+
+logger = logging.getLogger(__name__)
+
+FIRECRAWL_API_URL = "https://api.firecrawl.dev"
+
+_FINISHED_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class FirecrawlError(Exception):
+    """Raised when a firecrawl crawl job fails or cannot be submitted"""
+
+
+class FirecrawlCrawlJob:
+    """A crawl job of the firecrawl v1 REST API
+
+    The crawl is submitted with :meth:`submit` and its pages are streamed by :meth:`pages`, which
+    polls the job status with backoff and yields each page once, as soon as firecrawl has scraped
+    it. :meth:`cancel` stops a job that is still running, ``pages`` calls it when the iteration
+    is stopped early or the task is cancelled.
+
+    :param client: The client used for the API requests
+    :param api_url: The firecrawl endpoint, e.g. a self-hosted instance
+    :param api_key: The API key, defaults to the ``FIRECRAWL_API_KEY`` environment variable
+    :param poll_interval: Seconds before the first status poll, and after a poll with new pages
+    :param max_poll_interval: Max seconds between polls, the interval doubles while no new page
+        comes in
+    :param timeout: Max seconds to wait for the crawl, None for no limit
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        api_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        poll_interval: float = 2,
+        max_poll_interval: float = 30,
+        timeout: Optional[float] = None,
+    ):
+        self.client = client
+        self.api_url = (api_url or FIRECRAWL_API_URL).rstrip("/")
+        self.api_key = api_key or os.getenv("FIRECRAWL_API_KEY")
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(max_poll_interval, poll_interval)
+        self.timeout = timeout
+
+        self.id: Optional[str] = None
+        self.status: Optional[str] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    @property
+    def finished(self) -> bool:
+        return self.status in _FINISHED_STATUSES
+
+    async def _request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def submit(self, url: str, **options) -> str:
+        """Start crawling ``url`` and return the job id
+
+        :param options: Crawl options of the firecrawl API, e.g. ``limit`` or ``maxDepth``
+        """
+        result = await self._request(
+            "POST", f"{self.api_url}/v1/crawl", json={"url": url, **options}
+        )
+        if not result.get("success", True) or not result.get("id"):
+            raise FirecrawlError(f"Failed to start crawling {url}: {result.get('error', result)}")
+
+        self.id = result["id"]
+        self.status = "scraping"
+        logger.info(f"Started firecrawl job {self.id} for {url}")
+        return self.id
+
+    async def pages(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the scraped pages of the job, each a dict with ``markdown`` and ``metadata``"""
+        if self.id is None:
+            raise FirecrawlError("The crawl job has not been submitted")
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        interval = self.poll_interval
+        yielded = 0
+        result: Dict[str, Any] = {}
+        try:
+            while True:
+                await asyncio.sleep(interval)
+
+                # 状态接口返回目前已抓取的所有页面，用 skip 只取新的页面，结果分页时跟随 next
+                new_pages = 0
+                next_url: Optional[str] = f"{self.api_url}/v1/crawl/{self.id}"
+                params: Optional[Dict[str, int]] = {"skip": yielded}
+                while next_url:
+                    try:
+                        result = await self._request("GET", next_url, params=params)
+                    except Exception as e:
+                        if not is_retryable_error(e):
+                            raise
+                        # 临时错误等到下一次轮询再试
+                        logger.warning(f"Failed to poll firecrawl job {self.id}: {e}")
+                        break
+                    self.status = result.get("status")
+                    for page in result.get("data") or []:
+                        yielded += 1
+                        new_pages += 1
+                        yield page
+                    next_url, params = result.get("next"), None
+
+                if self.status == "failed":
+                    raise FirecrawlError(f"Firecrawl job {self.id} failed: {result.get('error')}")
+                if self.finished:
+                    logger.info(f"Firecrawl job {self.id} {self.status} with {yielded} pages")
+                    return
+                if deadline is not None and time.monotonic() > deadline:
+                    raise FirecrawlError(f"Firecrawl job {self.id} timed out after {yielded} pages")
+
+                # 没有新页面时逐步拉长轮询间隔
+                interval = (
+                    self.poll_interval if new_pages else min(interval * 2, self.max_poll_interval)
+                )
+        finally:
+            if not self.finished:
+                await self.cancel()
+
+    async def cancel(self):
+        """Cancel the job if it is still running, errors are logged and ignored"""
+        if self.id is None or self.finished:
+            return
+        try:
+            await self._request("DELETE", f"{self.api_url}/v1/crawl/{self.id}")
+            logger.info(f"Cancelled firecrawl job {self.id}")
+        except Exception as e:
+            logger.warning(f"Failed to cancel firecrawl job {self.id}: {e}")
+        self.status = "cancelled"
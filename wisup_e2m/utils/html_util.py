@@ -0,0 +1,499 @@
+import logging
+import re
+from typing import IO, Callable, Iterator, List, NamedTuple, Optional, Union
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# 这些元素的内容不会出现在 Markdown 中
+_SKIP_TAGS = {
+    "head",
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "iframe",
+    "object",
+    "embed",
+    "canvas",
+    "video",
+    "audio",
+    "select",
+    "button",
+    "input",
+    "textarea",
+}
+_HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+_CONTAINER_TAGS = {
+    "html",
+    "body",
+    "div",
+    "section",
+    "article",
+    "main",
+    "header",
+    "footer",
+    "nav",
+    "aside",
+    "figure",
+    "figcaption",
+    "details",
+    "summary",
+    "address",
+    "form",
+    "fieldset",
+    "center",
+    "li",
+    "dd",
+    "dt",
+    "td",
+    "th",
+    "caption",
+}
+_BLOCK_TAGS = (
+    _CONTAINER_TAGS
+    | set(_HEADING_TAGS)
+    | {
+        "p",
+        "ul",
+        "ol",
+        "dl",
+        "table",
+        "pre",
+        "blockquote",
+        "hr",
+        "svg",
+    }
+)
+_WRAP_TAGS = {
+    "strong": "**",
+    "b": "**",
+    "em": "*",
+    "i": "*",
+    "del": "~~",
+    "s": "~~",
+    "strike": "~~",
+}
+_XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+_BOILERPLATE_TAGS = {"nav", "aside", "form"}
+_BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog"}
+_BOILERPLATE_PATTERN = re.compile(
+    r"(?:^|[-_\s])(?:nav|navbar|menu|sidebar|breadcrumbs?|cookies?|consent|banner|footer|"
+    r"share|sharing|social|ads?|advert\w*|promo|popup|modal|newsletter|subscribe|related|"
+    r"comments?|skip-link)(?:$|[-_\s])",
+    re.IGNORECASE,
+)
+_HIDDEN_STYLE_PATTERN = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def local_tag(element) -> Optional[str]:
+    """Lower case tag name without namespace, None for comments and processing instructions"""
+    tag = element.tag
+    if not isinstance(tag, str):
+        return None
+    if tag[:1] == "{":
+        tag = tag.rsplit("}", 1)[1]
+    return tag.lower()
+
+
+class HtmlMarkdownRenderer:
+    """Render an lxml HTML/XHTML tree to Markdown.
+
+    Works on trees from both ``lxml.html`` and the XML parser (e.g. EPUB XHTML chapters), tags
+    are compared by local name. Images are resolved through ``resolve_image``, which maps the
+    ``src`` of an image to the link to use in the Markdown, or to None to drop the image; it is
+    called even when ``include_image_link_in_text`` is off, so images can still be collected. Links
+    are resolved through ``resolve_link`` the same way, a dropped link keeps its text.
+    """
+
+    def __init__(
+        self,
+        resolve_image: Optional[Callable[[str], Optional[str]]] = None,
+        resolve_link: Optional[Callable[[str], Optional[str]]] = None,
+        include_image_link_in_text: bool = True,
+        skip_element: Optional[Callable[[etree._Element], bool]] = None,
+    ):
+        self.resolve_image = resolve_image or (lambda src: src)
+        self.resolve_link = resolve_link or (lambda href: href)
+        self.include_image_link_in_text = include_image_link_in_text
+        self.skip_element = skip_element
+
+    def render(self, element: etree._Element) -> str:
+        return "\n\n".join(self.iter_blocks(element))
+
+    def iter_blocks(self, element: etree._Element) -> Iterator[str]:
+        """Yield the Markdown of each block under ``element``"""
+        yield from self._blocks(element)
+
+    def render_block(self, element: etree._Element) -> List[str]:
+        """The Markdown blocks of ``element`` itself, empty if the element is skipped"""
+        tag = local_tag(element)
+        if self._skip(element, tag):
+            return []
+        if tag in _BLOCK_TAGS:
+            return [md for md in self._block(element, tag) if md]
+        text = self._inline(element, tag).strip()
+        return [text] if text else []
+
+    def is_skipped(self, element: etree._Element) -> bool:
+        """Whether ``element`` and everything under it is left out of the Markdown"""
+        return bool(self._skip(element, local_tag(element)))
+
+    # blocks
+
+    def _skip(self, element, tag: Optional[str]) -> bool:
+        return (
+            tag is None or tag in _SKIP_TAGS or (self.skip_element and self.skip_element(element))
+        )
+
+    def _blocks(self, element) -> List[str]:
+        blocks = []
+        inline = []
+
+        def _flush():
+            text = "\n".join(line.strip() for line in "".join(inline).split("\n")).strip()
+            if text:
+                blocks.append(text)
+            inline.clear()
+
+        if element.text:
+            inline.append(_WHITESPACE_PATTERN.sub(" ", element.text))
+        for child in element:
+            tag = local_tag(child)
+            if self._skip(child, tag):
+                pass
+            elif tag in _BLOCK_TAGS:
+                _flush()
+                blocks.extend(md for md in self._block(child, tag) if md)
+            else:
+                inline.append(self._inline(child, tag))
+            if child.tail:
+                inline.append(_WHITESPACE_PATTERN.sub(" ", child.tail))
+        _flush()
+
+        return blocks
+
+    def _block(self, element, tag: str) -> List[str]:
+        if tag in _HEADING_TAGS:
+            text = " ".join(self._blocks(element)).replace("\n", " ")
+            return [f"{'#' * _HEADING_TAGS[tag]} {text}"] if text else []
+        if tag == "p":
+            return self._blocks(element)
+        if tag in ("ul", "ol"):
+            return [self._list(element, ordered=tag == "ol")]
+        if tag == "dl":
+            return self._blocks(element)
+        if tag == "table":
+            return [self._table(element)]
+        if tag == "pre":
+            return [self._pre(element)]
+        if tag == "blockquote":
+            text = "\n\n".join(self._blocks(element))
+            return ["\n".join(f"> {line}" if line else ">" for line in text.split("\n"))]
+        if tag == "hr":
+            return ["---"]
+        if tag == "svg":
+            return [self._svg_images(element)]
+        return self._blocks(element)
+
+    def _list(self, element, ordered: bool) -> str:
+        try:
+            number = int(element.get("start", 1))
+        except ValueError:
+            number = 1
+
+        items = []
+        for child in element:
+            tag = local_tag(child)
+            if self._skip(child, tag):
+                continue
+            if tag != "li":
+                # 不规范的 HTML 里 ul 下可能直接是文本或其他元素
+                text = "\n".join(self._block(child, tag) if tag in _BLOCK_TAGS else [])
+                if text:
+                    items.append(text)
+                continue
+            marker = f"{number}. " if ordered else "- "
+            text = "\n".join(self._blocks(child))
+            lines = text.split("\n")
+            items.append(
+                "\n".join(
+                    [marker + lines[0]]
+                    + [(" " * len(marker) + line) if line else line for line in lines[1:]]
+                )
+            )
+            number += 1
+        return "\n".join(items)
+
+    def _table(self, element) -> str:
+        rows = []
+        for row in self._iter_rows(element):
+            cells = []
+            for cell in row:
+                tag = local_tag(cell)
+                if tag not in ("td", "th"):
+                    continue
+                text = " ".join(self._blocks(cell)).replace("\n", " ").replace("|", "\\|")
+                cells.append(text)
+                try:
+                    colspan = int(cell.get("colspan", 1))
+                except ValueError:
+                    colspan = 1
+                cells.extend([""] * (colspan - 1))
+            if cells:
+                rows.append(cells)
+
+        if not rows:
+            return ""
+
+        n_cols = max(len(row) for row in rows)
+        rows = [row + [""] * (n_cols - len(row)) for row in rows]
+        lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * n_cols]
+        lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+
+        caption = [child for child in element if local_tag(child) == "caption"]
+        if caption:
+            caption_text = " ".join(self._blocks(caption[0]))
+            if caption_text:
+                lines.append(f"\n{caption_text}")
+        return "\n".join(lines)
+
+    def _iter_rows(self, element) -> Iterator[etree._Element]:
+        # 只遍历当前表格的行，嵌套表格的行不属于当前表格
+        for child in element:
+            tag = local_tag(child)
+            if tag == "tr":
+                yield child
+            elif tag in ("thead", "tbody", "tfoot"):
+                yield from self._iter_rows(child)
+
+    def _pre(self, element) -> str:
+        code = "".join(element.itertext()).strip("\n")
+        lang = ""
+        code_elements = [child for child in element if local_tag(child) == "code"]
+        for cls in ((code_elements[0] if code_elements else element).get("class") or "").split():
+            if cls.startswith("language-"):
+                lang = cls[len("language-") :]
+                break
+        return f"```{lang}\n{code}\n```"
+
+    def _svg_images(self, element) -> str:
+        images = []
+        for child in element.iter():
+            if local_tag(child) == "image":
+                src = child.get(_XLINK_HREF) or child.get("href")
+                if src:
+                    images.append(self._image(src, ""))
+        return "\n".join(image for image in images if image)
+
+    # inlines
+
+    def _inlines(self, element) -> str:
+        parts = []
+        if element.text:
+            parts.append(_WHITESPACE_PATTERN.sub(" ", element.text))
+        for child in element:
+            tag = local_tag(child)
+            if not self._skip(child, tag):
+                parts.append(self._inline(child, tag))
+            if child.tail:
+                parts.append(_WHITESPACE_PATTERN.sub(" ", child.tail))
+        return "".join(parts)
+
+    def _inline(self, element, tag: str) -> str:
+        if tag == "br":
+            return "\n"
+        if tag == "img":
+            return self._image(element.get("src") or "", element.get("alt") or "")
+        if tag in _BLOCK_TAGS:
+            # 行内元素中出现的块级元素，如 <a><div>...</div></a>
+            return " ".join(self._blocks(element))
+
+        text = self._inlines(element)
+        if tag == "a":
+            href = element.get("href")
+            link = self.resolve_link(href) if href else None
+            if not link or not text.strip():
+                return text
+            return f"[{text.strip()}]({link})"
+        if tag in _WRAP_TAGS:
+            return self._wrap(text, _WRAP_TAGS[tag])
+        if tag == "code":
+            return f"`{text}`" if text.strip() else text
+        if tag == "sup":
+            return f"<sup>{text}</sup>"
+        if tag == "sub":
+            return f"<sub>{text}</sub>"
+        return text
+
+    def _image(self, src: str, alt: str) -> str:
+        if not src:
+            return ""
+        # 即使不在文本中插入图片链接，也要解析图片，以便提取图片
+        link = self.resolve_image(src)
+        if link is None or not self.include_image_link_in_text:
+            return ""
+        return f"![{alt}]({link})"
+
+    @staticmethod
+    def _wrap(text: str, marker: str) -> str:
+        # 标记不能紧贴空白，否则 Markdown 不会识别，如 "** bold**"
+        stripped = text.strip()
+        if not stripped:
+            return text
+        lead = text[: len(text) - len(text.lstrip())]
+        trail = text[len(text.rstrip()) :]
+        return f"{lead}{marker}{stripped}{marker}{trail}"
+
+
+class HtmlSection(NamedTuple):
+    text: str
+    title: Optional[str]
+
+
+# 流式解析时，遇到这些标题或这些元素结束时切分章节
+_SECTION_HEADING_TAGS = {"h1", "h2"}
+_SECTION_TAGS = {"section", "article"}
+
+
+def _detach(element):
+    # lxml 删除元素时会一并删除 tail，这里把 tail 留在父元素中
+    parent = element.getparent()
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + element.tail
+        else:
+            parent.text = (parent.text or "") + element.tail
+    parent.remove(element)
+
+
+def _take_leading_inlines(element) -> Optional[etree._Element]:
+    # 把 element 之前的文本和行内元素移到一个新的 div 中，它们在 element 之前输出
+    parent = element.getparent()
+    if element.getprevious() is None and not (parent.text and parent.text.strip()):
+        return None
+    wrapper = etree.Element("div")
+    wrapper.text, parent.text = parent.text, None
+    for child in list(parent):
+        if child is element:
+            break
+        wrapper.append(child)
+    return wrapper
+
+
+def iter_html_sections(
+    source: Union[str, IO[bytes]],
+    renderer: HtmlMarkdownRenderer,
+    encoding: Optional[str] = None,
+    max_section_chars: int = 100_000,
+) -> Iterator[HtmlSection]:
+    """Incrementally parse an HTML document and yield its Markdown section by section
+
+    Blocks directly under container elements (body, div, section, ...) are rendered when their
+    end tag is parsed and removed from the tree, so memory is bounded by the largest block plus
+    the Markdown of the current section, not by the whole document. A section ends before every
+    h1/h2, when a section/article element closes, or once it grows over ``max_section_chars``.
+
+    :param source: File name or binary file object
+    :param renderer: Renders the blocks, its ``skip_element`` is honored for ancestors too
+    :param encoding: Encoding of the document, detected by libxml2 if None
+    :param max_section_chars: Split sections longer than this at block boundaries
+    """
+    title = None
+    blocks: List[str] = []
+    size = 0
+
+    def _take() -> HtmlSection:
+        nonlocal size
+        section = HtmlSection("\n\n".join(blocks), title)
+        blocks.clear()
+        size = 0
+        return section
+
+    for _, element in etree.iterparse(
+        source,
+        events=("end",),
+        html=True,
+        encoding=encoding,
+        huge_tree=True,
+        remove_comments=True,
+    ):
+        tag = local_tag(element)
+        if tag == "title" and title is None:
+            title = " ".join(element.itertext()).strip() or None
+        if tag not in _BLOCK_TAGS or element.getparent() is None:
+            continue
+
+        # 嵌套在 p、table、ul 等块中的元素随外层块一起输出
+        ancestors = list(element.iterancestors())
+        if any(local_tag(parent) not in _CONTAINER_TAGS for parent in ancestors):
+            continue
+
+        if not any(renderer.is_skipped(parent) for parent in ancestors):
+            # 先输出各级祖先中位于 element 之前、尚未输出的文本，从外到内
+            for node in reversed([element] + ancestors[:-1]):
+                leading = _take_leading_inlines(node)
+                if leading is None:
+                    continue
+                for md in renderer.render_block(leading):
+                    blocks.append(md)
+                    size += len(md)
+            if tag in _SECTION_HEADING_TAGS and blocks:
+                yield _take()
+            for md in renderer.render_block(element):
+                blocks.append(md)
+                size += len(md)
+        _detach(element)
+
+        if blocks and (tag in _SECTION_TAGS or size >= max_section_chars):
+            yield _take()
+
+    if blocks:
+        yield _take()
+
+
+def _in_content_section(element) -> bool:
+    return any(local_tag(parent) in ("article", "main") for parent in element.iterancestors())
+
+
+def is_page_header_or_footer(element) -> bool:
+    """Whether the element is the header or footer of the page, not of an article"""
+    return local_tag(element) in ("header", "footer") and not _in_content_section(element)
+
+
+def is_boilerplate(element) -> bool:
+    """Whether the element looks like navigation, banners, sidebars, ads or hidden content
+
+    Judged by tag, ARIA role, hidden attributes and class/id names, without looking at the text.
+    """
+    tag = local_tag(element)
+    if tag in _BOILERPLATE_TAGS or is_page_header_or_footer(element):
+        return True
+    if element.get("hidden") is not None or element.get("aria-hidden") == "true":
+        return True
+    if (element.get("role") or "").lower() in _BOILERPLATE_ROLES:
+        return True
+    if _HIDDEN_STYLE_PATTERN.search(element.get("style") or ""):
+        return True
+    if tag in ("body", "html", "main", "article"):
+        return False
+    names = f"{element.get('class') or ''} {element.get('id') or ''}"
+    return bool(_BOILERPLATE_PATTERN.search(names))
+
+
+def parse_xhtml(data: bytes) -> etree._Element:
+    """Parse an XHTML document, falling back to the HTML parser for malformed markup"""
+    parser = etree.XMLParser(recover=True, resolve_entities=False, no_network=True, huge_tree=True)
+    try:
+        root = etree.fromstring(data, parser=parser)
+    except etree.XMLSyntaxError:
+        root = None
+    if root is None:
+        import lxml.html
+
+        root = lxml.html.document_fromstring(data)
+    return root
@@ -0,0 +1,492 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional, Tuple
+from uuid import uuid4
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 响应的 extensions 中记录缓存状态: "revalidated" 表示服务器返回 304，内容来自缓存
+CACHE_STATUS_EXTENSION = "e2m_cache"
+
+
+def _dir_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def response_validators(headers: httpx.Headers) -> Dict[str, str]:
+    """The ETag and Last-Modified of a response, the values a cache revalidates with"""
+    validators = {}
+    if headers.get("ETag"):
+        validators["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        validators["last_modified"] = headers["Last-Modified"]
+    return validators
+
+
+class _EntryWriter:
+    """Write a response body to a temp file and commit it to the cache once complete"""
+
+    def __init__(self, cache: "HttpCache", url: str, status_code: int, headers: httpx.Headers):
+        self.cache = cache
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.size = 0
+        self._tmp_path = cache.cache_dir / f".tmp_{uuid4().hex}"
+        self._file = open(self._tmp_path, "wb")
+        self._done = False
+
+    def write(self, chunk: bytes):
+        if self._done:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_entry_size:
+            logger.debug(f"{self.url} is larger than {self.cache.max_entry_size} bytes, not cached")
+            self.discard()
+            return
+        self._file.write(chunk)
+
+    def commit(self):
+        if self._done:
+            return
+        self._done = True
+        self._file.close()
+        self.cache._commit(self.url, self.status_code, self.headers, self._tmp_path, self.size)
+
+    def discard(self):
+        if self._done:
+            return
+        self._done = True
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class HttpCache:
+    """Persistent cache of HTTP responses revalidated with ETag / Last-Modified
+
+    Only GET responses with a validator are stored, as ``<key>.json`` (status and headers) and
+    ``<key>.body`` in ``cache_dir``, where ``key`` is the sha256 of the url. A later request to the
+    same url is sent with ``If-None-Match`` / ``If-Modified-Since``, and a 304 is answered from
+    the cache. Parsed results can be stored next to the response with :meth:`put_parsed`, so a
+    parser can skip parsing a page that has not changed.
+
+    When the cache grows over ``max_size`` bytes, the least recently used urls are removed. Sizes
+    are kept in an in-memory ledger, loaded from ``cache_dir`` on the first write and updated as
+    entries are written, the directory is only scanned again when the ledger is over the limit.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_size: int = 1024 * 1024 * 1024,
+        max_entry_size: int = 100 * 1024 * 1024,
+    ):
+        """
+        :param cache_dir: Cache directory, defaults to the user cache directory of wisup_e2m
+        :param max_size: Max total size of the cache in bytes
+        :param max_entry_size: Responses larger than this are not cached
+        """
+        if cache_dir is None:
+            from platformdirs import user_cache_dir
+
+            cache_dir = os.path.join(user_cache_dir("wisup_e2m"), "http")
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self._lock = threading.Lock()
+        # 按最近使用排序的 {key: {文件名: 大小}}，第一次写入时从 cache_dir 加载
+        self._ledger: Optional["OrderedDict[str, Dict[str, int]]"] = None
+        self._total_size = 0
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    # responses
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """The cached response of ``url``, None on a miss"""
+        key = self.key(url)
+        meta_path = self.cache_dir / f"{key}.json"
+        body_path = self.cache_dir / f"{key}.body"
+        try:
+            meta = json.loads(meta_path.read_text("utf-8"))
+            if meta["url"] != url or body_path.stat().st_size != meta["size"]:
+                return None
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        meta["body_path"] = str(body_path)
+        return meta
+
+    @staticmethod
+    def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+        headers = {}
+        validators = entry.get("validators", {})
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def writer(self, url: str, response: httpx.Response) -> Optional[_EntryWriter]:
+        """A writer for the body of ``response``, None if the response is not cacheable"""
+        if response.status_code != 200 or not response_validators(response.headers):
+            return None
+        if "no-store" in response.headers.get("Cache-Control", "").lower():
+            return None
+        content_length = response.headers.get("Content-Length", "")
+        if content_length.isdigit() and int(content_length) > self.max_entry_size:
+            return None
+        return _EntryWriter(self, url, response.status_code, response.headers)
+
+    def refresh(self, entry: Dict[str, Any], not_modified: httpx.Response) -> Dict[str, Any]:
+        """Update a cached response with the headers of a 304, and mark it as recently used"""
+        headers = httpx.Headers(entry["headers"])
+        for name in ("ETag", "Last-Modified", "Cache-Control", "Expires", "Date"):
+            if name in not_modified.headers:
+                headers[name] = not_modified.headers[name]
+
+        entry = dict(entry)
+        entry["headers"] = headers.multi_items()
+        entry["validators"] = response_validators(headers)
+        meta = {k: v for k, v in entry.items() if k != "body_path"}
+        key = self.key(entry["url"])
+        meta_size = self._write_json(self.cache_dir / f"{key}.json", meta)
+        os.utime(entry["body_path"])
+        self._record(key, {f"{key}.json": meta_size})
+        return entry
+
+    def _commit(
+        self, url: str, status_code: int, headers: httpx.Headers, tmp_path: Path, size: int
+    ):
+        key = self.key(url)
+        meta = {
+            "url": url,
+            "status_code": status_code,
+            "headers": headers.multi_items(),
+            "validators": response_validators(headers),
+            "size": size,
+            "stored_at": time.time(),
+        }
+        # 先替换 body 再写 meta，meta 中的 size 与 body 不一致时视为未命中
+        os.replace(tmp_path, self.cache_dir / f"{key}.body")
+        meta_size = self._write_json(self.cache_dir / f"{key}.json", meta)
+        self._record(key, {f"{key}.body": size, f"{key}.json": meta_size})
+
+    # parsed data
+
+    def parsed_key(self, url: str, **options) -> str:
+        """Key of a parsed result of ``url``, different parse options get different keys"""
+        options_digest = hashlib.sha256(
+            json.dumps(options, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+        return f"{self.key(url)}.{options_digest}"
+
+    def parsed_validators(self, parsed_key: str) -> Dict[str, str]:
+        """The validators a parsed result was stored with, empty if there is none"""
+        try:
+            stored = json.loads((self.cache_dir / f"{parsed_key}.parsed.json").read_text("utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+        return stored.get("validators") or {}
+
+    def get_parsed(
+        self, parsed_key: str, validators: Dict[str, str]
+    ) -> Optional[Tuple[Dict[str, Any], Dict[Path, Path]]]:
+        """The parsed result stored with :meth:`put_parsed`, if the page still has the same
+        validators
+
+        :return: ``(parsed data dict, {image file path: cached copy})``, None on a miss
+        """
+        if not validators:
+            return None
+        try:
+            stored = json.loads((self.cache_dir / f"{parsed_key}.parsed.json").read_text("utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if stored.get("validators") != validators:
+            return None
+
+        images_dir = self.cache_dir / f"{parsed_key}.images"
+        images = {Path(path): images_dir / name for path, name in stored.get("images", {}).items()}
+        if not all(cached.exists() for cached in images.values()):
+            return None
+        os.utime(self.cache_dir / f"{parsed_key}.parsed.json")
+        self._touch(parsed_key.split(".")[0])
+        return stored["parsed_data"], images
+
+    def put_parsed(
+        self,
+        parsed_key: str,
+        validators: Dict[str, str],
+        parsed_data: Dict[str, Any],
+        image_paths: Iterable[Path],
+    ):
+        """Store a parsed result together with copies of its image files
+
+        :param validators: Validators of the page the result was parsed from
+        :param image_paths: Image files referenced by the result, restored by the caller on a hit
+        """
+        if not validators:
+            return
+
+        images_dir = self.cache_dir / f"{parsed_key}.images"
+        stored_images = {}
+        images_size = 0
+        for idx, path in enumerate(image_paths):
+            if not path.is_file():
+                continue
+            images_dir.mkdir(exist_ok=True)
+            name = f"{idx}{path.suffix}"
+            shutil.copyfile(path, images_dir / name)
+            stored_images[str(path)] = name
+            images_size += path.stat().st_size
+
+        parsed_size = self._write_json(
+            self.cache_dir / f"{parsed_key}.parsed.json",
+            {"validators": validators, "parsed_data": parsed_data, "images": stored_images},
+        )
+        sizes = {f"{parsed_key}.parsed.json": parsed_size}
+        if stored_images:
+            sizes[images_dir.name] = images_size
+        self._record(parsed_key.split(".")[0], sizes)
+
+    # housekeeping
+
+    def _write_json(self, path: Path, data: Dict[str, Any]) -> int:
+        content = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        tmp_path = self.cache_dir / f".tmp_{uuid4().hex}"
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+        return len(content)
+
+    def _scan(self):
+        # 同一个 url 的响应、解析结果和图片作为一个整体，按修改时间排出使用顺序
+        groups: Dict[str, list] = {}
+        for path in self.cache_dir.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                mtime = path.stat().st_mtime
+                size = _dir_size(path)
+            except FileNotFoundError:
+                continue
+            group = groups.setdefault(path.name.split(".")[0], [0.0, {}])
+            group[0] = max(group[0], mtime)
+            group[1][path.name] = size
+
+        self._ledger = OrderedDict(
+            (key, files) for key, (_, files) in sorted(groups.items(), key=lambda item: item[1][0])
+        )
+        self._total_size = sum(sum(files.values()) for files in self._ledger.values())
+
+    def _touch(self, key: str):
+        with self._lock:
+            if self._ledger is not None and key in self._ledger:
+                self._ledger.move_to_end(key)
+
+    def _record(self, key: str, sizes: Dict[str, int]):
+        """Update the ledger with files just written for ``key``, evict if over ``max_size``"""
+        with self._lock:
+            if self._ledger is None:
+                self._scan()
+            else:
+                files = self._ledger.setdefault(key, {})
+                for name, size in sizes.items():
+                    self._total_size += size - files.get(name, 0)
+                    files[name] = size
+            if key in self._ledger:
+                self._ledger.move_to_end(key)
+
+            if self._total_size > self.max_size:
+                # 其他进程可能也在写同一个目录，淘汰前重新扫描
+                self._scan()
+                self._evict(keep=key)
+
+    def _evict(self, keep: str):
+        for key, files in list(self._ledger.items()):
+            if self._total_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            logger.info(f"Evicting {key} from http cache")
+            for name in files:
+                path = self.cache_dir / name
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+            del self._ledger[key]
+            self._total_size -= sum(files.values())
+
+
+def _cached_response(entry: Dict[str, Any], request: httpx.Request, stream) -> httpx.Response:
+    return httpx.Response(
+        status_code=entry["status_code"],
+        headers=entry["headers"],
+        stream=stream,
+        request=request,
+        extensions={CACHE_STATUS_EXTENSION: "revalidated", "http_version": b"HTTP/1.1"},
+    )
+
+
+class _FileStream(httpx.SyncByteStream):
+    def __init__(self, path: str, chunk_size: int = 64 * 1024):
+        self._path = path
+        self._chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        with open(self._path, "rb") as f:
+            while chunk := f.read(self._chunk_size):
+                yield chunk
+
+
+class _AsyncFileStream(httpx.AsyncByteStream):
+    def __init__(self, path: str, chunk_size: int = 64 * 1024):
+        self._path = path
+        self._chunk_size = chunk_size
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with open(self._path, "rb") as f:
+            while chunk := f.read(self._chunk_size):
+                yield chunk
+
+
+class _TeeStream(httpx.SyncByteStream):
+    # 边读边写入缓存，响应体完整读完才提交
+    def __init__(self, stream: httpx.SyncByteStream, writer: _EntryWriter):
+        self._stream = stream
+        self._writer = writer
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self._writer.write(chunk)
+            yield chunk
+        self._writer.commit()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._writer.discard()
+
+
+class _AsyncTeeStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, writer: _EntryWriter):
+        self._stream = stream
+        self._writer = writer
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            self._writer.write(chunk)
+            yield chunk
+        self._writer.commit()
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._writer.discard()
+
+
+class CachingTransport(httpx.BaseTransport):
+    """Wrap a transport with an :class:`HttpCache`
+
+    GET requests to cached urls are sent with validators. A 304 is answered from the cache with
+    ``response.extensions["e2m_cache"] == "revalidated"``, and cacheable 200 responses are written
+    to the cache while they are read.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, cache: HttpCache):
+        self._transport = transport
+        self.cache = cache
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return self._transport.handle_request(request)
+
+        url = str(request.url)
+        entry = self.cache.lookup(url)
+        if entry is not None:
+            for name, value in self.cache.conditional_headers(entry).items():
+                request.headers.setdefault(name, value)
+
+        response = self._transport.handle_request(request)
+        if entry is not None and response.status_code == 304:
+            response.close()
+            entry = self.cache.refresh(entry, response)
+            return _cached_response(entry, request, _FileStream(entry["body_path"]))
+
+        writer = self.cache.writer(url, response)
+        if writer is None:
+            return response
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_TeeStream(response.stream, writer),
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncCachingTransport(httpx.AsyncBaseTransport):
+    """Async version of :class:`CachingTransport`"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: HttpCache):
+        self._transport = transport
+        self.cache = cache
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return await self._transport.handle_async_request(request)
+
+        url = str(request.url)
+        entry = self.cache.lookup(url)
+        if entry is not None:
+            for name, value in self.cache.conditional_headers(entry).items():
+                request.headers.setdefault(name, value)
+
+        response = await self._transport.handle_async_request(request)
+        if entry is not None and response.status_code == 304:
+            await response.aclose()
+            entry = self.cache.refresh(entry, response)
+            return _cached_response(entry, request, _AsyncFileStream(entry["body_path"]))
+
+        writer = self.cache.writer(url, response)
+        if writer is None:
+            return response
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncTeeStream(response.stream, writer),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_http_cache(
+    cache_dir: Optional[str] = None,
+    max_size: int = 1024 * 1024 * 1024,
+    max_entry_size: int = 100 * 1024 * 1024,
+) -> HttpCache:
+    """Get the http cache shared by all parsers for the given settings"""
+    return HttpCache(cache_dir=cache_dir, max_size=max_size, max_entry_size=max_entry_size)
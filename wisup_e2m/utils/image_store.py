@@ -0,0 +1,72 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+from uuid import uuid4
+
+from wisup_e2m.utils.file_util import file_sha256
+
+
+class StoredImage(NamedTuple):
+    path: Path
+    digest: str
+
+
+class ImageStore:
+    """Content-addressed image store
+
+    Images are named ``<sha256>.<ext>`` after their content, so an image is written once no
+    matter how many slides or documents embed it. Files are written to a temp name and moved
+    into place atomically, so concurrent jobs can share one ``image_dir``.
+    """
+
+    def __init__(self, image_dir: Union[str, Path]):
+        self.image_dir = Path(image_dir).resolve()
+        self.image_dir.mkdir(parents=True, exist_ok=True)
+
+    def put(self, data: bytes, ext: str) -> StoredImage:
+        """Store the image content, skipped if an image with the same content exists
+
+        :param data: The image content
+        :param ext: The file extension, e.g. "png"
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        target_path = self._target_path(digest, ext)
+        if not target_path.exists():
+            tmp_path = self.image_dir / f".{digest}.{uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, target_path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        return StoredImage(target_path, digest)
+
+    def put_file(self, file_path: Union[str, Path], ext: Optional[str] = None) -> StoredImage:
+        """Move an image file into the store, the file is removed if the store already has it
+
+        :param file_path: The image file, e.g. an image extracted to a scratch directory
+        :param ext: The file extension, defaults to the extension of ``file_path``
+        """
+        file_path = Path(file_path)
+        digest = file_sha256(file_path)
+        target_path = self._target_path(digest, ext or file_path.suffix)
+        if file_path.resolve() == target_path:
+            # 已经在图片库中
+            return StoredImage(target_path, digest)
+        if target_path.exists():
+            file_path.unlink()
+        else:
+            # 先移动到同目录下的临时文件，再原子地改名，避免其他任务读到写了一半的文件
+            tmp_path = self.image_dir / f".{digest}.{uuid4().hex}.tmp"
+            try:
+                shutil.move(str(file_path), str(tmp_path))
+                os.replace(tmp_path, target_path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        return StoredImage(target_path, digest)
+
+    def _target_path(self, digest: str, ext: str) -> Path:
+        ext = ext.lstrip(".").lower()
+        return self.image_dir / (f"{digest}.{ext}" if ext else digest)
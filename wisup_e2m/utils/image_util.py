@@ -1,4 +1,8 @@
 import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 from mimetypes import guess_type
 import io
 from typing import IO, Tuple, Union
@@ -155,17 +159,50 @@ def image_to_base64(image_input: str) -> str:
         return base64_data.decode("utf-8")
 
 
-def has_transparent_background(image_input: Union[str, IO[bytes]]) -> bool:
+def has_transparent_background(image_input: Union[str, os.PathLike, IO[bytes]]) -> bool:
     """
     判断给定的图片是否具有透明背景。
 
+    只读取图片头部即可排除没有 alpha 通道的图片，只有存在 alpha 通道时才解码图片。
+    结果按图片内容的哈希缓存，同一张图片（如每页都有的 logo）只检查一次。
+
     :param image_input: 图片的文件路径或字节流
     :return: 如果图片具有透明背景，返回 True；否则返回 False
     """
-    with Image.open(image_input) as img:
-        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
-            # check alpha channel
-            alpha = img.split()[-1]
-            if alpha.getextrema()[0] < 255:
-                return True
+    if isinstance(image_input, (str, os.PathLike)):
+        with open(image_input, "rb") as f:
+            data = f.read()
+    else:
+        position = image_input.tell()
+        data = image_input.read()
+        image_input.seek(position)
+
+    digest = hashlib.sha256(data).hexdigest()
+    with _transparency_cache_lock:
+        if digest in _transparency_cache:
+            _transparency_cache.move_to_end(digest)
+            return _transparency_cache[digest]
+
+    result = _check_transparent_background(data)
+
+    with _transparency_cache_lock:
+        _transparency_cache[digest] = result
+        if len(_transparency_cache) > _TRANSPARENCY_CACHE_SIZE:
+            _transparency_cache.popitem(last=False)
+    return result
+
+
+_TRANSPARENCY_CACHE_SIZE = 4096
+_transparency_cache: "OrderedDict[str, bool]" = OrderedDict()
+_transparency_cache_lock = threading.Lock()
+
+
+def _check_transparent_background(data: bytes) -> bool:
+    # Image.open 只解析头部，mode 不带 alpha 的图片不需要解码
+    with Image.open(io.BytesIO(data)) as img:
+        if img.mode in ("RGBA", "LA"):
+            # getchannel 只取出 alpha 通道，getextrema 在 C 里扫描整张 alpha 平面
+            return img.getchannel("A").getextrema()[0] < 255
+        if img.mode == "P" and "transparency" in img.info:
+            return img.convert("RGBA").getchannel("A").getextrema()[0] < 255
     return False
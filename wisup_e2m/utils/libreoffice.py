@@ -1,14 +1,44 @@
+import atexit
 import logging
 import os
+import queue
+import shutil
+import socket
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from wisup_e2m.utils.file_util import file_sha256
+from wisup_e2m.utils.scratch import scratch_job
 
 logger = logging.getLogger(__name__)
 
+# LibreOffice filter names used by storeToURL, keyed by output format
+# pdf export filters depend on the document type, so they are keyed by input extension
+_LIBO_EXPORT_FILTERS = {
+    "docx": "MS Word 2007 XML",
+    "pptx": "Impress MS PowerPoint 2007 XML",
+    "xlsx": "Calc MS Excel 2007 XML",
+}
+_LIBO_PDF_EXPORT_FILTERS = {
+    ".doc": "writer_pdf_Export",
+    ".docx": "writer_pdf_Export",
+    ".ppt": "impress_pdf_Export",
+    ".pptx": "impress_pdf_Export",
+    ".xls": "calc_pdf_Export",
+    ".xlsx": "calc_pdf_Export",
+}
+
 
+@lru_cache(maxsize=1)
 def check_libo_installed():
-    """Check if LibreOffice is installed on the system."""
+    """Check if LibreOffice is installed on the system. The result is cached."""
     try:
         subprocess.run(
             ["soffice", "--version"],
@@ -38,6 +68,7 @@ def convert_by_libreoffice(
     output_format: str,
     output_path: str = None,
     rm_original: bool = False,
+    pool: Optional["LibreOfficePool"] = None,
 ):
     """Convert a file to a specified format using LibreOffice.
 
@@ -46,6 +77,8 @@ def convert_by_libreoffice(
         output_format: The desired output format (e.g., "docx", "pptx", "pdf").
         output_path: The path to the output file. If None, the output will be in the same directory as the input file.
         rm_original: Whether to remove the original input file after conversion.
+        pool: A pool of running LibreOffice listeners to convert with. If None, a new soffice
+            process is started for the conversion.
 
     Raises:
         subprocess.CalledProcessError: If the conversion command fails.
@@ -53,10 +86,22 @@ def convert_by_libreoffice(
 
     """
 
+    if pool is not None:
+        if output_path is None:
+            output_path = os.path.join(
+                os.path.dirname(input_path),
+                os.path.splitext(os.path.basename(input_path))[0] + f".{output_format}",
+            )
+        pool.convert(input_path, output_format, output_path)
+        if rm_original:
+            os.remove(input_path)
+        return
+
     if not check_libo_installed():
         installation_command = suggest_libo_installation()
         logger.error(
-            f"LibreOffice is not installed. Please install it using the following command: {installation_command}"
+            "LibreOffice is not installed. Please install it using the following command: "
+            f"{installation_command}"
         )
         raise FileNotFoundError("LibreOffice is not installed.")
 
@@ -98,3 +143,367 @@ def convert_by_libreoffice(
         os.remove(input_path)
 
     logger.info(f"Conversion completed: {output_path}")
+
+
+class _LibreOfficeListener:
+    """A headless soffice process accepting UNO connections, with its own user profile"""
+
+    def __init__(self, start_timeout: float = 60):
+        self.start_timeout = start_timeout
+        self.process = None
+        self.profile_dir = None
+        self.port = None
+        self.desktop = None
+        self.conversions = 0
+
+    def start(self):
+        import uno
+
+        self.profile_dir = tempfile.mkdtemp(prefix="e2m_libo_profile_")
+        self.port = _get_free_port()
+        self.conversions = 0
+
+        command = [
+            "soffice",
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--norestore",
+            "--nodefault",
+            "--nolockcheck",
+            f"-env:UserInstallation={Path(self.profile_dir).as_uri()}",
+            f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext",
+        ]
+        logger.info(f"Starting LibreOffice listener on port {self.port}")
+        self.process = subprocess.Popen(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+                )
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("Failed to start LibreOffice listener") from None
+                time.sleep(0.2)
+
+        self.desktop = context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop", context
+        )
+
+    def is_healthy(self) -> bool:
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, input_path: str, output_format: str, output_path: str):
+        import uno
+        from com.sun.star.beans import PropertyValue  # type: ignore
+
+        def _property(name, value):
+            prop = PropertyValue()
+            prop.Name = name
+            prop.Value = value
+            return prop
+
+        if output_format == "pdf":
+            filter_name = _LIBO_PDF_EXPORT_FILTERS.get(Path(input_path).suffix.lower())
+        else:
+            filter_name = _LIBO_EXPORT_FILTERS.get(output_format)
+        if filter_name is None:
+            raise ValueError(f"Unsupported output format for {input_path}: {output_format}")
+
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(input_path)),
+            "_blank",
+            0,
+            (_property("Hidden", True), _property("ReadOnly", True)),
+        )
+        if document is None:
+            raise RuntimeError(f"LibreOffice failed to load {input_path}")
+
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(output_path)),
+                (_property("FilterName", filter_name), _property("Overwrite", True)),
+            )
+        finally:
+            document.close(True)
+
+        self.conversions += 1
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        self.desktop = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+class LibreOfficePool:
+    """A pool of long-running headless LibreOffice listeners driven over UNO
+
+    Each listener runs with an isolated user profile, so concurrent conversions don't collide,
+    is health checked before every conversion and is restarted after ``max_conversions``
+    conversions to keep memory from growing. Listeners are started on first use.
+
+    Requires the LibreOffice python bindings (``uno``), e.g. `sudo apt-get install python3-uno`.
+    """
+
+    def __init__(self, size: int = 2, max_conversions: int = 100, start_timeout: float = 60):
+        """
+        :param size: Number of soffice listeners
+        :param max_conversions: Restart a listener after this many conversions
+        :param start_timeout: Seconds to wait for a listener to accept connections
+        """
+        if size < 1:
+            raise ValueError("LibreOfficePool size must be at least 1")
+
+        try:
+            import uno  # noqa
+        except ImportError:
+            raise ImportError(
+                "LibreOffice python bindings (uno) not installed. Please install them, "
+                "e.g. `sudo apt-get install python3-uno`"
+            ) from None
+
+        if not check_libo_installed():
+            installation_command = suggest_libo_installation()
+            logger.error(
+                "LibreOffice is not installed. Please install it using the following command: "
+                f"{installation_command}"
+            )
+            raise FileNotFoundError("LibreOffice is not installed.")
+
+        self.max_conversions = max_conversions
+        self._listeners = [_LibreOfficeListener(start_timeout) for _ in range(size)]
+        self._idle = queue.Queue()
+        for listener in self._listeners:
+            self._idle.put(listener)
+        self._closed = False
+
+    def convert(self, input_path: str, output_format: str, output_path: str):
+        """Convert ``input_path`` to ``output_format`` and write it to ``output_path``"""
+        if self._closed:
+            raise RuntimeError("LibreOfficePool is closed")
+
+        logger.info(f"Converting [{input_path}] to [{output_path}] with format [{output_format}]")
+
+        listener = self._idle.get()
+        try:
+            if not listener.is_healthy():
+                listener.stop()
+                listener.start()
+
+            try:
+                listener.convert(input_path, output_format, output_path)
+            except Exception:
+                # the listener may be broken, start a fresh one on next use
+                listener.stop()
+                raise
+
+            if listener.conversions >= self.max_conversions:
+                logger.info(
+                    f"Recycling LibreOffice listener after {listener.conversions} conversions"
+                )
+                listener.stop()
+        finally:
+            self._idle.put(listener)
+
+        logger.info(f"Conversion completed: {output_path}")
+
+    def close(self):
+        self._closed = True
+        for listener in self._listeners:
+            listener.stop()
+
+
+_libreoffice_pools = {}
+_libreoffice_pools_lock = threading.Lock()
+
+
+def get_libreoffice_pool(size: int, max_conversions: int = 100) -> Optional[LibreOfficePool]:
+    """Get the LibreOffice pool shared by all parsers for the given settings
+
+    :param size: Number of listeners, 0 disables the pool and None is returned
+    :param max_conversions: Restart a listener after this many conversions
+    """
+    if not size:
+        return None
+
+    with _libreoffice_pools_lock:
+        key = (size, max_conversions)
+        if key not in _libreoffice_pools:
+            _libreoffice_pools[key] = LibreOfficePool(size=size, max_conversions=max_conversions)
+        return _libreoffice_pools[key]
+
+
+@atexit.register
+def _close_libreoffice_pools():
+    for pool in _libreoffice_pools.values():
+        pool.close()
+
+
+class ConversionCache:
+    """Cache of LibreOffice conversions keyed by the sha256 of the input file
+
+    Converted files are stored as ``<sha256>.<output_format>`` in ``cache_dir``. When the cache
+    grows over ``max_size`` bytes, the least recently used files are removed.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size: int = 1024 * 1024 * 1024):
+        """
+        :param cache_dir: Cache directory, defaults to the user cache directory of wisup_e2m
+        :param max_size: Max total size of the cached files in bytes
+        """
+        if cache_dir is None:
+            from platformdirs import user_cache_dir
+
+            cache_dir = os.path.join(user_cache_dir("wisup_e2m"), "conversions")
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    def get_or_convert(
+        self, input_path: str, output_format: str, convert: Callable[[str, str], None]
+    ) -> str:
+        """Get the cached conversion of ``input_path``, converting it on a miss
+
+        :param input_path: The path to the input file
+        :param output_format: The output format, e.g. "docx"
+        :param convert: ``convert(input_path, output_path)`` writes the converted file
+        :return: The path to the converted file in the cache, which must not be modified
+        """
+        cached_path = self.cache_dir / f"{file_sha256(input_path)}.{output_format}"
+
+        if cached_path.exists():
+            logger.info(f"Conversion cache hit for {input_path}: {cached_path}")
+            # 更新修改时间，用于 LRU 淘汰
+            os.utime(cached_path)
+            return str(cached_path)
+
+        # 先转换到独立的临时目录，再原子地移动到缓存中，避免并发转换相互覆盖
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=self.cache_dir)
+        try:
+            tmp_path = os.path.join(tmp_dir, cached_path.name)
+            convert(input_path, tmp_path)
+            os.replace(tmp_path, cached_path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self._evict(keep=cached_path)
+        return str(cached_path)
+
+    def _evict(self, keep: Path):
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.iterdir():
+                if path.name.startswith(".") or not path.is_file():
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                if path == keep:
+                    continue
+                logger.info(f"Evicting {path} from conversion cache")
+                path.unlink(missing_ok=True)
+                total_size -= size
+
+
+@contextmanager
+def converted_file(
+    input_path: str,
+    output_format: str,
+    convert: Callable[[str, str], None],
+    cache: Optional[ConversionCache] = None,
+) -> Iterator[str]:
+    """Convert ``input_path`` and yield the path to the converted file
+
+    The converted file comes from ``cache`` when given, otherwise it is written to a scratch
+    job which is removed on exit.
+
+    :param convert: ``convert(input_path, output_path)`` writes the converted file
+    """
+    if cache is not None:
+        yield cache.get_or_convert(input_path, output_format, convert)
+        return
+
+    with scratch_job("libreoffice") as job:
+        output_path = job.new_path(suffix=f".{output_format}")
+        convert(input_path, str(output_path))
+        job.check_quota()
+        yield str(output_path)
+
+
+@lru_cache(maxsize=None)
+def get_conversion_cache(
+    cache_dir: Optional[str] = None, max_size: int = 1024 * 1024 * 1024
+) -> ConversionCache:
+    """Get the conversion cache shared by all parsers for the given settings"""
+    return ConversionCache(cache_dir=cache_dir, max_size=max_size)
+
+
+class LibreOfficeConversionMixin:
+    """Pool and conversion cache of a parser that converts legacy files with LibreOffice
+
+    Reads the settings of :class:`LibreOfficeParserConfig` from ``self.config``.
+    """
+
+    def _get_libreoffice_pool(self) -> Optional[LibreOfficePool]:
+        """
+        The LibreOffice pool configured by `libreoffice_pool_size`, None if not configured
+        """
+        return get_libreoffice_pool(
+            getattr(self.config, "libreoffice_pool_size", 0),
+            getattr(self.config, "libreoffice_max_conversions", 100),
+        )
+
+    def _get_conversion_cache(self) -> Optional[ConversionCache]:
+        """
+        The conversion cache configured by `conversion_cache_*`, None if disabled
+        """
+        if not getattr(self.config, "conversion_cache", True):
+            return None
+        return get_conversion_cache(
+            getattr(self.config, "conversion_cache_dir", None),
+            getattr(self.config, "conversion_cache_max_size", 1024) * 1024 * 1024,
+        )
+
+
+def _get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
@@ -0,0 +1,311 @@
+import base64
+import logging
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import httpx
+
+from wisup_e2m.utils.web_util import api_error_handler
+
+logger = logging.getLogger(__name__)
+
+# pandoc JSON AST 节点示例:
+# {"t": "Para", "c": [{"t": "Str", "c": "Hello"}, {"t": "Space"}, {"t": "Str", "c": "World"}]}
+# 参考 https://hackage.haskell.org/package/pandoc-types/docs/Text-Pandoc-Definition.html
+
+
+def convert_file_by_pandoc(
+    file_name: str,
+    to_format: str,
+    input_format: str = "docx",
+    extract_media_dir: Optional[str] = None,
+    server_url: Optional[str] = None,
+    client: Optional[httpx.Client] = None,
+) -> str:
+    """Convert a file with pandoc.
+
+    The conversion goes to a running pandoc-server if ``server_url`` is given, which
+    avoids starting a new pandoc process per document; otherwise the pandoc CLI is
+    run through pypandoc.
+
+    :param file_name: Path to the input file
+    :param to_format: pandoc output format, e.g. "markdown_phpextra" or "json"
+    :param input_format: pandoc input format, defaults to "docx"
+    :param extract_media_dir: Extract images to ``extract_media_dir/media`` (``--extract-media``)
+    :param server_url: URL of a pandoc-server, e.g. http://localhost:3030
+    :param client: httpx client used to talk to the pandoc-server
+    :return: The converted text
+    """
+    if server_url:
+        output = convert_file_by_pandoc_server(
+            file_name, to_format, server_url, input_format=input_format, client=client
+        )
+        if extract_media_dir:
+            # pandoc-server 不会把图片写到磁盘，这里直接从 docx 包里取出
+            extract_docx_media(file_name, Path(extract_media_dir) / "media")
+        return output
+
+    import pypandoc
+
+    return pypandoc.convert_file(
+        file_name,
+        to_format,
+        format=input_format,
+        extra_args=["--extract-media=" + str(extract_media_dir)] if extract_media_dir else [],
+        verify_format=True,
+    )
+
+
+@api_error_handler
+def convert_file_by_pandoc_server(
+    file_name: str,
+    to_format: str,
+    server_url: str,
+    input_format: str = "docx",
+    client: Optional[httpx.Client] = None,
+) -> str:
+    """Convert a file with a running pandoc-server.
+
+    See https://pandoc.org/pandoc-server.html, binary input is sent base64 encoded.
+    """
+    if client is None:
+        client = httpx.Client()
+
+    with open(file_name, "rb") as f:
+        text = base64.b64encode(f.read()).decode("utf-8")
+
+    response = client.post(
+        server_url,
+        json={"text": text, "from": input_format, "to": to_format},
+        headers={"Accept": "application/json"},
+    )
+    response.raise_for_status()
+
+    result = response.json()
+    if "error" in result:
+        raise RuntimeError(f"pandoc-server failed to convert {file_name}: {result['error']}")
+
+    for message in result.get("messages", []):
+        logger.debug(f"pandoc-server: {message}")
+
+    output = result["output"]
+    if result.get("base64"):
+        output = base64.b64decode(output).decode("utf-8")
+    return output
+
+
+def extract_docx_media(file_name: str, target_dir: Union[str, Path]) -> List[Path]:
+    """Stream the images under ``word/media`` of a docx into ``target_dir``.
+
+    :return: Paths of the extracted images
+    """
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    extracted = []
+    with zipfile.ZipFile(file_name) as zip_ref:
+        for member in zip_ref.infolist():
+            if member.is_dir() or not member.filename.startswith("word/media/"):
+                continue
+            target_path = target_dir / Path(member.filename).name
+            with zip_ref.open(member) as src, open(target_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            extracted.append(target_path)
+
+    return extracted
+
+
+class PandocMarkdownRenderer:
+    """Render a pandoc JSON AST to Markdown.
+
+    Blocks are rendered one at a time by :meth:`iter_blocks`, so the output can be
+    written out as the AST is walked. Images are resolved through ``resolve_image``,
+    which maps the image url in the AST to the link to use in the Markdown, or to
+    None to drop the image.
+    """
+
+    def __init__(
+        self,
+        resolve_image: Optional[Callable[[str], Optional[str]]] = None,
+        include_image_link_in_text: bool = True,
+    ):
+        self.resolve_image = resolve_image or (lambda src: src)
+        self.include_image_link_in_text = include_image_link_in_text
+        self._notes: List[str] = []
+
+    def render(self, ast: Dict[str, Any]) -> str:
+        return "\n\n".join(self.iter_blocks(ast["blocks"]))
+
+    def iter_blocks(self, blocks: List[Dict[str, Any]]) -> Iterator[str]:
+        """Yield the Markdown of each top level block, followed by the footnotes."""
+        self._notes = []
+        for block in blocks:
+            md = self._block(block)
+            if md:
+                yield md
+        for idx, note in enumerate(self._notes, start=1):
+            yield self._indent(note, f"[^{idx}]: ", "    ")
+
+    # blocks
+
+    def _blocks(self, blocks: List[Dict[str, Any]], sep: str = "\n\n") -> str:
+        return sep.join(md for md in (self._block(b) for b in blocks) if md)
+
+    def _block(self, block: Dict[str, Any]) -> str:
+        t, c = block["t"], block.get("c")
+
+        if t in ("Plain", "Para"):
+            return self._inlines(c).strip()
+        if t == "Header":
+            level, _, inlines = c
+            return "#" * level + " " + self._inlines(inlines).strip()
+        if t == "LineBlock":
+            return "\n".join(self._inlines(line) for line in c)
+        if t == "CodeBlock":
+            (_, classes, _), code = c
+            lang = classes[0] if classes else ""
+            return f"```{lang}\n{code}\n```"
+        if t == "RawBlock":
+            fmt, text = c
+            return text if fmt in ("html", "markdown") else ""
+        if t == "BlockQuote":
+            return "\n".join(f"> {line}" if line else ">" for line in self._blocks(c).split("\n"))
+        if t == "BulletList":
+            return "\n".join(self._indent(self._blocks(item, "\n"), "- ", "  ") for item in c)
+        if t == "OrderedList":
+            (start, _, _), items = c
+            return "\n".join(
+                self._indent(self._blocks(item, "\n"), f"{idx}. ", "   ")
+                for idx, item in enumerate(items, start=start)
+            )
+        if t == "DefinitionList":
+            return "\n\n".join(
+                self._inlines(term) + "\n" + "\n".join(self._blocks(d) for d in definitions)
+                for term, definitions in c
+            )
+        if t == "HorizontalRule":
+            return "---"
+        if t == "Table":
+            return self._table(c)
+        if t == "Figure":
+            _, (_, caption), content = c
+            return "\n\n".join(md for md in (self._blocks(content), self._blocks(caption)) if md)
+        if t == "Div":
+            return self._blocks(c[1])
+
+        logger.debug(f"Skipping unsupported pandoc block: {t}")
+        return ""
+
+    def _table(self, c) -> str:
+        _, (_, caption), colspecs, (_, head_rows), bodies, (_, foot_rows) = c
+
+        rows = [self._row(row) for row in head_rows]
+        for _, _, body_head_rows, body_rows in bodies:
+            rows.extend(self._row(row) for row in body_head_rows)
+            rows.extend(self._row(row) for row in body_rows)
+        rows.extend(self._row(row) for row in foot_rows)
+
+        if not rows:
+            return ""
+
+        n_cols = max(len(colspecs), *(len(row) for row in rows))
+        rows = [row + [""] * (n_cols - len(row)) for row in rows]
+
+        lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * n_cols]
+        lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+
+        caption_md = self._blocks(caption)
+        return "\n".join(lines) + (f"\n\n{caption_md}" if caption_md else "")
+
+    def _row(self, row) -> List[str]:
+        _, cells = row
+        texts = []
+        for _, _, _, colspan, blocks in cells:
+            text = self._blocks(blocks, " ").replace("\n", " ").replace("|", "\\|")
+            texts.append(text)
+            texts.extend([""] * (colspan - 1))
+        return texts
+
+    # inlines
+
+    def _inlines(self, inlines: List[Dict[str, Any]]) -> str:
+        return "".join(self._inline(i) for i in inlines)
+
+    def _inline(self, inline: Dict[str, Any]) -> str:
+        t, c = inline["t"], inline.get("c")
+
+        if t == "Str":
+            return c
+        if t == "Space":
+            return " "
+        if t == "SoftBreak":
+            return " "
+        if t == "LineBreak":
+            return "\n"
+        if t == "Strong":
+            return self._wrap(self._inlines(c), "**")
+        if t == "Emph":
+            return self._wrap(self._inlines(c), "*")
+        if t == "Strikeout":
+            return self._wrap(self._inlines(c), "~~")
+        if t == "Superscript":
+            return f"<sup>{self._inlines(c)}</sup>"
+        if t == "Subscript":
+            return f"<sub>{self._inlines(c)}</sub>"
+        if t in ("Underline", "SmallCaps"):
+            return self._inlines(c)
+        if t == "Span":
+            return self._inlines(c[1])
+        if t == "Quoted":
+            quote_type, inlines = c
+            quote = '"' if quote_type["t"] == "DoubleQuote" else "'"
+            return quote + self._inlines(inlines) + quote
+        if t == "Cite":
+            return self._inlines(c[1])
+        if t == "Code":
+            return f"`{c[1]}`"
+        if t == "Math":
+            math_type, text = c
+            return f"$${text}$$" if math_type["t"] == "DisplayMath" else f"${text}$"
+        if t == "RawInline":
+            fmt, text = c
+            return text if fmt in ("html", "markdown") else ""
+        if t == "Link":
+            _, inlines, (url, _) = c
+            return f"[{self._inlines(inlines)}]({url})"
+        if t == "Image":
+            return self._image(c)
+        if t == "Note":
+            self._notes.append(self._blocks(c))
+            return f"[^{len(self._notes)}]"
+
+        logger.debug(f"Skipping unsupported pandoc inline: {t}")
+        return ""
+
+    def _image(self, c) -> str:
+        _, alt, (url, _) = c
+        if not self.include_image_link_in_text:
+            return ""
+        link = self.resolve_image(url)
+        if link is None:
+            return ""
+        return f"![{self._inlines(alt)}]({link})"
+
+    @staticmethod
+    def _wrap(text: str, marker: str) -> str:
+        # 标记不能紧贴空白，否则 Markdown 不会识别，如 "** bold**"
+        stripped = text.strip()
+        if not stripped:
+            return text
+        lead = text[: len(text) - len(text.lstrip())]
+        trail = text[len(text.rstrip()) :]
+        return f"{lead}{marker}{stripped}{marker}{trail}"
+
+    @staticmethod
+    def _indent(text: str, first_prefix: str, prefix: str) -> str:
+        lines = text.split("\n")
+        return "\n".join(
+            [first_prefix + lines[0]] + [(prefix + line) if line else line for line in lines[1:]]
+        )
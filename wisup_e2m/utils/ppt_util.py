@@ -1,17 +1,25 @@
 import logging
+from typing import Optional
 
-from wisup_e2m.utils.libreoffice import convert_by_libreoffice
+from wisup_e2m.utils.libreoffice import LibreOfficePool, convert_by_libreoffice
 
 logger = logging.getLogger(__name__)
 
 
-def convert_ppt_to_pptx(ppt_path: str, pptx_path: str, rm_original: bool = False):
+def convert_ppt_to_pptx(
+    ppt_path: str,
+    pptx_path: str,
+    rm_original: bool = False,
+    pool: Optional[LibreOfficePool] = None,
+):
     """Convert a .ppt file to a .pptx file.
 
     Args:
         ppt_path: The path to the .ppt file.
         pptx_path: The path to the .pptx file.
         rm_original: Whether to remove the original .ppt file after conversion.
+        pool: A pool of running LibreOffice listeners to convert with, defaults to a new
+            soffice process.
 
     Raises:
         subprocess.CalledProcessError: If the conversion command fails.
@@ -19,4 +27,4 @@ def convert_ppt_to_pptx(ppt_path: str, pptx_path: str, rm_original: bool = False
 
     """
 
-    convert_by_libreoffice(ppt_path, "pptx", pptx_path, rm_original)
+    convert_by_libreoffice(ppt_path, "pptx", pptx_path, rm_original, pool=pool)
@@ -1,25 +1,38 @@
 import io
-import os
-from typing import IO, Any, Dict
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE, PP_PLACEHOLDER
 
+from wisup_e2m.utils.image_store import ImageStore
 from wisup_e2m.utils.image_util import has_transparent_background
 
 
 def get_pptx_images(
-    file_name: str,
-    file: IO[bytes],
+    file_name: Optional[str],
+    file: Optional[IO[bytes]],
     target_image_dir: str,
     ignore_transparent_images: bool = False,
+    prs: Optional[Presentation] = None,
+    slide_indices: Optional[Iterable[int]] = None,
 ) -> Dict[int, Any]:
-    os.makedirs(target_image_dir, exist_ok=True)
+    """Extract the pictures of every slide to ``target_image_dir``
+
+    :param prs: An already opened Presentation, so the file is not parsed again
+    :param slide_indices: 0-based indices of the slides to extract from, defaults to all slides
+    :return: {slide_idx: [{'slide_number': 0, 'image_file': ..., 'image_name': '<sha256>.png',
+        'digest': '<sha256>'}]}
+    """
+    store = ImageStore(target_image_dir)
     image_dict = {}
-    prs = Presentation(file_name or file)
-    for idx, slide in enumerate(prs.slides):
-        image_count = 0
+    if prs is None:
+        prs = Presentation(file_name or file)
+    if slide_indices is None:
+        slide_indices = range(len(prs.slides))
+    for idx in slide_indices:
+        slide = prs.slides[idx]
         for shape in slide.shapes:
-            if shape.shape_type == 13:
+            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
                 image = shape.image
                 image_bytes: IO[bytes] = image.blob
 
@@ -28,20 +41,148 @@ def get_pptx_images(
                 ):
                     continue
 
-                image_name = f"{idx}_{image_count}.{image.ext}"
-                image_file = os.path.join(target_image_dir, image_name)
-                with open(image_file, "wb") as f:
-                    f.write(image_bytes)
+                stored = store.put(image_bytes, image.ext)
                 if idx not in image_dict:
                     image_dict[idx] = []
                 image_dict[idx].append(
                     {
                         "slide_number": idx,
-                        "image_file": image_file,
-                        "image_name": image_name,
+                        "image_file": str(stored.path),
+                        "image_name": stored.path.name,
+                        "digest": stored.digest,
                     }
                 )
-                image_count += 1
 
-    # {page_number: [{'slide_number': 0, 'image_file': 'extracted_images/0_0.png', 'image_name': '0_0.png'}]}
+    # {page_number: [{'slide_number': 0, 'image_file': 'extracted_images/<sha256>.png',
+    #                'image_name': '<sha256>.png', 'digest': '<sha256>'}]}
     return image_dict
+
+
+_TITLE_PLACEHOLDERS = {
+    PP_PLACEHOLDER.TITLE,
+    PP_PLACEHOLDER.CENTER_TITLE,
+    PP_PLACEHOLDER.VERTICAL_TITLE,
+}
+
+
+def _iter_shapes_in_position(shapes) -> Iterator[Any]:
+    """Shapes from top to bottom, left to right, with group shapes flattened"""
+    for shape in sorted(shapes, key=lambda s: (s.top or 0, s.left or 0)):
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from _iter_shapes_in_position(shape.shapes)
+        else:
+            yield shape
+
+
+def _text_frame_to_markdown(text_frame, heading: str = "") -> str:
+    lines = []
+    for paragraph in text_frame.paragraphs:
+        text = "".join(run.text for run in paragraph.runs).strip() or paragraph.text.strip()
+        if not text:
+            continue
+        if heading:
+            lines.append(f"{heading} {text}")
+        elif paragraph.level > 0:
+            lines.append("  " * (paragraph.level - 1) + f"- {text}")
+        else:
+            lines.append(text)
+    return "\n".join(lines)
+
+
+def _table_to_markdown(table, infer_table_structure: bool = True) -> str:
+    rows = [
+        [cell.text.replace("\n", " ").replace("|", "\\|").strip() for cell in row.cells]
+        for row in table.rows
+    ]
+    if not rows:
+        return ""
+    if not infer_table_structure:
+        return "\n".join(" ".join(cell for cell in row if cell) for row in rows)
+
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * len(rows[0])]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+    return "\n".join(lines)
+
+
+def render_pptx_slides(
+    prs: Presentation,
+    slide_indices: Iterable[int],
+    target_image_dir: str,
+    extract_images: bool = True,
+    ignore_transparent_images: bool = False,
+    include_slide_notes: bool = False,
+    infer_table_structure: bool = True,
+) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
+    """Render slides to Markdown blocks with python-pptx, in one pass over the shapes
+
+    Shapes are visited in slide position. Titles become headings, tables become pipe tables and
+    pictures are stored in ``target_image_dir`` as ``<sha256>.<ext>`` by :class:`ImageStore`, the
+    same names :func:`get_pptx_images` uses.
+
+    :param slide_indices: 0-based indices of the slides to render
+    :return: Yield (slide_idx, blocks) per slide, a block is ("text", markdown) or ("image", path)
+    """
+    store = ImageStore(target_image_dir) if extract_images else None
+
+    slides = prs.slides
+    for idx in slide_indices:
+        slide = slides[idx]
+        blocks = []
+
+        for shape in _iter_shapes_in_position(slide.shapes):
+            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE or (
+                shape.is_placeholder and hasattr(shape, "image")
+            ):
+                if not extract_images:
+                    continue
+                try:
+                    image = shape.image
+                except ValueError:
+                    # 没有图片的图片占位符
+                    continue
+                image_bytes = image.blob
+                if ignore_transparent_images and has_transparent_background(
+                    io.BytesIO(image_bytes)
+                ):
+                    continue
+
+                blocks.append(("image", str(store.put(image_bytes, image.ext).path)))
+            elif shape.has_text_frame:
+                heading = ""
+                if shape.is_placeholder:
+                    placeholder_type = shape.placeholder_format.type
+                    if placeholder_type in _TITLE_PLACEHOLDERS:
+                        heading = "#"
+                    elif placeholder_type == PP_PLACEHOLDER.SUBTITLE:
+                        heading = "##"
+                md = _text_frame_to_markdown(shape.text_frame, heading)
+                if md:
+                    blocks.append(("text", md))
+            elif getattr(shape, "has_table", False) and shape.has_table:
+                md = _table_to_markdown(shape.table, infer_table_structure)
+                if md:
+                    blocks.append(("text", md))
+
+        if include_slide_notes and slide.has_notes_slide:
+            notes_frame = slide.notes_slide.notes_text_frame
+            md = _text_frame_to_markdown(notes_frame) if notes_frame is not None else ""
+            if md:
+                blocks.append(("text", md))
+
+        yield idx, blocks
+
+
+def render_pptx_slide_range(
+    source: Union[str, bytes],
+    start_idx: int,
+    end_idx: int,
+    target_image_dir: str,
+    **kwargs,
+) -> List[Tuple[int, List[Tuple[str, str]]]]:
+    """Render the slides ``[start_idx, end_idx)`` of a pptx, run in a worker process
+
+    :param source: Path to the pptx, or its content
+    :param kwargs: Options passed to :func:`render_pptx_slides`
+    """
+    prs = Presentation(source if isinstance(source, str) else io.BytesIO(source))
+    return list(render_pptx_slides(prs, range(start_idx, end_idx), target_image_dir, **kwargs))
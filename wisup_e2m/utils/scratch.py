@@ -0,0 +1,222 @@
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Set, Union
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# 可以指向 tmpfs，如 E2M_SCRATCH_DIR=/dev/shm/wisup_e2m
+SCRATCH_DIR_ENV = "E2M_SCRATCH_DIR"
+
+
+def _resolve_root(root: Optional[Union[str, Path]]) -> Path:
+    if root is None:
+        root = os.environ.get(SCRATCH_DIR_ENV) or os.path.join(tempfile.gettempdir(), "wisup_e2m")
+    return Path(root).resolve()
+
+
+class ScratchQuotaExceeded(Exception):
+    """Raised when a scratch job or the scratch root grows over its quota"""
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class ScratchJob:
+    """A private scratch directory of one job, removed when the job ends
+
+    Use :meth:`ScratchSpace.job` to create one.
+    """
+
+    def __init__(self, space: "ScratchSpace", path: Path, quota: Optional[int] = None):
+        self.space = space
+        self.path = path
+        self.quota = quota
+
+    def new_path(self, suffix: str = "", prefix: str = "") -> Path:
+        """A collision-free path inside the job directory, the file is not created"""
+        return self.path / f"{prefix}{uuid4().hex}{suffix}"
+
+    def mkdir(self, prefix: str = "") -> Path:
+        """Create a collision-free sub directory inside the job directory"""
+        path = self.new_path(prefix=prefix)
+        path.mkdir()
+        return path
+
+    def usage(self) -> int:
+        """Bytes currently used by the job directory"""
+        return _dir_size(self.path)
+
+    def check_quota(self, extra: int = 0):
+        """
+        Raise ScratchQuotaExceeded if the job, plus ``extra`` bytes about to be written,
+        is over the job quota or the scratch root is over its total quota
+        """
+        if self.quota is not None:
+            used = self.usage() + extra
+            if used > self.quota:
+                raise ScratchQuotaExceeded(
+                    f"Scratch job {self.path.name} uses {used} bytes, quota is {self.quota} bytes"
+                )
+        self.space.check_quota(extra)
+
+    def cleanup(self):
+        self.space._release(self)
+
+
+class ScratchSpace:
+    """Scratch space shared by the parsers
+
+    Every job gets its own directory ``<root>/<prefix>_<pid>_<uuid>``, which is removed when the
+    job ends, at interpreter exit, or, if the process died, by the next ScratchSpace created on
+    the same root.
+    """
+
+    def __init__(
+        self,
+        root: Optional[Union[str, Path]] = None,
+        job_quota: Optional[int] = None,
+        total_quota: Optional[int] = None,
+    ):
+        """
+        :param root: Root directory, defaults to $E2M_SCRATCH_DIR or <system temp dir>/wisup_e2m
+        :param job_quota: Default max bytes per job, None for no limit
+        :param total_quota: Max bytes of the whole root, None for no limit
+        """
+        self.root = _resolve_root(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.job_quota = job_quota
+        self.total_quota = total_quota
+
+        self._jobs: Set[Path] = set()
+        self._lock = threading.Lock()
+        self._sweep_stale()
+
+    @contextmanager
+    def job(self, prefix: str = "job", quota: Optional[int] = None) -> Iterator[ScratchJob]:
+        """Create a scratch job, the directory is removed when the context exits
+
+        :param prefix: Prefix of the job directory name, e.g. the parser name
+        :param quota: Max bytes of this job, defaults to ``job_quota``
+        """
+        job = self.create_job(prefix, quota)
+        try:
+            yield job
+        finally:
+            job.cleanup()
+
+    def create_job(self, prefix: str = "job", quota: Optional[int] = None) -> ScratchJob:
+        """Create a scratch job, the caller must call ``job.cleanup()``"""
+        path = self.root / f"{prefix}_{os.getpid()}_{uuid4().hex}"
+        path.mkdir()
+        with self._lock:
+            self._jobs.add(path)
+        return ScratchJob(self, path, quota if quota is not None else self.job_quota)
+
+    def check_quota(self, extra: int = 0):
+        if self.total_quota is None:
+            return
+        used = _dir_size(self.root) + extra
+        if used > self.total_quota:
+            raise ScratchQuotaExceeded(
+                f"Scratch root {self.root} uses {used} bytes, quota is {self.total_quota} bytes"
+            )
+
+    def cleanup(self):
+        """Remove the directories of all jobs still running in this process"""
+        with self._lock:
+            jobs = list(self._jobs)
+            self._jobs.clear()
+        for path in jobs:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _release(self, job: ScratchJob):
+        with self._lock:
+            self._jobs.discard(job.path)
+        shutil.rmtree(job.path, ignore_errors=True)
+
+    def _sweep_stale(self):
+        # 删除已退出进程遗留的 job 目录，当前进程的目录可能属于其他 ScratchSpace 中还在运行的 job
+        for path in self.root.iterdir():
+            parts = path.name.rsplit("_", 2)
+            if len(parts) != 3 or not parts[1].isdigit() or not path.is_dir():
+                continue
+            pid = int(parts[1])
+            if pid != os.getpid() and not _pid_alive(pid):
+                logger.info(f"Removing stale scratch directory {path}")
+                shutil.rmtree(path, ignore_errors=True)
+
+
+_scratch_space: Optional[ScratchSpace] = None
+# 被替换的 scratch space 中可能还有运行中的 job，退出时一并清理
+_retired_spaces: List[ScratchSpace] = []
+_scratch_lock = threading.Lock()
+
+
+def configure_scratch(
+    root: Optional[Union[str, Path]] = None,
+    job_quota: Optional[int] = None,
+    total_quota: Optional[int] = None,
+) -> ScratchSpace:
+    """Replace the scratch space used by the parsers, see :class:`ScratchSpace`
+
+    Configuring the root already in use only updates the quotas. Jobs still running in a
+    replaced space keep their directories until they end.
+    """
+    global _scratch_space
+    with _scratch_lock:
+        if _scratch_space is not None and _scratch_space.root == _resolve_root(root):
+            _scratch_space.job_quota = job_quota
+            _scratch_space.total_quota = total_quota
+            return _scratch_space
+        if _scratch_space is not None:
+            _retired_spaces.append(_scratch_space)
+        _scratch_space = ScratchSpace(root, job_quota=job_quota, total_quota=total_quota)
+        return _scratch_space
+
+
+def get_scratch_space() -> ScratchSpace:
+    """The scratch space used by the parsers, created on first use"""
+    global _scratch_space
+    with _scratch_lock:
+        if _scratch_space is None:
+            _scratch_space = ScratchSpace()
+        return _scratch_space
+
+
+def scratch_job(prefix: str = "job", quota: Optional[int] = None):
+    """Shortcut of ``get_scratch_space().job(prefix, quota)``"""
+    return get_scratch_space().job(prefix, quota)
+
+
+@atexit.register
+def _cleanup_scratch():
+    for space in [*_retired_spaces, _scratch_space]:
+        if space is not None:
+            space.cleanup()
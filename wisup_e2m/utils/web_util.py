@@ -1,11 +1,37 @@
+import asyncio
+import itertools
 import logging
+import os
+import random
+import re
+import time
+from collections import defaultdict
 from functools import wraps
-from typing import Optional
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional, Union
+from urllib.parse import unquote, urlsplit, urlunsplit
 
 import httpx
 
+from wisup_e2m.utils.file_util import CONTENT_TYPE_TO_FILE_TYPE, sniff_file_type, zip_file_type
+from wisup_e2m.utils.http_cache import AsyncCachingTransport, HttpCache
+
 logger = logging.getLogger(__name__)
 
+JINA_READER_URL = "https://r.jina.ai/"
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"
+    ),
+    "Accept": (
+        "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,"
+        "image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7"
+    ),
+    "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7",
+}
+
 
 def api_error_handler(func):
 
@@ -47,48 +73,371 @@ def get_web_content(url: str, client: Optional[httpx.Client] = None) -> str:
         client = httpx.Client()
 
     response = client.get(url)
+    response.raise_for_status()
     return response.text
 
 
 @api_error_handler_async
 async def get_web_content_async(url: str, client: Optional[httpx.AsyncClient] = None) -> str:
     if client is None:
-        client = httpx.AsyncClient()
+        async with httpx.AsyncClient() as client:
+            return await get_web_content_async(url, client)
 
     response = await client.get(url)
+    response.raise_for_status()
     return response.text
 
 
+class DownloadTooLarge(Exception):
+    """Raised when a download is larger than the allowed size"""
+
+
+def _check_content_length(response: httpx.Response, max_size: Optional[int]):
+    content_length = response.headers.get("Content-Length")
+    if max_size is not None and content_length and content_length.isdigit():
+        if int(content_length) > max_size:
+            raise DownloadTooLarge(
+                f"{response.url} is {content_length} bytes, larger than {max_size} bytes"
+            )
+
+
 @api_error_handler
+def download_file(
+    url: str,
+    target_path: Union[str, Path],
+    client: Optional[httpx.Client] = None,
+    max_size: Optional[int] = None,
+    chunk_size: int = 64 * 1024,
+) -> int:
+    """Stream the body of ``url`` to ``target_path`` chunk by chunk
+
+    :param max_size: Max bytes of the body, larger bodies raise DownloadTooLarge and the partial
+        file is removed
+    :return: Bytes written
+    """
+    if client is None:
+        with httpx.Client() as client:
+            return download_file(url, target_path, client, max_size, chunk_size)
+
+    with client.stream("GET", url) as response:
+        response.raise_for_status()
+        return write_response_body(response, target_path, max_size, chunk_size)
+
+
+def write_response_body(
+    response: httpx.Response,
+    target_path: Union[str, Path],
+    max_size: Optional[int] = None,
+    chunk_size: int = 64 * 1024,
+    chunks: Optional[Iterable[bytes]] = None,
+) -> int:
+    """Write the body of a streaming response to ``target_path``
+
+    :param chunks: The body chunks to write instead of ``response.iter_bytes()``, e.g. when the
+        first chunk was already read to sniff the file type
+    :return: Bytes written
+    """
+    _check_content_length(response, max_size)
+    if chunks is None:
+        chunks = response.iter_bytes(chunk_size)
+    size = 0
+    try:
+        with open(target_path, "wb") as f:
+            for chunk in chunks:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise DownloadTooLarge(f"{response.url} is larger than {max_size} bytes")
+                f.write(chunk)
+    except BaseException:
+        Path(target_path).unlink(missing_ok=True)
+        raise
+    return size
+
+
 def download_internet_image(
     image_url: str,
     target_path: str,
     client: Optional[httpx.Client] = None,
     force_format: Optional[str] = None,
-):
-    if client is None:
-        client = httpx.Client()
-
-    response = client.get(image_url)
+    max_size: Optional[int] = None,
+    chunk_size: int = 64 * 1024,
+) -> int:
+    """Stream an image to ``target_path``, see :func:`download_file`
 
+    :return: Bytes written
+    """
     # todo: handle force_format
     if force_format:
         logger.warning(f"Currently not handling force_format: {force_format}")
 
-    with open(target_path, "wb") as f:
-        f.write(response.content)
+    return download_file(image_url, target_path, client, max_size=max_size, chunk_size=chunk_size)
 
 
 @api_error_handler_async
 async def download_internet_image_async(
-    image_url: str, target_path: str, client: Optional[httpx.AsyncClient] = None
-):
+    image_url: str,
+    target_path: str,
+    client: Optional[httpx.AsyncClient] = None,
+    max_size: Optional[int] = None,
+    chunk_size: int = 64 * 1024,
+) -> int:
+    """Async version of :func:`download_internet_image`"""
     if client is None:
-        client = httpx.AsyncClient()
+        async with httpx.AsyncClient() as client:
+            return await download_internet_image_async(
+                image_url, target_path, client, max_size, chunk_size
+            )
+
+    size = 0
+    async with client.stream("GET", image_url) as response:
+        response.raise_for_status()
+        _check_content_length(response, max_size)
+        try:
+            with open(target_path, "wb") as f:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise DownloadTooLarge(f"{image_url} is larger than {max_size} bytes")
+                    f.write(chunk)
+        except BaseException:
+            Path(target_path).unlink(missing_ok=True)
+            raise
+    return size
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    # 响应体读完或关闭时才释放该 host 的并发名额
+    def __init__(self, stream: httpx.AsyncByteStream, semaphore: asyncio.Semaphore):
+        self._stream = stream
+        self._semaphore = semaphore
+        self._released = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._semaphore.release()
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Wrap a transport to allow at most ``max_per_host`` requests in flight per host
+
+    A request holds its slot until its response body is read or closed, so a slow site cannot
+    take the whole connection pool.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int):
+        self._transport = transport
+        self._semaphores: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(max_per_host)
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphores[request.url.host]
+        await semaphore.acquire()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, semaphore),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def create_async_client(
+    timeout: float = 30,
+    max_redirects: int = 5,
+    proxy: Optional[str] = None,
+    http2: bool = True,
+    max_connections: int = 100,
+    max_connections_per_host: int = 10,
+    keepalive_expiry: float = 30,
+    cache: Optional[HttpCache] = None,
+) -> httpx.AsyncClient:
+    """Create an AsyncClient meant to be shared by many concurrent requests
+
+    Connections are pooled and kept alive between requests, at most ``max_connections`` in
+    total and ``max_connections_per_host`` requests in flight per host. HTTP/2 needs the ``h2``
+    package (``pip install httpx[http2]``), without it the client falls back to HTTP/1.1.
+    Responses are revalidated against ``cache`` when given.
+    """
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning(
+                "h2 not installed, falling back to HTTP/1.1. Install by `pip install httpx[http2]`"
+            )
+            http2 = False
+
+    transport = httpx.AsyncHTTPTransport(
+        http2=http2,
+        proxy=proxy,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+    )
+    if cache is not None:
+        transport = AsyncCachingTransport(transport, cache)
+    if max_connections_per_host:
+        transport = HostLimitedTransport(transport, max_connections_per_host)
+
+    return httpx.AsyncClient(
+        headers=DEFAULT_HEADERS,
+        timeout=timeout,
+        max_redirects=max_redirects,
+        transport=transport,
+    )
+
+
+_CONTENT_DISPOSITION_FILENAME_PATTERN = re.compile(
+    r"filename\*?=(?:UTF-8'')?\"?([^\";]+)\"?", re.IGNORECASE
+)
+
+
+def file_type_from_headers(response: httpx.Response) -> Optional[str]:
+    """File type of a response by its Content-Type, or by the extension of the file name in
+    Content-Disposition or in the url path for generic content types"""
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type in CONTENT_TYPE_TO_FILE_TYPE:
+        return CONTENT_TYPE_TO_FILE_TYPE[content_type]
+
+    match = _CONTENT_DISPOSITION_FILENAME_PATTERN.search(
+        response.headers.get("Content-Disposition", "")
+    )
+    name = unquote(match.group(1)) if match else urlsplit(str(response.url)).path
+    return Path(name).suffix.lstrip(".").lower() or None
+
+
+def probe_url_file_type(url: str, client: httpx.Client) -> Optional[str]:
+    """File type of ``url`` from the headers of a HEAD request, None if it cannot be told"""
+    try:
+        response = client.head(url, follow_redirects=True)
+    except httpx.HTTPError as e:
+        logger.debug(f"HEAD {url} failed: {e}")
+        return None
+    if response.status_code >= 400:
+        return None
+    return file_type_from_headers(response)
+
+
+def download_document(
+    url: str,
+    target_path: Union[str, Path],
+    client: httpx.Client,
+    accept: Callable[[str], bool],
+    max_size: Optional[int] = None,
+    chunk_size: int = 64 * 1024,
+) -> Optional[Path]:
+    """Stream ``url`` to disk if it is a document of an accepted file type
+
+    The file type is sniffed from the first bytes of the body, falling back to the headers, and
+    the download is abandoned right there if ``accept(file_type)`` is false, e.g. for html pages.
+
+    :param target_path: Path of the download without extension, the file type is appended
+    :param accept: Whether a file type should be downloaded
+    :return: Path of the downloaded file, None if the file type is not accepted
+    """
+    with client.stream("GET", url, follow_redirects=True) as response:
+        response.raise_for_status()
+        chunks = response.iter_bytes(chunk_size)
+        head = next(chunks, b"")
+
+        header_type = file_type_from_headers(response)
+        sniffed_type = sniff_file_type(head)
+        if sniffed_type == "ole":
+            # doc 和 ppt 无法从文件头区分，只能相信响应头
+            sniffed_type = header_type if header_type in ("doc", "ppt") else None
+        file_type = sniffed_type or header_type
+        if file_type is None or (file_type != "zip" and not accept(file_type)):
+            return None
+
+        part_path = Path(f"{target_path}.part")
+        write_response_body(response, part_path, max_size, chunks=itertools.chain([head], chunks))
+
+    if file_type == "zip":
+        file_type = zip_file_type(part_path)
+        if file_type is None or not accept(file_type):
+            part_path.unlink(missing_ok=True)
+            return None
+
+    document_path = Path(f"{target_path}.{file_type}")
+    os.replace(part_path, document_path)
+    return document_path
+
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a url, used to tell whether two urls point to the same page
+
+    Scheme and host are lower cased, the default port and the fragment are removed and an empty
+    path becomes "/".
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+        netloc = f"{userinfo}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Whether a request that failed with ``error`` may succeed if retried"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in _RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def retry_delay(attempt: int, backoff: float, error: Optional[BaseException] = None) -> float:
+    """Seconds to wait before retry number ``attempt`` (from 0), exponential with jitter
+
+    A Retry-After header in seconds on the failed response takes precedence.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return float(retry_after)
+    return backoff * (2**attempt) * (0.5 + random.random())
+
+
+class HostRateLimiter:
+    """Space out requests to the same host by at least ``1 / requests_per_second`` seconds"""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self._next_time: Dict[str, float] = {}
 
-    response = await client.get(image_url)
-    with open(target_path, "wb") as f:
-        f.write(response.content)
+    async def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlsplit(url).hostname or ""
+        now = time.monotonic()
+        # 先占住时间槽再等待，同一 host 的并发请求会依次排开
+        start = max(now, self._next_time.get(host, now))
+        self._next_time[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
 
 
 if __name__ == "__main__":